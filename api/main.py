@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime, timedelta
-import json
+from typing import Optional
+import base64
+import binascii
+import bisect
 import random
-from typing import List, Dict, Any
+import re
 
 app = FastAPI(title="Fleet Analytics API", version="1.0.0")
 
@@ -14,6 +17,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 class ChatMessage(BaseModel):
@@ -40,6 +44,56 @@ MOCK_MAINTENANCE_ALERTS = [
     {"vehicle_id": "TRK-C789", "type": "Truck", "next_maintenance": "2025-02-02", "mileage": 52000}
 ]
 
+VEHICLES_MAX_PAGE_SIZE = 500
+VEHICLE_FIELDS = ("vehicle_id", "type", "status", "fuel_efficiency", "next_maintenance", "mileage")
+
+# Sorted once so a keyset page starts with a bisect instead of a scan
+MOCK_VEHICLES_BY_ID = sorted(MOCK_VEHICLES, key=lambda v: v["vehicle_id"])
+MOCK_VEHICLE_IDS = [v["vehicle_id"] for v in MOCK_VEHICLES_BY_ID]
+MOCK_VEHICLE_INDEX = {v["vehicle_id"]: v for v in MOCK_VEHICLES}
+
+PERFORMANCE_METRICS = {
+    "weekly_stats": {
+        "distance_covered": 15420,
+        "fuel_consumed": 2856,
+        "average_speed": 65.2,
+        "idle_time": 8.5
+    },
+    "top_performers": [
+        {"vehicle_id": "VAN-B456", "efficiency": 32.1, "score": 95},
+        {"vehicle_id": "TRK-C789", "efficiency": 29.8, "score": 92},
+        {"vehicle_id": "VAN-D012", "efficiency": 31.5, "score": 90}
+    ],
+    "alerts": {
+        "critical": 2,
+        "warning": 5,
+        "info": 8
+    }
+}
+
+# Built once per cold start rather than on every chat request. Answers quote the same
+# mock data the other endpoints serve, so the assistant agrees with the dashboard.
+def _chat_responses():
+    summary = fleet_summary()
+    alerts = MOCK_MAINTENANCE_ALERTS
+    urgent = " and ".join(
+        f"{a['vehicle_id']} (due {datetime.strptime(a['next_maintenance'], '%Y-%m-%d').strftime('%b %d')})"
+        for a in alerts[:2]
+    )
+    return {
+        "fuel": f"Your fleet's average fuel efficiency is {summary['fuel_efficiency']} MPG across {summary['active_vehicles']} active vehicles.",
+        "efficiency": "To improve fuel efficiency, consider: 1) Regular maintenance schedules 2) Driver training programs 3) Route optimization 4) Tire pressure monitoring.",
+        "maintenance": f"You have {len(alerts)} vehicles due for maintenance in the next 2 weeks. The most urgent are {urgent}.",
+        "cost": "Cost figures aren't tracked in the fleet data, so I can only speak to fuel use and maintenance.",
+        "save": "The biggest levers on fleet costs are fuel and unplanned repairs: route optimization and driver training cut fuel use, and servicing vehicles before they are overdue avoids breakdowns.",
+        "alert": f"Current alerts: {summary['maintenance_due']} vehicles are due for maintenance within 7 days; the most urgent are {urgent}.",
+        "hello": "Hello! I'm your Fleet Intelligence Assistant. I can help with fuel efficiency, maintenance scheduling, cost optimization, and fleet analytics. What would you like to know?",
+        "help": "I can assist with: \n• Fleet performance analytics\n• Maintenance predictions\n• Fuel efficiency optimization\n• Cost analysis and savings\n• Vehicle status and alerts\n\nWhat specific area interests you?"
+    }
+
+# One pass over the message; the first keyword in CHAT_RESPONSES order that occurs wins
+CHAT_PATTERN = re.compile("|".join(f"(?P<{key}>{key})" for key in ("fuel", "efficiency", "maintenance", "cost", "save", "alert", "hello", "help")))
+
 @app.get("/")
 async def root():
     return {"message": "Fleet Analytics API", "status": "running"}
@@ -59,10 +113,45 @@ def fleet_summary():
         "monthly_savings": 15000
     }
 
+def encode_cursor(vehicle_id):
+    return base64.urlsafe_b64encode(vehicle_id.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        return base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/api/vehicles")
-def get_vehicles():
-    """Get list of all vehicles"""
-    return MOCK_VEHICLES
+def get_vehicles(
+    response: Response,
+    limit: int = Query(20, ge=1, le=VEHICLES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    vehicle_type: Optional[str] = Query(None, alias="type"),
+    status: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get a page of vehicles ordered by vehicle_id (next page cursor in X-Next-Cursor)"""
+    columns = VEHICLE_FIELDS
+    if fields:
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = sorted(set(requested) - set(VEHICLE_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = ('vehicle_id',) + tuple(c for c in VEHICLE_FIELDS if c in requested and c != 'vehicle_id')
+    after = decode_cursor(cursor) if cursor else ''
+    
+    page = []
+    for vehicle in MOCK_VEHICLES_BY_ID[bisect.bisect_right(MOCK_VEHICLE_IDS, after):]:
+        if vehicle_type is not None and vehicle["type"] != vehicle_type:
+            continue
+        if status is not None and vehicle["status"] != status:
+            continue
+        if len(page) == limit:
+            response.headers["X-Next-Cursor"] = encode_cursor(page[-1]["vehicle_id"])
+            break
+        page.append({c: vehicle[c] for c in columns})
+    return page
 
 @app.get("/api/fuel-trends")
 def fuel_trends():
@@ -82,29 +171,12 @@ def maintenance_alerts():
 @app.get("/api/performance-metrics")
 def performance_metrics():
     """Get detailed performance metrics"""
-    return {
-        "weekly_stats": {
-            "distance_covered": 15420,
-            "fuel_consumed": 2856,
-            "average_speed": 65.2,
-            "idle_time": 8.5
-        },
-        "top_performers": [
-            {"vehicle_id": "VAN-B456", "efficiency": 32.1, "score": 95},
-            {"vehicle_id": "TRK-C789", "efficiency": 29.8, "score": 92},
-            {"vehicle_id": "VAN-D012", "efficiency": 31.5, "score": 90}
-        ],
-        "alerts": {
-            "critical": 2,
-            "warning": 5,
-            "info": 8
-        }
-    }
+    return PERFORMANCE_METRICS
 
 @app.post("/api/predict-maintenance")
 def predict_maintenance(request: MaintenanceRequest):
     """Predict maintenance needs for a specific vehicle"""
-    vehicle = next((v for v in MOCK_VEHICLES if v["vehicle_id"] == request.vehicle_id), None)
+    vehicle = MOCK_VEHICLE_INDEX.get(request.vehicle_id)
     
     if not vehicle:
         return {
@@ -138,25 +210,18 @@ def predict_maintenance(request: MaintenanceRequest):
 @app.post("/api/ai-chat")
 def ai_chat(request: ChatMessage):
     """AI chat assistant for fleet management"""
-    message = request.message.lower()
-    
-    responses = {
-        "fuel": "Your fleet's average fuel efficiency is 28.5 MPG, which is 12% better than last month! Top performers include VAN-B456 (32.1 MPG) and TRK-C789 (29.8 MPG).",
-        "efficiency": "To improve fuel efficiency, consider: 1) Regular maintenance schedules 2) Driver training programs 3) Route optimization 4) Tire pressure monitoring.",
-        "maintenance": "You have 12 vehicles due for maintenance in the next 2 weeks. The most urgent are TRK-A123 (due Jan 28) and VAN-B456 (due Jan 30). Would you like me to schedule these?",
-        "cost": "Current monthly fleet costs: Fuel $45,000, Maintenance $12,000, Insurance $8,000. You're saving $15,000/month vs. last year through optimization.",
-        "save": "Top cost-saving opportunities: 1) Route optimization could save $8,000/month 2) Preventive maintenance saves $5,000/month 3) Fuel efficiency programs save $12,000/month.",
-        "alert": "Current alerts: 3 vehicles need immediate attention, 5 are due for maintenance, and 2 have fuel efficiency below targets.",
-        "hello": "Hello! I'm your Fleet Intelligence Assistant. I can help with fuel efficiency, maintenance scheduling, cost optimization, and fleet analytics. What would you like to know?",
-        "help": "I can assist with: \n• Fleet performance analytics\n• Maintenance predictions\n• Fuel efficiency optimization\n• Cost analysis and savings\n• Vehicle status and alerts\n\nWhat specific area interests you?"
-    }
-    
-    for key in responses:
-        if key in message:
-            return {"response": responses[key]}
+    matches = {match.lastgroup for match in CHAT_PATTERN.finditer(request.message.lower())}
+    for key in CHAT_RESPONSES:
+        if key in matches:
+            return {"response": CHAT_RESPONSES[key]}
     
     return {"response": "I can help you with fuel efficiency, maintenance schedules, cost optimization, and fleet analytics. Could you be more specific about what you'd like to know?"}
 
+CHAT_RESPONSES = _chat_responses()
+
+# Build the middleware stack during the cold start's init phase instead of on the first request
+app.middleware_stack = app.build_middleware_stack()
+
 # Handler for Vercel
 def handler(request):
     return app(request)
\ No newline at end of file
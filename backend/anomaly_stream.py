@@ -0,0 +1,287 @@
+"""
+Streaming anomaly detection over newly ingested fuel records
+
+A background thread tails fuel_data by id, so rows written by the API, ingest.py
+or any other writer are all seen within one poll interval. Each record is scored
+by models.StreamingAnomalyDetector; records from vehicles without enough history
+are scored in one batch by the IsolationForest, which is refit periodically.
+
+Every API worker starts a stream, but only the one holding an exclusive lock on
+`<db>-anomaly.lock` tails; the others wait for the lock and take over if that
+worker exits. The tailer writes flags to anomaly_flags (trimmed to the newest
+`max_flags`) and its counters to anomaly_stream_state, so /api/anomalies answers
+the same from every worker.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:   # not POSIX: every stream tails, fine for a single process
+    fcntl = None
+
+import queries
+from db import DB_PATH, connect
+
+# Applied by schema migration 10
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS anomaly_flags (
+        id INTEGER PRIMARY KEY,   -- fuel_data.id of the flagged record
+        vehicle_id TEXT NOT NULL,
+        date DATE,
+        fuel_efficiency REAL,
+        fuel_consumed REAL,
+        score REAL NOT NULL,
+        method TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        detected_at TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_anomaly_flags_vehicle ON anomaly_flags (vehicle_id, id)",
+    """
+    CREATE TABLE IF NOT EXISTS anomaly_stream_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        pid INTEGER NOT NULL,
+        watermark INTEGER NOT NULL,
+        vehicles INTEGER NOT NULL DEFAULT 0,
+        scored INTEGER NOT NULL DEFAULT 0,
+        flagged INTEGER NOT NULL DEFAULT 0,
+        last_refit TEXT,
+        updated_at TEXT NOT NULL
+    )
+    """,
+]
+
+INSERT_FLAG = """
+    INSERT OR REPLACE INTO anomaly_flags
+        (id, vehicle_id, date, fuel_efficiency, fuel_consumed, score, method, severity, detected_at)
+    VALUES (:id, :vehicle_id, :date, :fuel_efficiency, :fuel_consumed, :score, :method, :severity, :detected_at)
+"""
+
+# Parameter: max_flags - 1
+TRIM_FLAGS = """
+    DELETE FROM anomaly_flags
+    WHERE id < (SELECT id FROM anomaly_flags ORDER BY id DESC LIMIT 1 OFFSET ?)
+"""
+
+SAVE_STATE = """
+    INSERT OR REPLACE INTO anomaly_stream_state
+        (id, pid, watermark, vehicles, scored, flagged, last_refit, updated_at)
+    VALUES (1, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class AnomalyStream:
+    """Background tailer feeding new fuel_data rows to the streaming detector"""
+
+    def __init__(self, db_path=DB_PATH, poll_seconds=2.0, refit_seconds=3600.0, batch_size=10_000, max_flags=1000,
+                 fallback=None):
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.refit_seconds = refit_seconds
+        self.batch_size = batch_size
+        self.max_flags = max_flags
+        self.detector = None
+        self.watermark = 0
+        self.last_refit = None
+        self._fallback = None
+        self._fallback_loader = fallback   # callable returning a trained AnomalyDetector
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock_file = None   # held while this process is the tailer
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="anomaly-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _acquire_tailer_lock(self):
+        """Block until this process is the only tailer of the database; False if stopped first"""
+        if fcntl is None:
+            return True
+        try:
+            lock_file = open(f"{self.db_path}-anomaly.lock", "a")
+        except OSError as e:
+            print(f"Anomaly stream could not open its lock file: {e}")
+            return False
+        while not self._stop.is_set():
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._stop.wait(self.poll_seconds)
+                continue
+            self._lock_file = lock_file
+            return True
+        lock_file.close()
+        return False
+
+    def _release_tailer_lock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()   # closing releases the flock
+            self._lock_file = None
+
+    def _run(self):
+        if not self._acquire_tailer_lock():
+            return
+        try:
+            conn = connect(self.db_path, check_same_thread=False)
+            self._seed(conn)
+        except Exception as e:
+            print(f"Anomaly stream could not start: {e}")
+            self._release_tailer_lock()
+            return
+
+        next_refit = time.monotonic() + self.refit_seconds
+        try:
+            while not self._stop.is_set():
+                try:
+                    # Drain backlogs in full batches before sleeping again
+                    while self.poll(conn) == self.batch_size and not self._stop.is_set():
+                        pass
+                    if time.monotonic() >= next_refit:
+                        self.refit()
+                        with conn:
+                            self._save_state(conn)
+                        next_refit = time.monotonic() + self.refit_seconds
+                except sqlite3.Error as e:
+                    print(f"Anomaly stream error: {e}")
+                self._stop.wait(self.poll_seconds)
+        finally:
+            conn.close()
+            self._release_tailer_lock()
+
+    def _seed(self, conn):
+        """Initialize per-vehicle statistics from the training window and resume after the
+        previous tailer's watermark (the last row, on a fresh database)"""
+        import numpy as np
+        import models
+
+        self.watermark = conn.execute(
+            "SELECT COALESCE((SELECT watermark FROM anomaly_stream_state), (SELECT MAX(id) FROM fuel_data), 0)"
+        ).fetchone()[0]
+        rows = conn.execute(queries.ANOMALY_TRAINING).fetchall()
+        detector = models.StreamingAnomalyDetector()
+        if rows:
+            vehicle_ids, efficiency, fuel, _ = zip(*rows)
+            detector.seed(vehicle_ids, np.column_stack([efficiency, fuel]))
+        self.detector = detector
+        with conn:
+            self._save_state(conn)
+
+    def _save_state(self, conn):
+        stats = self.detector.stats()
+        conn.execute(SAVE_STATE, (
+            os.getpid(), self.watermark, stats["vehicles"], stats["scored"], stats["flagged"],
+            self.last_refit, datetime.now().isoformat(timespec='seconds')
+        ))
+
+    def poll(self, conn):
+        """Score records added since the last poll; returns how many were read"""
+        rows = conn.execute(queries.NEW_FUEL_RECORDS, (self.watermark, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+        self.watermark = rows[-1][0]
+
+        detected_at = datetime.now().isoformat(timespec='seconds')
+        flags = []
+        unscored = []
+        for record_id, vehicle_id, date, efficiency, fuel, distance in rows:
+            if not efficiency or efficiency <= 0:   # idle days, as in training
+                continue
+            z = self.detector.score(vehicle_id, (efficiency, fuel))
+            if z is None:
+                unscored.append((record_id, vehicle_id, date, efficiency, fuel, distance))
+            elif z > self.detector.Z_THRESHOLD:
+                flags.append(self._flag(
+                    record_id, vehicle_id, date, efficiency, fuel, round(z, 2), "running_stats",
+                    "high" if z >= self.detector.HIGH_SEVERITY_Z else "medium", detected_at
+                ))
+
+        fallback = self._get_fallback() if unscored else None
+        if fallback is not None:
+            import numpy as np
+            scores, is_anomaly = fallback.score(np.array([row[3:] for row in unscored], dtype=np.float64))
+            for i in np.flatnonzero(is_anomaly).tolist():
+                record_id, vehicle_id, date, efficiency, fuel, _ = unscored[i]
+                score = float(scores[i])
+                flags.append(self._flag(
+                    record_id, vehicle_id, date, efficiency, fuel, round(score, 4), "isolation_forest",
+                    "high" if score < -0.5 else "medium", detected_at
+                ))
+
+        for flag in flags:
+            self.detector.record_flag(flag)
+        with conn:
+            if flags:
+                conn.executemany(INSERT_FLAG, flags)
+                conn.execute(TRIM_FLAGS, (self.max_flags - 1,))
+            self._save_state(conn)
+        return len(rows)
+
+    @staticmethod
+    def _flag(record_id, vehicle_id, date, efficiency, fuel, score, method, severity, detected_at):
+        return {
+            "id": record_id,
+            "vehicle_id": vehicle_id,
+            "date": date,
+            "fuel_efficiency": efficiency,
+            "fuel_consumed": fuel,
+            "score": score,
+            "method": method,
+            "severity": severity,
+            "detected_at": detected_at
+        }
+
+    def _get_fallback(self):
+        if self._fallback is None and self._fallback_loader is not None:
+            try:
+                self._fallback = self._fallback_loader()
+            except Exception as e:
+                print(f"Anomaly stream fallback model unavailable: {e}")
+            self._fallback_loader = None   # one attempt; refit() replaces it later
+        return self._fallback if self._fallback is not None and self._fallback.is_trained else None
+
+    def refit(self):
+        """Retrain the IsolationForest used for vehicles with little history"""
+        import models
+
+        detector = models.AnomalyDetector()
+        if detector.train(self.db_path):
+            self._fallback = detector
+            self.last_refit = datetime.now().isoformat(timespec='seconds')
+
+    def recent(self, conn, limit=50, vehicle_id=None):
+        """Most recent flags written by the tailer, newest first"""
+        if vehicle_id is None:
+            rows = conn.execute(queries.RECENT_ANOMALIES, (limit,))
+        else:
+            rows = conn.execute(queries.RECENT_VEHICLE_ANOMALIES, (vehicle_id, limit))
+        return [dict(zip(queries.ANOMALY_COLUMNS, row)) for row in rows]
+
+    def stats(self, conn):
+        """Snapshot of the tailer's counters, as of its last poll that read rows"""
+        state = conn.execute(
+            "SELECT pid, watermark, vehicles, scored, flagged, last_refit, updated_at FROM anomaly_stream_state"
+        ).fetchone()
+        stats = {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "tailing": self._lock_file is not None or (fcntl is None and self.detector is not None),
+            "poll_seconds": self.poll_seconds,
+            "buffered": conn.execute("SELECT COUNT(*) FROM anomaly_flags").fetchone()[0],
+            "buffer_size": self.max_flags
+        }
+        if state is not None:
+            stats.update(zip(
+                ("tailer_pid", "watermark", "vehicles", "scored", "flagged", "last_refit", "updated_at"), state
+            ))
+        return stats
+
@@ -0,0 +1,306 @@
+"""
+Tiered storage: closed months of fuel_data compacted into Parquet
+
+SQLite keeps the live window. `compact` moves every closed month (before the
+current UTC one) into <archive_dir>/month=YYYY-MM/part-NNNNN.parquet, sorted by
+date so row-group statistics can skip date ranges, and deletes those rows from
+fuel_data. Rollup rows are kept, so trends over archived days, per vehicle too,
+are still served from the rollups. Late rows for an archived month are
+compacted into another part file on the next run.
+
+fuel_history() reads a date range from both tiers as one Arrow table, pruning
+month partitions and projecting columns through pyarrow.dataset.
+
+The fuel_archive_months table is the record of what has been archived; the part
+files are only read for the months it lists. The archive directory is
+$FLEET_ARCHIVE_DIR, or fuel_archive next to the database file.
+
+    python archive.py compact [--db fleet_data.db] [--archive-dir DIR]
+    python archive.py query --since 2024-01-01 --columns vehicle_id,fuel_efficiency
+    python archive.py backfill    # once, for months archived before schema version 9
+
+pyarrow is optional: without it nothing can be archived and training reads SQLite
+only. Rows of archived months should not be updated or deleted in SQLite, since
+their rollup days can no longer be recomputed from fuel_data.
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+import rollup
+import versions
+from db import DB_PATH, connect
+
+# None: a fuel_archive directory next to each database (see archive_dir_of)
+ARCHIVE_DIR = os.environ.get('FLEET_ARCHIVE_DIR')
+
+COLUMNS = ('vehicle_id', 'date', 'fuel_consumed', 'distance_traveled', 'fuel_efficiency')
+
+# Months moved out of fuel_data; rollup.rebuild() leaves their days alone
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS fuel_archive_months (
+        month TEXT PRIMARY KEY,
+        row_count INTEGER NOT NULL,
+        part_count INTEGER NOT NULL,
+        archived_at TEXT NOT NULL
+    )
+"""
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("The fuel archive requires pyarrow (pip install pyarrow)")
+    return pa, ds, pq
+
+
+def _schema(pa, columns=COLUMNS):
+    types = {'vehicle_id': pa.string(), 'date': pa.string()}
+    return pa.schema([(name, types.get(name, pa.float64())) for name in columns])
+
+
+def _to_table(pa, rows, columns):
+    schema = _schema(pa, columns)
+    if not rows:
+        return schema.empty_table()
+    return pa.Table.from_arrays([pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                                schema=schema)
+
+
+def next_month(month):
+    year, number = map(int, month.split('-'))
+    return f"{year + number // 12}-{number % 12 + 1:02d}"
+
+
+def archive_dir_of(db_path):
+    """Where the Parquet parts of a database's archived months live"""
+    return ARCHIVE_DIR or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'fuel_archive')
+
+
+def _db_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def archived_months(conn):
+    """Months recorded in fuel_archive_months, oldest first"""
+    try:
+        return [month for month, in conn.execute("SELECT month FROM fuel_archive_months ORDER BY month")]
+    except sqlite3.OperationalError:   # schema predates the archive
+        return []
+
+
+def closed_months(conn, before=None):
+    """Months before `before` (default: the current UTC month) that still have rows in fuel_data"""
+    before = before or datetime.now(timezone.utc).strftime('%Y-%m')
+    months = []
+    # Seek month by month on the date index instead of scanning every row
+    first = conn.execute("SELECT MIN(date) FROM fuel_data").fetchone()[0]
+    while first is not None and first[:7] < before:
+        months.append(first[:7])
+        first = conn.execute("SELECT MIN(date) FROM fuel_data WHERE date >= ?", (f"{next_month(first[:7])}-01",)).fetchone()[0]
+    return months
+
+
+def compact_month(conn, month, archive_dir=None, batch_size=100_000):
+    """Move one month of fuel_data into a new Parquet part; returns the row count"""
+    pa, _, pq = _pyarrow()
+    month_dir = os.path.join(archive_dir or archive_dir_of(_db_path(conn)), f"month={month}")
+    os.makedirs(month_dir, exist_ok=True)
+    part_count = len(glob.glob(os.path.join(month_dir, 'part-*.parquet')))
+    path = os.path.join(month_dir, f"part-{part_count:05d}.parquet")
+    bounds = (f"{month}-01", f"{next_month(month)}-01")
+
+    # The write lock is held from the read to the delete so no row lands in between unarchived
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cursor = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM fuel_data WHERE date >= ? AND date < ? ORDER BY date, vehicle_id", bounds
+        )
+        rows = 0
+        with pq.ParquetWriter(f"{path}.tmp", _schema(pa)) as writer:
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                writer.write_table(_to_table(pa, batch, COLUMNS))
+                rows += len(batch)
+
+        # Without the triggers the delete leaves the month's rollup rows in place
+        # (and bumps the fuel_data counter once instead of per row)
+        rollup.drop_triggers(conn)
+        versions.drop_triggers(conn, 'fuel_data')
+        conn.execute("DELETE FROM fuel_data WHERE date >= ? AND date < ?", bounds)
+        versions.bump(conn, 'fuel_data')
+        versions.create_triggers(conn, 'fuel_data')
+        rollup.create_triggers(conn)
+        conn.execute(
+            """
+            INSERT INTO fuel_archive_months VALUES (?, ?, 1, datetime('now'))
+            ON CONFLICT (month) DO UPDATE SET
+                row_count = row_count + excluded.row_count,
+                part_count = part_count + 1,
+                archived_at = excluded.archived_at
+            """,
+            (month, rows)
+        )
+        os.replace(f"{path}.tmp", path)
+        try:
+            conn.execute("COMMIT")
+        except Exception:
+            os.remove(path)
+            raise
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        if os.path.exists(f"{path}.tmp"):
+            os.remove(f"{path}.tmp")
+        raise
+    return rows
+
+
+def compact(db_path=DB_PATH, archive_dir=None, before=None, batch_size=100_000):
+    """Archive every closed month; returns {month: rows}"""
+    from schema import migrate
+
+    conn = connect(db_path, isolation_level=None)   # transactions are explicit in compact_month
+    try:
+        migrate(conn)
+        archive_dir = archive_dir or archive_dir_of(db_path)
+        return {month: compact_month(conn, month, archive_dir, batch_size) for month in closed_months(conn, before)}
+    finally:
+        conn.close()
+
+
+def fuel_history(db_path=DB_PATH, since=None, until=None, columns=COLUMNS, archive_dir=None):
+    """fuel_data rows with since <= date < until from both tiers, as one Arrow table
+
+    Archived months outside the range are never opened, and only the requested
+    columns are read from the Parquet parts.
+    """
+    pa, ds, _ = _pyarrow()
+    columns = list(columns)
+    unknown = set(columns) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown fuel_data columns: {sorted(unknown)}")
+
+    where, params = [], []
+    if since:
+        where.append("date >= ?")
+        params.append(since)
+    if until:
+        where.append("date < ?")
+        params.append(until)
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN")   # one snapshot, so a concurrent compaction can't move rows between the reads
+        months = [m for m in archived_months(conn)
+                  if (since is None or m >= since[:7]) and (until is None or m <= until[:7])]
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM fuel_data {'WHERE ' + ' AND '.join(where) if where else ''}", params
+        ).fetchall()
+    finally:
+        conn.close()
+
+    tables = []
+    if months:
+        dataset = ds.dataset(archive_dir or archive_dir_of(db_path), format='parquet', partitioning='hive')
+        condition = ds.field('month').isin(months)
+        if since:
+            condition &= ds.field('date') >= since
+        if until:
+            condition &= ds.field('date') < until
+        tables.append(dataset.to_table(columns=columns, filter=condition).cast(_schema(pa, columns)))
+    tables.append(_to_table(pa, rows, columns))
+    return pa.concat_tables(tables)
+
+
+def backfill_vehicle_rollup(db_path=DB_PATH, archive_dir=None):
+    """Fill fuel_vehicle_daily_rollup for archived days from their Parquet parts; returns the rows written
+
+    Months compacted before schema migration 9 have no per-vehicle daily rows,
+    since that table was built from what was left in fuel_data. Later compactions
+    keep theirs, so this only needs to run once after upgrading.
+    """
+    from schema import migrate
+
+    _, ds, _ = _pyarrow()
+    conn = connect(db_path, isolation_level=None)
+    try:
+        migrate(conn)
+        months = archived_months(conn)
+        if not months:
+            return 0
+        dataset = ds.dataset(archive_dir or archive_dir_of(db_path), format='parquet', partitioning='hive')
+        table = dataset.to_table(columns=list(COLUMNS),
+                                 filter=ds.field('month').isin(months) & ds.field('vehicle_id').is_valid())
+        days = table.group_by(['vehicle_id', 'date']).aggregate([
+            ('date', 'count'),
+            ('fuel_consumed', 'sum'), ('fuel_consumed', 'min'), ('fuel_consumed', 'max'),
+            ('fuel_efficiency', 'sum'), ('fuel_efficiency', 'min'), ('fuel_efficiency', 'max'),
+            ('distance_traveled', 'sum'),
+            ('fuel_consumed', 'count'), ('fuel_efficiency', 'count'), ('distance_traveled', 'count'),
+        ])
+        # Same layout and NULL handling as the rollup triggers: sums of no readings are 0
+        names = ('vehicle_id', 'date', 'date_count', 'fuel_consumed_sum', 'fuel_consumed_min', 'fuel_consumed_max',
+                 'fuel_efficiency_sum', 'fuel_efficiency_min', 'fuel_efficiency_max', 'distance_traveled_sum',
+                 'fuel_consumed_count', 'fuel_efficiency_count', 'distance_traveled_count')
+        sums = {3, 6, 9}
+        rows = [
+            tuple((value or 0.0) if i in sums else value for i, value in enumerate(row))
+            for row in zip(*(days[name].to_pylist() for name in names))
+        ]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR REPLACE INTO fuel_vehicle_daily_rollup VALUES "
+                             "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            versions.bump(conn, 'fuel_data')
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact closed months of fuel_data into Parquet")
+    parser.add_argument('command', choices=('compact', 'query', 'backfill'))
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--archive-dir', help="default: $FLEET_ARCHIVE_DIR, else fuel_archive next to the database")
+    parser.add_argument('--before', metavar='YYYY-MM', help="compact months before this one (default: current month)")
+    parser.add_argument('--since', metavar='YYYY-MM-DD')
+    parser.add_argument('--until', metavar='YYYY-MM-DD', help="exclusive")
+    parser.add_argument('--columns', default=','.join(COLUMNS))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        if args.command == 'compact':
+            archived = compact(args.db, args.archive_dir, args.before)
+            for month, rows in archived.items():
+                print(f"  {month}: {rows:,} rows")
+            print(f"Archived {len(archived)} month(s) in {time.perf_counter() - start:.2f}s")
+        elif args.command == 'backfill':
+            rows = backfill_vehicle_rollup(args.db, args.archive_dir)
+            print(f"Wrote {rows:,} per-vehicle rollup day(s) in {time.perf_counter() - start:.2f}s")
+        else:
+            table = fuel_history(args.db, args.since, args.until, args.columns.split(','), args.archive_dir)
+            print(f"{table.num_rows:,} rows, {table.nbytes / 1e6:.1f} MB in {time.perf_counter() - start:.3f}s")
+            print(table.slice(0, 5).to_pandas().to_string(index=False))
+    except ImportError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for the Fleet Analytics backend
+
+Run from the backend directory, e.g. `python -m benchmarks.connection_pool`
+"""
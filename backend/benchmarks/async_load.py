@@ -0,0 +1,114 @@
+"""
+Throughput of cheap endpoints alone vs while heavy analytics requests saturate their limit
+
+Drives the app in-process over ASGI: clients loop on cheap endpoints (chat, a
+cached vehicle page, a single-vehicle lookup) for --seconds, first on their own
+and then alongside clients hammering whole-fleet batch scoring.
+
+Usage: python -m benchmarks.async_load [--vehicles 50000] [--seconds 5] [--cheap-clients 16] [--heavy-clients 32]
+       FLEET_DB_PATH=fleet_data.db python -m benchmarks.async_load --existing-db
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+
+
+def cheap_requests(vehicle_id):
+    return (
+        ("ai-chat", "POST", "/api/ai-chat", {"message": "how do I save on fuel?"}),
+        ("vehicles", "GET", "/api/vehicles?limit=20", None),
+        ("predict-maintenance", "POST", "/api/predict-maintenance", {"vehicle_id": vehicle_id}),
+    )
+
+
+HEAVY_REQUEST = ("predict-maintenance-batch", "POST", "/api/predict-maintenance/batch", {})
+
+
+async def client_loop(client, requests, deadline, latencies, statuses):
+    i = 0
+    while time.perf_counter() < deadline:
+        name, method, url, body = requests[i % len(requests)]
+        i += 1
+        start = time.perf_counter()
+        response = await client.request(method, url, json=body)
+        latencies[name].append((time.perf_counter() - start) * 1000)
+        statuses[name][response.status_code] += 1
+        await asyncio.sleep(0)   # in-process requests that never suspend would otherwise starve the other clients
+
+
+async def run_phase(app, cheap, seconds, cheap_clients, heavy_clients):
+    import httpx
+
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        deadline = time.perf_counter() + seconds
+        # Each client sticks to one endpoint so a slow one doesn't throttle the others' numbers
+        tasks = [client_loop(client, (cheap[i % len(cheap)],), deadline, latencies, statuses) for i in range(cheap_clients)]
+        tasks += [client_loop(client, (HEAVY_REQUEST,), deadline, latencies, statuses) for _ in range(heavy_clients)]
+        await asyncio.gather(*tasks)
+
+    results = {}
+    for name, values in latencies.items():
+        values.sort()
+        results[name] = {
+            "rps": round(len(values) / seconds, 1),
+            "p50_ms": round(statistics.median(values), 2),
+            "p99_ms": round(values[max(0, int(len(values) * 0.99) - 1)], 2),
+            "statuses": dict(statuses[name])
+        }
+    return results
+
+
+def print_phase(title, results):
+    print(title)
+    for name, result in results.items():
+        print(f"  {name:<27} {result['rps']:>8.1f} req/s  p50={result['p50_ms']:.2f}ms  "
+              f"p99={result['p99_ms']:.2f}ms  {result['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=50_000)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--cheap-clients', type=int, default=16)
+    parser.add_argument('--heavy-clients', type=int, default=32)
+    parser.add_argument('--existing-db', action='store_true', help="use FLEET_DB_PATH instead of generating a database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if not args.existing_db:
+            os.environ['FLEET_DB_PATH'] = os.path.join(tmp, 'fleet_data.db')   # before anything imports db
+            from data_generator import create_database
+            create_database(os.environ['FLEET_DB_PATH'], num_vehicles=args.vehicles, days=7)
+        import main as api   # reads FLEET_DB_PATH at import
+
+        api.migrate_schema()
+        with api.db_pool.connection() as conn:
+            cheap = cheap_requests(conn.execute("SELECT MIN(vehicle_id) FROM vehicles").fetchone()[0])
+
+        async def both_phases():   # one event loop, which the endpoint limits' semaphores bind to
+            return (await run_phase(api.app, cheap, args.seconds, args.cheap_clients, 0),
+                    await run_phase(api.app, cheap, args.seconds, args.cheap_clients, args.heavy_clients))
+        baseline, saturated = asyncio.run(both_phases())
+        executor_stats = api.db_executor.stats()
+        heavy_limit = api.endpoint_limits[HEAVY_REQUEST[0]].stats()
+        api.close_db_pool()
+
+    print_phase("cheap endpoints alone:", baseline)
+    print_phase(f"with {args.heavy_clients} clients on {HEAVY_REQUEST[2]}:", saturated)
+    names = [name for name, *_ in cheap]
+    ratio = sum(saturated[n]['rps'] for n in names) / sum(baseline[n]['rps'] for n in names)
+    print(f"cheap throughput retained under load: {ratio:.0%}")
+    print(f"executor: {executor_stats}")
+    print(f"{HEAVY_REQUEST[0]} limit: {heavy_limit}")
+
+
+if __name__ == "__main__":
+    main()
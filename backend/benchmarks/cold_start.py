@@ -0,0 +1,77 @@
+"""
+Cold-start import budget check for the API entry points
+
+Imports the app module in a fresh interpreter under `python -X importtime` and
+exits non-zero if its cumulative import time exceeds the budget or if any of the
+heavy analytics packages are imported eagerly. Intended to run in CI:
+
+    python -m benchmarks.cold_start                       # backend/main.py
+    python -m benchmarks.cold_start --path ../api         # serverless entry point
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Must only ever be imported lazily by the request paths that need them
+HEAVY_MODULES = ('numpy', 'pandas', 'sklearn', 'scipy', 'pyarrow', 'joblib')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile_import(module, path):
+    """Return [(name, self_us, cumulative_us, depth)] for one cold import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=path, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail if the app's cold-start import time regresses")
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--path', default=BACKEND_DIR)
+    parser.add_argument('--budget-ms', type=float, default=1500.0)
+    parser.add_argument('--runs', type=int, default=3, help="best of N runs is compared to the budget")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [profile_import(args.module, args.path) for _ in range(args.runs)]
+    totals = [next(cum for name, _, cum, _ in entries if name == args.module) for entries in runs]
+    best = min(range(len(runs)), key=lambda i: totals[i])
+    entries = runs[best]
+    total_ms = totals[best] / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    top_level = sorted((e for e in entries if e[3] <= 1), key=lambda e: e[2], reverse=True)
+    for name, _, cumulative_us, _ in top_level[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"cold-start import took {total_ms:.1f} ms, over the {args.budget_ms:.0f} ms budget")
+    eager = sorted({name.split('.')[0] for name, *_ in entries} & set(HEAVY_MODULES))
+    if eager:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Repeat fetches of the conditional endpoints: plain, gzip, and revalidated with If-None-Match
+
+Drives the app in-process over ASGI and reports latency and bytes on the wire per
+request for each mode, with the response cache warm and with it cleared before
+every request (where a 304 comes from the table versions alone).
+
+Usage: python -m benchmarks.conditional [--vehicles 20000] [--requests 300]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+URLS = ("/api/vehicles?limit=500", "/api/maintenance-alerts", "/api/fuel-trends?days=30")
+
+MODES = {
+    "identity": {"Accept-Encoding": "identity"},
+    "gzip": {"Accept-Encoding": "gzip"},
+    "If-None-Match": {"Accept-Encoding": "gzip"},   # plus the ETag of a first response
+}
+
+
+async def measure(api, client, url, headers, requests, cold):
+    latencies, wire_bytes, statuses = [], 0, set()
+    for _ in range(requests):
+        if cold:
+            api.response_cache.invalidate()
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        wire_bytes += response.num_bytes_downloaded
+        statuses.add(response.status_code)
+    return statistics.median(latencies), wire_bytes // requests, sorted(statuses)
+
+
+async def run(api, requests):
+    import httpx
+
+    results = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for url in URLS:
+            etag = (await client.get(url)).headers["etag"]
+            for cold in (False, True):
+                for mode, headers in MODES.items():
+                    if mode == "If-None-Match":
+                        headers = {**headers, "If-None-Match": etag}
+                    p50, size, statuses = await measure(api, client, url, headers, requests, cold)
+                    results.append((url, "cleared" if cold else "warm", mode, p50, size, statuses))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=20_000)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['FLEET_DB_PATH'] = os.path.join(tmp, 'fleet_data.db')   # before anything imports db
+        from data_generator import create_database
+        os.environ['FLEET_ANOMALY_STREAM'] = '0'
+        create_database(os.environ['FLEET_DB_PATH'], num_vehicles=args.vehicles, days=30)
+        import main as api   # reads FLEET_DB_PATH at import
+
+        api.migrate_schema()
+        results = asyncio.run(run(api, args.requests))
+        api.close_db_pool()
+
+    print(f"{args.vehicles:,} vehicles, median of {args.requests} requests:")
+    for url, cache, mode, p50, size, statuses in results:
+        print(f"  {url:<28} cache {cache:<8} {mode:<14} p50={p50:7.3f}ms  {size:>8,} B/request  {statuses}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Compare per-request sqlite3.connect() against the pooled connections in db.py
+
+Usage: python -m benchmarks.connection_pool [--requests 2000] [--threads 8]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from db import ConnectionPool
+from simple_data_generator import create_simple_database
+
+# Same statements /api/fleet-summary issues per request
+SUMMARY_QUERIES = (
+    "SELECT COUNT(*) FROM vehicles",
+    "SELECT COUNT(*) FROM vehicles WHERE status = 'active'",
+    "SELECT AVG(fuel_efficiency) FROM fuel_data WHERE date >= date('now', '-7 days')",
+    "SELECT COUNT(*) FROM vehicles WHERE next_maintenance <= date('now', '+7 days')",
+)
+
+
+def run_queries(conn):
+    for sql in SUMMARY_QUERIES:
+        conn.execute(sql).fetchone()
+
+
+def connect_per_request(db_path):
+    def request():
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        run_queries(conn)
+        conn.close()
+    return request
+
+
+def pooled(pool):
+    def request():
+        with pool.connection() as conn:
+            run_queries(conn)
+    return request
+
+
+def measure(request, num_requests, num_threads):
+    def timed(_):
+        start = time.perf_counter()
+        request()
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        latencies = sorted(executor.map(timed, range(num_requests)))
+
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+        "mean_ms": round(statistics.fmean(latencies), 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            create_simple_database()
+        finally:
+            os.chdir(cwd)
+        db_path = os.path.join(tmp, 'fleet_data.db')
+
+        pool = ConnectionPool(db_path, max_size=args.threads)
+        results = {
+            "connect_per_request": measure(connect_per_request(db_path), args.requests, args.threads),
+            "pooled": measure(pooled(pool), args.requests, args.threads)
+        }
+        pool_stats = pool.stats()
+        pool.close()
+
+    for name, result in results.items():
+        print(f"{name:<22} p50={result['p50_ms']:.3f}ms  p99={result['p99_ms']:.3f}ms  mean={result['mean_ms']:.3f}ms")
+    print(f"pool stats: {pool_stats}")
+
+
+if __name__ == "__main__":
+    main()
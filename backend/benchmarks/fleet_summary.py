@@ -0,0 +1,87 @@
+"""
+Fleet summary latency (SQL parts): sequential statements, a one-pass SUM(CASE ...)
+scan, one consolidated statement, and parallel part groups on separate connections
+
+Usage: python -m benchmarks.fleet_summary [--vehicles 200000] [--iterations 50]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import queries
+import summary
+from db import ConnectionPool
+
+
+# Evaluates the predicate on every row instead of counting an index range
+ONE_PASS_SCAN = """
+    SELECT COUNT(*), SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END)
+    FROM vehicles
+"""
+
+
+def sequential(pool):
+    with pool.connection() as conn:
+        return [conn.execute(sql).fetchone()[0] for sql in queries.FLEET_SUMMARY_PARTS.values()]
+
+
+def one_pass(pool):
+    with pool.connection() as conn:
+        return conn.execute(ONE_PASS_SCAN).fetchone(), conn.execute(queries.FLEET_AVG_EFFICIENCY).fetchone()
+
+
+def consolidated(pool):
+    with pool.connection() as conn:
+        return summary.run_parts(conn, summary.ALL_PARTS)
+
+
+def parallel(pool, executor):
+    def run(parts):
+        with pool.connection() as conn:
+            return summary.run_parts(conn, parts)
+    return list(executor.map(run, summary.PARALLEL_GROUPS))
+
+
+def measure(func, iterations):
+    func()  # warm the statement cache
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(latencies), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=200_000)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    from data_generator import create_database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'fleet_data.db')
+        create_database(db_path, num_vehicles=args.vehicles, days=7)
+
+        pool = ConnectionPool(db_path, max_size=4)
+        with ThreadPoolExecutor(max_workers=len(summary.PARALLEL_GROUPS)) as executor:
+            results = {
+                "sequential (1 statement per part)": measure(lambda: sequential(pool), args.iterations),
+                "one-pass SUM(CASE ...) scan": measure(lambda: one_pass(pool), args.iterations),
+                "consolidated (1 statement)": measure(lambda: consolidated(pool), args.iterations),
+                "parallel groups": measure(lambda: parallel(pool, executor), args.iterations),
+            }
+        pool.close()
+
+    print(f"{args.vehicles:,} vehicles, {os.cpu_count()} CPU(s), median of {args.iterations}:")
+    for name, p50 in results.items():
+        print(f"  {name:<28} {p50:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
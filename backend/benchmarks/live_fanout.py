@@ -0,0 +1,103 @@
+"""
+Live feed fan-out: database work per refresh vs number of SSE subscribers
+
+Opens N in-process subscribers on the app's live feed and, every --interval
+seconds, writes a burst of fuel records and invalidates the response cache so
+each refresh really queries and the trends section changes. Counts the jobs run
+on db_executor and the events delivered. One extra subscriber never reads, to
+show coalescing and the slow-client drop.
+
+Usage: python -m benchmarks.live_fanout [--vehicles 20000] [--subscribers 1,10,100,1000] [--seconds 3]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+async def drain(api, subscriber, received):
+    async for chunk in api.live_feed.stream(subscriber):
+        received[0] += chunk.count(b"\nevent: ")
+
+
+def write_burst(conn, vehicle_id, fuel, rows=100):
+    with conn:
+        conn.executemany(
+            "INSERT INTO fuel_data (vehicle_id, date, fuel_consumed, distance_traveled, fuel_efficiency) "
+            "VALUES (?, date('now'), ?, 2000.0, 2000.0 / ?)",
+            [(vehicle_id, fuel, fuel)] * rows
+        )
+
+
+async def run(api, subscribers, seconds, interval):
+    feed = api.live_feed
+    feed.interval = interval
+    feed.stall_seconds = seconds / 2
+    jobs_before = api.db_executor.stats()["completed"]
+    refreshes_before = feed.stats()["refreshes"]
+
+    received = [0]
+    readers = [asyncio.create_task(drain(api, feed.subscribe(), received)) for _ in range(subscribers)]
+    stuck = feed.subscribe()   # never read: its pending messages coalesce until it is dropped
+
+    from db import connect
+    conn = connect(api.DB_PATH)
+    vehicle_id = conn.execute("SELECT MIN(vehicle_id) FROM vehicles").fetchone()[0]
+    deadline = time.perf_counter() + seconds
+    burst = 0
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(interval)
+        burst += 1
+        write_burst(conn, vehicle_id, fuel=50.0 + 10 * (burst % 2))   # alternating, so today's averages keep moving
+        api.response_cache.invalidate()
+        feed.refresh_soon()
+
+    stats = feed.stats()
+    stuck_coalesced = stuck.coalesced
+    feed.close()
+    conn.close()
+    await asyncio.gather(*readers)
+    refreshes = stats["refreshes"] - refreshes_before
+    return {
+        "refreshes": refreshes,
+        "db_jobs_per_refresh": round((api.db_executor.stats()["completed"] - jobs_before) / max(refreshes, 1), 2),
+        "events_delivered": received[0],
+        "stuck_coalesced": stuck_coalesced,
+        "stuck_dropped": stuck.closed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=20_000)
+    parser.add_argument('--subscribers', default='1,10,100,1000')
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--interval', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['FLEET_DB_PATH'] = os.path.join(tmp, 'fleet_data.db')   # before anything imports db
+        from data_generator import create_database
+        os.environ['FLEET_ANOMALY_STREAM'] = '0'
+        create_database(os.environ['FLEET_DB_PATH'], num_vehicles=args.vehicles, days=30)
+        import main as api   # reads FLEET_DB_PATH at import
+
+        api.migrate_schema()
+        api.live_feed.max_subscribers = max(int(n) for n in args.subscribers.split(',')) + 1
+
+        async def all_runs():   # one event loop, which the endpoint limits' semaphores bind to
+            return {int(n): await run(api, int(n), args.seconds, args.interval) for n in args.subscribers.split(',')}
+        results = asyncio.run(all_runs())
+        api.close_db_pool()
+
+    print(f"{args.vehicles:,} vehicles, fuel records written every {args.interval}s for {args.seconds}s:")
+    for subscribers, result in results.items():
+        print(f"  {subscribers:>5} subscribers  refreshes={result['refreshes']:<3} "
+              f"db jobs/refresh={result['db_jobs_per_refresh']:<5} events delivered={result['events_delivered']:<6} "
+              f"slow client: coalesced={result['stuck_coalesced']} dropped={result['stuck_dropped']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Scalar MaintenancePredictor.predict_maintenance_need vs the vectorized predict_batch
+
+Usage: python -m benchmarks.maintenance_batch [--vehicles 1000000]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import models
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=1_000_000)
+    parser.add_argument('--scalar-sample', type=int, default=20_000, help="scalar timing is extrapolated from this many")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    predictor = models.MaintenancePredictor()
+    type_codes = rng.integers(0, len(models.VEHICLE_TYPES), args.vehicles).astype(np.int8)
+    last_maintenance = models.today_epoch_day() - rng.integers(0, 365, args.vehicles).astype(np.int32)
+
+    start = time.perf_counter()
+    predictor.predict_batch(type_codes, last_maintenance)
+    batch_s = time.perf_counter() - start
+
+    today = datetime.now().date()
+    sample = [
+        {
+            'type': models.VEHICLE_TYPES[type_codes[i]],
+            'last_maintenance': (today - timedelta(days=int(models.today_epoch_day() - last_maintenance[i]))).isoformat()
+        }
+        for i in range(min(args.scalar_sample, args.vehicles))
+    ]
+    start = time.perf_counter()
+    for vehicle in sample:
+        predictor.predict_maintenance_need(vehicle)
+    scalar_s = (time.perf_counter() - start) / len(sample) * args.vehicles
+
+    print(f"{args.vehicles:,} vehicles  scalar: {scalar_s:8.3f} s (extrapolated)  "
+          f"batch: {batch_s * 1000:8.1f} ms  ({scalar_s / batch_s:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
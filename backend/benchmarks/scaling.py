@@ -0,0 +1,254 @@
+"""
+Throughput scaling of the preforked server across worker counts
+
+For each worker count the production server (run.py --workers N) is started on
+a suite dataset, waited on until /readyz answers from every worker, then driven
+by --clients closed-loop client processes (one keep-alive connection each,
+cycling through the endpoint mix) for --seconds. Reports requests/s, latency
+percentiles and speedup over one worker, plus the workers' memory split into
+pages shared with the master (the preloaded models) and private ones.
+
+    python -m benchmarks.scaling                          # 1, 2, 4... up to the CPU count
+    python -m benchmarks.scaling --workers 1,2,4,8 --clients 32 --seconds 20
+
+The clients run on the same machine and compete with the workers for CPU, so
+give the box more cores than the largest worker count to see the server's own
+scaling.
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.suite import ENDPOINTS, SCALES, dataset
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ENDPOINTS = ("fleet-summary", "vehicles", "fuel-trends-weekly", "maintenance-alerts", "ai-chat")
+
+
+def default_workers():
+    counts, count = [], 1
+    while count < (os.cpu_count() or 1):
+        counts.append(count)
+        count *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def _get(port, path, timeout=2.0):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def wait_ready(process, port, workers, timeout=120.0):
+    """Block until /readyz has answered from `workers` distinct processes"""
+    pids, deadline = set(), time.monotonic() + timeout
+    while len(pids) < workers:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"only {len(pids)} of {workers} workers ready after {timeout:.0f}s")
+        try:
+            status, body = _get(port, "/readyz")
+            if status == 200:
+                pids.add(json.loads(body)["pid"])
+                continue
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return pids
+
+
+def memory(pid):
+    """(shared, private) resident kB of a process, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        return None
+    return (fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+            fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0))
+
+
+def client(port, requests, start_at, stop_at, results):
+    """One closed-loop client: a keep-alive connection issuing `requests` round-robin"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, errors, i = [], 0, 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    while True:
+        method, path, body = requests[i % len(requests)]
+        i += 1
+        began = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers={"Content-Type": "application/json"} if body else {})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            ok = False
+        ended = time.time()
+        if ended > stop_at:
+            break
+        if ok:
+            latencies.append((time.perf_counter() - began) * 1000)
+        else:
+            errors += 1
+    conn.close()
+    results.put((latencies, errors))
+
+
+def drive(port, requests, clients, seconds, warmup):
+    """Run the clients for `seconds` after `warmup`; returns throughput and latency stats"""
+    results = multiprocessing.Queue()
+    start_at = time.time() + 0.5
+    warm_until = start_at + warmup
+    processes = [
+        multiprocessing.Process(target=client, args=(port, requests, start_at, warm_until, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:   # warmup round: results discarded
+        results.get()
+    for process in processes:
+        process.join()
+
+    start_at = time.time() + 0.5
+    processes = [
+        multiprocessing.Process(target=client, args=(port, requests, start_at, start_at + seconds, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+    latencies, errors = [], 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for process in processes:
+        process.join()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+    }
+
+
+def measure(db_path, workers, port, requests, args):
+    env = dict(os.environ, FLEET_DB_PATH=db_path, FLEET_ANOMALY_STREAM='0')
+    server = subprocess.Popen(
+        [sys.executable, "run.py", "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1",
+         "--drain-seconds", "0"],
+        cwd=BACKEND_DIR, env=env, stdout=None if args.verbose else subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL
+    )
+    try:
+        pids = wait_ready(server, port, workers)
+        result = drive(port, requests, args.clients, args.seconds, args.warmup)
+        usage = [m for m in map(memory, pids) if m is not None]
+        if usage:
+            result["worker_shared_kb"] = round(statistics.mean(shared for shared, _ in usage))
+            result["worker_private_kb"] = round(statistics.mean(private for _, private in usage))
+        return result
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def first_vehicle(db_path):
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT MIN(vehicle_id) FROM vehicles").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure server throughput at increasing worker counts")
+    parser.add_argument('--workers', type=lambda s: [int(n) for n in s.split(',')], default=default_workers())
+    parser.add_argument('--clients', type=int, help="concurrent client processes (default: 4 per worker of the largest count)")
+    parser.add_argument('--seconds', type=float, default=10.0, help="measured duration per worker count")
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--endpoints', type=lambda s: s.split(','), default=list(DEFAULT_ENDPOINTS),
+                        help="comma-separated names from benchmarks.suite.ENDPOINTS")
+    parser.add_argument('--scale', default='100k', choices=tuple(SCALES))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'fleet-benchmarks'))
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help="also write the results as JSON")
+    parser.add_argument('--verbose', action='store_true', help="show the server's own output")
+    args = parser.parse_args()
+    args.clients = args.clients or 4 * max(args.workers)
+
+    by_name = {name: (method, url, body) for name, method, url, body in ENDPOINTS}
+    unknown = [name for name in args.endpoints if name not in by_name]
+    if unknown:
+        parser.error(f"unknown endpoints {unknown}")
+
+    db_path = dataset(args.data_dir, args.scale, args.seed, date.today().isoformat())
+    vehicle_id = first_vehicle(db_path)
+    requests = []
+    for name in args.endpoints:
+        method, url, body = by_name[name]
+        body = json.dumps(body).replace("{vehicle_id}", vehicle_id) if body is not None else None
+        requests.append((method, url.replace("{vehicle_id}", vehicle_id), body))
+
+    cpus = os.cpu_count() or 1
+    print(f"{args.scale} dataset, {args.clients} clients, {args.seconds:g}s per run, {cpus} CPUs")
+    if max(args.workers) >= cpus:
+        print("  note: clients share the CPUs with the workers, so throughput flattens before the CPU count")
+    print(f"{'workers':>7} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} "
+          f"{'shared MB':>10} {'private MB':>11}")
+
+    results = {}
+    for workers in args.workers:
+        result = measure(db_path, workers, args.port, requests, args)
+        results[workers] = result
+        baseline = results[args.workers[0]]["rps"]
+        speedup = result["rps"] / baseline if baseline else 0
+        shared = result.get("worker_shared_kb", 0) / 1024
+        private = result.get("worker_private_kb", 0) / 1024
+        print(f"{workers:>7} {result['rps']:>9.1f} {speedup:>7.2f}x {result['p50_ms'] or 0:>8.2f} "
+              f"{result['p95_ms'] or 0:>8.2f} {result['errors']:>7} {shared:>10.1f} {private:>11.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"cpu_count": cpus, "clients": args.clients, "seconds": args.seconds,
+                       "endpoints": args.endpoints, "scale": args.scale, "results": results}, f, indent=1)
+        print(f"Wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Per-request CPU and memory of the old pandas path vs cursor rows + orjson
+
+Usage: python -m benchmarks.serialization [--iterations 500] [--vehicles 5000]
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from schema import migrate
+
+VEHICLE_LIST = "SELECT * FROM vehicles LIMIT ?"
+
+
+def build_database(path, num_vehicles):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO vehicles VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            (f"TRK-{i:06d}", "Truck", "active", 15000 + i, 25.0 + (i % 10) / 10,
+             "2025-01-01", f"2025-{1 + i % 12:02d}-15")
+            for i in range(num_vehicles)
+        ]
+    )
+    conn.commit()
+    return conn
+
+
+def pandas_path(conn, limit):
+    import pandas as pd
+    frame = pd.read_sql_query(VEHICLE_LIST, conn, params=[limit])
+    return JSONResponse(jsonable_encoder(frame.to_dict('records'))).body
+
+
+def cursor_path(conn, limit):
+    return ORJSONResponse([dict(row) for row in conn.execute(VEHICLE_LIST, (limit,))]).body
+
+
+def measure(func, conn, limit, iterations):
+    func(conn, limit)  # warm imports and statement cache
+    start = time.process_time()
+    for _ in range(iterations):
+        func(conn, limit)
+    cpu_ms = (time.process_time() - start) * 1000 / iterations
+
+    tracemalloc.start()
+    func(conn, limit)
+    peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return cpu_ms, peak_kb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--vehicles', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_database(os.path.join(tmp, 'bench.db'), args.vehicles)
+        conn.row_factory = sqlite3.Row
+        for limit in (20, 1000, args.vehicles):
+            old_cpu, old_mem = measure(pandas_path, conn, limit, args.iterations)
+            new_cpu, new_mem = measure(cursor_path, conn, limit, args.iterations)
+            print(f"{limit:>6} rows  pandas: {old_cpu:7.3f} ms CPU {old_mem:9.1f} KiB peak  |  "
+                  f"cursor+orjson: {new_cpu:7.3f} ms CPU {new_mem:9.1f} KiB peak  "
+                  f"({old_cpu / new_cpu:.1f}x CPU)")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Benchmark suite: every API endpoint and model path at fixed-seed dataset scales
+
+Datasets are generated once per (scale, seed, end date) and reused from
+--data-dir. Each scale runs in its own process (FLEET_DB_PATH is read at import)
+which drives the app in-process over ASGI, warm and with the response cache
+cleared before every request, then times the model entry points directly.
+Results are written as JSON; `compare` flags medians that got slower than
+--threshold (and by more than --min-delta-ms, so sub-millisecond jitter on the
+cheap endpoints doesn't count).
+
+Usage: python -m benchmarks.suite run [--scales 1k,100k] [--output results.json] [--baseline old.json]
+       python -m benchmarks.suite run --scales 10m          # ~10M fuel rows; generation takes a few minutes
+       python -m benchmarks.suite compare old.json new.json [--threshold 0.15]
+
+Endpoint windows are relative to today, so the default --end-date is today:
+datasets from the same seed have the same shape whatever day they are built.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timezone
+
+# Fuel rows = vehicles * days
+SCALES = {
+    "1k": {"vehicles": 100, "days": 10},
+    "100k": {"vehicles": 2_000, "days": 50},
+    "10m": {"vehicles": 100_000, "days": 100},
+}
+
+# (name, method, url, body); "{vehicle_id}" is replaced by the first vehicle of the dataset
+ENDPOINTS = (
+    ("fleet-summary", "GET", "/api/fleet-summary", None),
+    ("vehicles", "GET", "/api/vehicles?limit=20", None),
+    ("vehicles-page-500", "GET", "/api/vehicles?limit=500", None),
+    ("vehicles-filtered", "GET", "/api/vehicles?limit=100&status=maintenance&fields=vehicle_id,status", None),
+    ("fuel-trends", "GET", "/api/fuel-trends", None),
+    ("fuel-trends-90d", "GET", "/api/fuel-trends?days=90", None),
+    ("fuel-trends-weekly", "GET", "/api/fuel-trends?bucket=week&group_by=type", None),
+    ("fuel-trends-monthly", "GET", "/api/fuel-trends?bucket=month&group_by=type", None),
+    ("fuel-trends-vehicle", "GET", "/api/fuel-trends?bucket=month&group_by=vehicle&vehicle_id={vehicle_id}", None),
+    ("maintenance-alerts", "GET", "/api/maintenance-alerts", None),
+    ("maintenance-alerts-top", "GET", "/api/maintenance-alerts?within_days=30&limit=50", None),
+    ("performance-metrics", "GET", "/api/performance-metrics", None),
+    ("predict-maintenance", "POST", "/api/predict-maintenance", {"vehicle_id": "{vehicle_id}"}),
+    ("predict-maintenance-batch", "POST", "/api/predict-maintenance/batch", {}),
+    ("predict-efficiency-batch", "POST", "/api/predict-efficiency/batch", {}),
+    ("anomalies", "GET", "/api/anomalies", None),
+    ("ai-chat", "POST", "/api/ai-chat", {"message": "which vehicles need maintenance?"}),
+    ("db-stats", "GET", "/api/db-stats", None),
+    ("executor-stats", "GET", "/api/executor-stats", None),
+    ("cache-stats", "GET", "/api/cache-stats", None),
+    ("registry-stats", "GET", "/api/registry-stats", None),
+    ("live-stats", "GET", "/api/live-stats", None),
+    ("latency-stats", "GET", "/api/latency-stats", None),
+    ("metrics", "GET", "/metrics", None),
+    ("healthz", "GET", "/healthz", None),
+    ("readyz", "GET", "/readyz", None),
+    ("cache-invalidate", "POST", "/api/cache/invalidate", {"tables": []}),
+)
+
+# Routes measured some other way than a plain request
+SPECIAL_ROUTES = {("GET", "/api/live")}
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "n": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 4),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(latencies), 4),
+        "min_ms": round(latencies[0], 4)
+    }
+
+
+class Budget:
+    """Repeat a measurement until min_seconds have passed, within [min_iterations, max_iterations]"""
+
+    def __init__(self, min_seconds, min_iterations, max_iterations):
+        self.min_seconds = min_seconds
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+
+    def __iter__(self):
+        deadline = time.perf_counter() + self.min_seconds
+        for i in range(self.max_iterations):
+            if i >= self.min_iterations and time.perf_counter() >= deadline:
+                return
+            yield i
+
+
+def timed(func, budget, setup=None):
+    latencies = []
+    for _ in budget:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+
+async def atimed(func, budget, setup=None):
+    latencies = []
+    for _ in budget:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        await func()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0)
+    return summarize(latencies)
+
+
+async def bench_endpoints(api, budget):
+    import httpx
+
+    with api.db_pool.connection() as conn:
+        vehicle_id = conn.execute("SELECT MIN(vehicle_id) FROM vehicles").fetchone()[0]
+
+    results = {}
+    transport = httpx.ASGITransport(app=api.app)
+    headers = {"X-Admin-Token": api.ADMIN_TOKEN}   # for cache-invalidate
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for name, method, url, body in ENDPOINTS:
+            if body is not None:
+                body = json.loads(json.dumps(body).replace("{vehicle_id}", vehicle_id))
+
+            async def call():
+                response = await client.request(method, url, json=body)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{method} {url} returned {response.status_code}")
+
+            await call()   # first use: imports, statement cache
+            results[f"{name}:warm"] = await atimed(call, budget)
+            results[f"{name}:cold"] = await atimed(call, budget, setup=api.response_cache.invalidate)
+
+    # /api/live streams forever; what each of its refreshes costs is one LiveFeed.refresh()
+    results["live-refresh:cold"] = await atimed(api.live_feed.refresh, budget, setup=api.response_cache.invalidate)
+    return results
+
+
+def uncovered_routes(app):
+    covered = {(method, url.split('?')[0]) for _, method, url, _ in ENDPOINTS} | SPECIAL_ROUTES
+    routes = {(method, route.path) for route in app.routes if hasattr(route, 'methods')
+              for method in route.methods if method not in ('HEAD', 'OPTIONS')}
+    return sorted(f"{method} {path}" for method, path in routes - covered
+                  if not path.startswith(('/docs', '/redoc', '/openapi')))
+
+
+def bench_models(db_path, budget):
+    import pandas as pd
+
+    import models
+
+    results = {}
+    conn = models.sqlite3.connect(db_path)
+    vehicle = dict(zip(('vehicle_id', 'type', 'mileage', 'last_maintenance'), conn.execute(
+        "SELECT vehicle_id, type, mileage, last_maintenance FROM vehicles ORDER BY vehicle_id LIMIT 1"
+    ).fetchone()))
+    fleet = pd.read_sql_query("SELECT type, mileage, last_maintenance FROM vehicles", conn)
+    recent = pd.read_sql_query(
+        "SELECT vehicle_id, fuel_efficiency, fuel_consumed, distance_traveled FROM fuel_data "
+        "WHERE date >= date('now', '-7 days')", conn
+    )
+    conn.close()
+
+    # Training is slow at the large scale; three runs are enough for a median
+    training = Budget(0, 3, 3)
+    fuel = models.FuelEfficiencyPredictor()
+    results["fuel_predictor.train"] = timed(lambda: fuel.train(db_path), training)
+    results["fuel_predictor.predict"] = timed(lambda: fuel.predict(vehicle), budget)
+    fuel_types = fuel.encode_types(list(fleet['type']))
+    results["fuel_predictor.predict_batch"] = timed(
+        lambda: fuel.predict_batch(fleet['mileage'].to_numpy(), models.to_epoch_days(fleet['last_maintenance']),
+                                   fuel_types), budget
+    )
+
+    maintenance = models.MaintenancePredictor()
+    results["maintenance_predictor.predict_maintenance_need"] = timed(
+        lambda: maintenance.predict_maintenance_need(vehicle), budget
+    )
+    type_codes = models.encode_vehicle_types(fleet['type'])
+    last_maintenance = models.to_epoch_days(fleet['last_maintenance'])
+    results["maintenance_predictor.predict_batch"] = timed(
+        lambda: maintenance.predict_batch(type_codes, last_maintenance), budget
+    )
+
+    anomaly = models.AnomalyDetector()
+    results["anomaly_detector.train"] = timed(lambda: anomaly.train(db_path), training)
+    results["anomaly_detector.detect_anomalies"] = timed(lambda: anomaly.detect_anomalies(recent), budget)
+    results["anomaly_detector.detect_anomalies"]["rows"] = len(recent)
+    return results
+
+
+def run_scale(args):
+    """Child process: benchmark one dataset and write its results to --result-file"""
+    os.environ['FLEET_DB_PATH'] = args.db   # before anything imports db
+    os.environ['FLEET_ANOMALY_STREAM'] = '0'
+    os.environ.setdefault('FLEET_ADMIN_TOKEN', 'bench')
+    import main as api
+
+    budget = Budget(args.min_seconds, args.min_iterations, args.max_iterations)
+    api.migrate_schema()
+
+    async def endpoints():   # one event loop, which the endpoint limits' semaphores bind to
+        return await bench_endpoints(api, budget)
+
+    result = {"endpoints": asyncio.run(endpoints()), "uncovered_routes": uncovered_routes(api.app)}
+    api.close_db_pool()
+    result["models"] = bench_models(args.db, budget)
+    with open(args.result_file, 'w') as f:
+        json.dump(result, f)
+
+
+def dataset(data_dir, scale, seed, end_date):
+    """Path of the dataset for this scale, generating it on first use"""
+    path = os.path.join(data_dir, f"fleet-{scale}-seed{seed}-{end_date}.db")
+    if not os.path.exists(path):
+        from data_generator import create_database
+
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {scale} dataset ({SCALES[scale]['vehicles']:,} vehicles x {SCALES[scale]['days']} days)...")
+        start = time.perf_counter()
+        create_database(f"{path}.tmp", num_vehicles=SCALES[scale]["vehicles"], days=SCALES[scale]["days"],
+                        seed=seed, end_date=end_date)
+        os.replace(f"{path}.tmp", path)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+    return path
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True).stdout.strip()
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    end_date = args.end_date or date.today().isoformat()
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "end_date": end_date,
+            "scales": {scale: SCALES[scale] for scale in args.scales}
+        },
+        "results": {}
+    }
+
+    for scale in args.scales:
+        db_path = dataset(args.data_dir, scale, args.seed, end_date)
+        print(f"Benchmarking {scale}...")
+        with tempfile.NamedTemporaryFile(suffix='.json') as result_file:
+            subprocess.run([
+                sys.executable, "-m", "benchmarks.suite", "_scale", "--db", db_path,
+                "--result-file", result_file.name, "--min-seconds", str(args.min_seconds),
+                "--min-iterations", str(args.min_iterations), "--max-iterations", str(args.max_iterations)
+            ], check=True, stdout=subprocess.DEVNULL if not args.verbose else None)
+            result = json.load(open(result_file.name))
+        if result["uncovered_routes"]:
+            print(f"  not benchmarked: {', '.join(result['uncovered_routes'])}")
+        report["results"][scale] = result
+        print_scale(scale, result)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        return compare(json.load(open(args.baseline)), report, args.threshold, args.min_delta_ms)
+    return 0
+
+
+def print_scale(scale, result):
+    for section in ("endpoints", "models"):
+        for name, stats in result[section].items():
+            print(f"  {scale:>5} {name:<52} p50={stats['p50_ms']:10.3f}ms  p95={stats['p95_ms']:10.3f}ms  n={stats['n']}")
+
+
+def compare(baseline, current, threshold=0.15, min_delta_ms=0.1, metric="p50_ms"):
+    """Print per-benchmark changes; returns 1 if anything regressed beyond the threshold"""
+    regressions = 0
+    print(f"Comparing {baseline['meta'].get('revision')} -> {current['meta'].get('revision')} "
+          f"({metric}, threshold {threshold:.0%}, min delta {min_delta_ms}ms):")
+    for scale, result in current["results"].items():
+        old_result = baseline["results"].get(scale)
+        if old_result is None:
+            continue
+        for section in ("endpoints", "models"):
+            for name, stats in result[section].items():
+                old = old_result[section].get(name)
+                if old is None:
+                    print(f"  {scale:>5} {name:<52} new")
+                    continue
+                delta = stats[metric] - old[metric]
+                change = delta / old[metric] if old[metric] else 0.0
+                if change > threshold and delta > min_delta_ms:
+                    status = "REGRESSION"
+                    regressions += 1
+                elif change < -threshold and -delta > min_delta_ms:
+                    status = "faster"
+                else:
+                    status = ""
+                print(f"  {scale:>5} {name:<52} {old[metric]:10.3f} -> {stats[metric]:10.3f}ms  {change:+7.1%}  {status}")
+    print(f"{regressions} regression(s)")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def add_budget(command):
+        command.add_argument('--min-seconds', type=float, default=0.5, help="time spent per benchmark at least")
+        command.add_argument('--min-iterations', type=int, default=5)
+        command.add_argument('--max-iterations', type=int, default=500)
+
+    run_parser = commands.add_parser('run', help="benchmark the given scales and write JSON")
+    run_parser.add_argument('--scales', default='1k,100k', type=lambda s: s.split(','))
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--end-date', help="last day of generated history (default: today)")
+    run_parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'fleet-benchmarks'))
+    run_parser.add_argument('--output', default='benchmark-results.json')
+    run_parser.add_argument('--baseline', help="compare against this earlier results file")
+    run_parser.add_argument('--threshold', type=float, default=0.15)
+    run_parser.add_argument('--min-delta-ms', type=float, default=0.1)
+    run_parser.add_argument('--verbose', action='store_true', help="show the app's own output")
+    add_budget(run_parser)
+
+    compare_parser = commands.add_parser('compare', help="flag regressions between two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.15, help="relative slowdown that fails")
+    compare_parser.add_argument('--min-delta-ms', type=float, default=0.1, help="ignore smaller absolute changes")
+    compare_parser.add_argument('--metric', default='p50_ms', choices=('p50_ms', 'p95_ms', 'mean_ms', 'min_ms'))
+
+    scale_parser = commands.add_parser('_scale')   # internal: one scale in a fresh process
+    scale_parser.add_argument('--db', required=True)
+    scale_parser.add_argument('--result-file', required=True)
+    add_budget(scale_parser)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        unknown = [s for s in args.scales if s not in SCALES]
+        if unknown:
+            parser.error(f"unknown scales {unknown}; choose from {', '.join(SCALES)}")
+        return run(args)
+    if args.command == 'compare':
+        with open(args.baseline) as f, open(args.current) as g:
+            return compare(json.load(f), json.load(g), args.threshold, args.min_delta_ms, args.metric)
+    run_scale(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+In-process response cache for the read endpoints
+
+Entries expire after a per-endpoint TTL, the cache is bounded LRU, concurrent
+misses for the same key share a single computation, and entries are tagged with
+the tables they were computed from so writers can invalidate them explicitly.
+"""
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A computation in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache with single-flight misses and tag invalidation"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (value, expires_at, tags)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._epoch = 0                 # bumped on invalidation so stale in-flight results aren't stored
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get_or_compute(self, key, compute, ttl, tags=()):
+        """Return the cached value for key, computing it at most once across threads"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                leader = False
+            else:
+                flight = self._inflight[key] = _Flight()
+                self._misses += 1
+                leader = True
+                epoch = self._epoch
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if flight.error is None and epoch == self._epoch:
+                    self._store(key, flight.value, time.monotonic() + ttl, frozenset(tags))
+            flight.done.set()
+        return flight.value
+
+    def peek(self, key):
+        """Return (True, value) for a fresh entry, else (False, None); never waits on a computation"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, entry[0]
+
+    def _store(self, key, value, expires_at, tags):
+        self._entries[key] = (value, expires_at, tags)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, *tags):
+        """Drop entries computed from any of the given tables (all entries if none given)"""
+        with self._lock:
+            self._epoch += 1
+            if tags:
+                stale = [key for key, entry in self._entries.items() if entry[2].intersection(tags)]
+            else:
+                stale = list(self._entries)
+            for key in stale:
+                del self._entries[key]
+            self._invalidations += len(stale)
+            return len(stale)
+
+    def cached(self, name, ttl, tags=()):
+        """Decorator caching a function's result keyed by name and call arguments"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                key = (name, args, tuple(sorted(kwargs.items())))
+                return self.get_or_compute(key, lambda: func(*args, **kwargs), ttl, tags)
+            wrapper.peek = lambda *args, **kwargs: self.peek((name, args, tuple(sorted(kwargs.items()))))
+            return wrapper
+        return decorator
+
+    def stats(self):
+        """Snapshot of cache counters"""
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "hit_ratio": round((self._hits + self._coalesced) / lookups, 4) if lookups else 0.0
+            }
+
+
+response_cache = ResponseCache()
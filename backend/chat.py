@@ -0,0 +1,163 @@
+"""
+Fleet assistant chat engine
+
+A message is matched against every intent's keywords in one pass of a single
+compiled regex; when several intents match, the earliest in INTENTS wins. The
+answer is filled from the data the intent declares it needs: the fleet summary,
+the maintenance alert list and the 7-day fuel trends, fetched by the caller
+through the same cached loaders as the dashboard endpoints. A burst of chat
+messages therefore reads the response cache, not the tables.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+# (intent, keywords), in priority order; a trailing * matches any word starting with the stem
+INTENTS = (
+    ("fuel", ("fuel", "mpg", "consumption")),
+    ("efficiency", ("efficien*", "improve*", "optimi*")),
+    ("maintenance", ("maintenance", "servic*", "repair*", "due", "overdue")),
+    ("cost", ("cost*", "spend*", "budget*", "expens*")),
+    ("save", ("save", "saving*")),
+    ("alert", ("alert*", "urgent", "attention", "warning*")),
+    ("status", ("status", "active", "fleet size", "how many vehicles")),
+    ("hello", ("hello", "hi", "hey")),
+    ("help", ("help", "what can you")),
+)
+
+
+def _keyword(keyword):
+    if keyword.endswith("*"):
+        return rf"\b{re.escape(keyword[:-1])}"
+    return rf"\b{re.escape(keyword)}\b"
+
+
+_PATTERN = re.compile(
+    "|".join(f"(?P<{intent}>{'|'.join(map(_keyword, keywords))})" for intent, keywords in INTENTS),
+    re.IGNORECASE
+)
+
+_PRIORITY = {intent: index for index, (intent, _) in enumerate(INTENTS)}
+
+# What each intent's answer is built from; see main.ai_chat()
+NEEDS = {
+    "fuel": ("summary", "trends"),
+    "maintenance": ("summary", "alerts"),
+    "cost": ("trends",),
+    "alert": ("alerts",),
+    "status": ("summary",),
+}
+
+DEFAULT = ("I can help you with fuel efficiency, maintenance schedules, cost optimization, and fleet analytics. "
+           "Could you be more specific about what you'd like to know?")
+
+UNAVAILABLE = "I can't reach the fleet data right now. Please try again in a moment."
+
+STATIC = {
+    "efficiency": "To improve fuel efficiency, consider: 1) Regular maintenance schedules 2) Driver training programs "
+                  "3) Route optimization 4) Tire pressure monitoring.",
+    "save": "The biggest levers on fleet costs are fuel and unplanned repairs: route optimization and driver training "
+            "cut fuel use, and servicing vehicles before they are overdue avoids breakdowns. Ask about fuel or "
+            "maintenance to see where your fleet stands.",
+    "hello": "Hello! I'm your Fleet Intelligence Assistant. I can help with fuel efficiency, maintenance scheduling, "
+             "cost optimization, and fleet analytics. What would you like to know?",
+    "help": "I can assist with: \n• Fleet performance analytics\n• Maintenance predictions\n• Fuel efficiency "
+            "optimization\n• Cost analysis and savings\n• Vehicle status and alerts\n\nWhat specific area interests you?",
+}
+
+
+def match_intent(message):
+    """The highest-priority intent whose keywords occur in `message`, or None"""
+    best = None
+    for match in _PATTERN.finditer(message):
+        intent = match.lastgroup
+        if best is None or _PRIORITY[intent] < _PRIORITY[best]:
+            best = intent
+            if _PRIORITY[intent] == 0:
+                break
+    return best
+
+
+def _due_date(date_string):
+    return datetime.strptime(date_string, "%Y-%m-%d").strftime("%b %d").replace(" 0", " ")
+
+
+def _due_before(alerts, day):
+    """Alerts due before `day`; the list is ordered by next_maintenance, so this is a binary search"""
+    low, high = 0, len(alerts)
+    while low < high:
+        middle = (low + high) // 2
+        if (alerts[middle]["next_maintenance"] or "") < day:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _overdue(alerts):
+    return _due_before(alerts, datetime.now(timezone.utc).strftime("%Y-%m-%d"))
+
+
+def _fuel(summary, trends):
+    answer = (f"Your fleet's average fuel efficiency over the last 7 days is {summary['fuel_efficiency']} MPG "
+              f"across {summary['active_vehicles']} active vehicles.")
+    efficiency = [value for value in (trends or {}).get("efficiency", []) if value is not None]
+    if len(efficiency) >= 2:
+        low, high = min(efficiency), max(efficiency)
+        answer += f" Daily averages ranged from {low} to {high} MPG, {efficiency[-1]} MPG on the latest day."
+    return answer
+
+
+def _maintenance(summary, alerts):
+    if not alerts:
+        return "No vehicles are due for maintenance in the next 2 weeks."
+    answer = (f"You have {len(alerts)} vehicle{'s' if len(alerts) != 1 else ''} due for maintenance in the next "
+              f"2 weeks, {summary['maintenance_due']} of them within 7 days.")
+    urgent = [f"{alert['vehicle_id']} (due {_due_date(alert['next_maintenance'])})" for alert in alerts[:2]]
+    answer += f" The most urgent {'are' if len(urgent) > 1 else 'is'} {' and '.join(urgent)}."
+    overdue = _overdue(alerts)
+    if overdue:
+        answer += f" {overdue} {'are' if overdue != 1 else 'is'} already overdue."
+    return answer
+
+
+def _cost(trends):
+    fuel = [value for value in (trends or {}).get("fuel_usage", []) if value is not None]
+    answer = "Cost figures aren't tracked in the fleet database, so I can only speak to fuel use."
+    if fuel:
+        answer += (f" Fuel consumed averaged {sum(fuel) / len(fuel):.1f} gallons per vehicle per day over the last "
+                   f"week ({fuel[-1]} on the latest day).")
+    return answer
+
+
+def _alert(alerts):
+    if not alerts:
+        return "No active alerts: no vehicle is due for maintenance in the next 2 weeks."
+    overdue = _overdue(alerts)
+    week = (datetime.now(timezone.utc) + timedelta(days=8)).strftime("%Y-%m-%d")
+    within_week = _due_before(alerts, week) - overdue
+    later = len(alerts) - overdue - within_week
+    return (f"Current alerts: {overdue} vehicle{'s' if overdue != 1 else ''} overdue for maintenance, "
+            f"{within_week} due within 7 days and {later} more within 2 weeks.")
+
+
+def _status(summary):
+    return (f"{summary['active_vehicles']} of your {summary['total_vehicles']} vehicles are active, and "
+            f"{summary['maintenance_due']} are due for maintenance within 7 days.")
+
+
+def answer(intent, data):
+    """Reply for `intent`, given the data named in NEEDS[intent]"""
+    if intent is None:
+        return DEFAULT
+    if intent in STATIC:
+        return STATIC[intent]
+    if intent == "fuel":
+        return _fuel(data["summary"], data.get("trends"))
+    if intent == "maintenance":
+        return _maintenance(data["summary"], data["alerts"])
+    if intent == "cost":
+        return _cost(data.get("trends"))
+    if intent == "alert":
+        return _alert(data["alerts"])
+    return _status(data["summary"])
@@ -1,116 +1,324 @@
+"""
+Synthetic fleet data generator for demos and load tests
+
+Vehicles are sampled in one vectorized pass; fuel history is generated in fixed
+shards of vehicles across a process pool, each shard seeded from (seed, shard
+index), so the output only depends on the parameters and never on the worker
+count. Shards are written in order, streamed into SQLite (or Parquet part
+files), so memory is bounded by the shard size. For a given --seed and
+--end-date a fresh output is byte-identical.
+
+    python data_generator.py                                    # 100 vehicles x 30 days
+    python data_generator.py --vehicles 100000 --days 100 --overwrite --end-date 2025-01-31
+    python data_generator.py --vehicles 50000 --days 365 --format parquet --output fleet_parquet
+"""
+
+import argparse
+import os
 import sqlite3
-import pandas as pd
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
 import numpy as np
-from datetime import datetime, timedelta
-import random
 
-def create_database():
-    """Create SQLite database with sample fleet data"""
-    conn = sqlite3.connect('fleet_data.db')
-    cursor = conn.cursor()
+import rollup
+import versions
+from models import VEHICLE_TYPES
+from schema import FUEL_DATA_INDEXES, migrate
+
+ID_PREFIXES = ('TRK', 'VAN', 'CAR', 'BUS')             # aligned with VEHICLE_TYPES
+BASE_EFFICIENCY = np.array([25.0, 30.0, 35.0, 18.0])   # per type code
+STATUSES = ('active', 'maintenance', 'inactive')
+STATUS_WEIGHTS = (0.85, 0.10, 0.05)
+
+DEFAULT_SHARD_VEHICLES = 2000
+
+
+def _rng(seed, *stream):
+    """Independent generator for one named stream (vehicles, shard N, ...)"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=stream))
+
+
+def generate_vehicles(num_vehicles, seed, end_date):
+    """Return the vehicles table as a dict of columns"""
+    rng = _rng(seed, 0)
+    type_codes = rng.integers(0, len(VEHICLE_TYPES), num_vehicles).astype(np.int8)
+    status_codes = rng.choice(len(STATUSES), num_vehicles, p=STATUS_WEIGHTS).astype(np.int8)
+    efficiency = np.round(BASE_EFFICIENCY[type_codes] + rng.uniform(-3, 5, num_vehicles), 1)
+    mileage = rng.integers(15000, 80001, num_vehicles)
+
+    end = np.datetime64(end_date, 'D')
+    last_maintenance = end - rng.integers(10, 181, num_vehicles).astype('timedelta64[D]')
+    next_maintenance = last_maintenance + rng.integers(30, 121, num_vehicles).astype('timedelta64[D]')
+
+    width = max(3, len(str(num_vehicles)))
+    prefixes = np.array(ID_PREFIXES)[type_codes]
+    vehicle_ids = [f"{prefix}-{i + 1:0{width}d}" for i, prefix in enumerate(prefixes.tolist())]
+
+    return {
+        'vehicle_id': vehicle_ids,
+        'type_code': type_codes,
+        'status_code': status_codes,
+        'mileage': mileage,
+        'fuel_efficiency': efficiency,
+        'last_maintenance': last_maintenance.astype(str),
+        'next_maintenance': next_maintenance.astype(str),
+    }
+
+
+class RollupAccumulator:
+    """fuel_daily_rollup aggregates per (type code, day index), merged across shards"""
     
-    # Create vehicles table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS vehicles (
-            vehicle_id TEXT PRIMARY KEY,
-            type TEXT,
-            status TEXT,
-            mileage INTEGER,
-            fuel_efficiency REAL,
-            last_maintenance DATE,
-            next_maintenance DATE
-        )
-    ''')
+    def __init__(self, num_days):
+        shape = (len(VEHICLE_TYPES), num_days)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.fuel_sum = np.zeros(shape)
+        self.efficiency_sum = np.zeros(shape)
+        self.distance_sum = np.zeros(shape)
+        self.fuel_min = np.full(shape, np.inf)
+        self.efficiency_min = np.full(shape, np.inf)
+        self.fuel_max = np.full(shape, -np.inf)
+        self.efficiency_max = np.full(shape, -np.inf)
     
-    # Create fuel_data table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS fuel_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            vehicle_id TEXT,
-            date DATE,
-            fuel_consumed REAL,
-            distance_traveled REAL,
-            fuel_efficiency REAL,
-            FOREIGN KEY (vehicle_id) REFERENCES vehicles (vehicle_id)
-        )
-    ''')
+    def add(self, type_codes, day_index, fuel, efficiency, distance):
+        num_days = self.count.shape[1]
+        key = type_codes.astype(np.intp) * num_days + day_index
+        size = self.count.size
+        self.count += np.bincount(key, minlength=size).reshape(self.count.shape)
+        self.fuel_sum += np.bincount(key, fuel, minlength=size).reshape(self.count.shape)
+        self.efficiency_sum += np.bincount(key, efficiency, minlength=size).reshape(self.count.shape)
+        self.distance_sum += np.bincount(key, distance, minlength=size).reshape(self.count.shape)
+        np.minimum.at(self.fuel_min.reshape(-1), key, fuel)
+        np.minimum.at(self.efficiency_min.reshape(-1), key, efficiency)
+        np.maximum.at(self.fuel_max.reshape(-1), key, fuel)
+        np.maximum.at(self.efficiency_max.reshape(-1), key, efficiency)
     
-    # Generate vehicle data
-    vehicle_types = ['Truck', 'Van', 'Car', 'Bus']
-    statuses = ['active', 'maintenance', 'inactive']
+    def merge(self, other):
+        for name in ('count', 'fuel_sum', 'efficiency_sum', 'distance_sum'):
+            getattr(self, name).__iadd__(getattr(other, name))
+        for name in ('fuel_min', 'efficiency_min'):
+            np.minimum(getattr(self, name), getattr(other, name), out=getattr(self, name))
+        for name in ('fuel_max', 'efficiency_max'):
+            np.maximum(getattr(self, name), getattr(other, name), out=getattr(self, name))
     
-    vehicles = []
-    for i in range(100):
-        vehicle_id = f"{random.choice(['TRK', 'VAN', 'CAR', 'BUS'])}-{str(i+1).zfill(3)}"
-        vehicle_type = random.choice(vehicle_types)
-        status = random.choices(statuses, weights=[85, 10, 5])[0]
-        
-        # Base efficiency by vehicle type
-        base_efficiency = {
-            'Truck': 25, 'Van': 30, 'Car': 35, 'Bus': 18
-        }
-        
-        efficiency = base_efficiency[vehicle_type] + random.uniform(-3, 5)
-        mileage = random.randint(15000, 80000)
-        
-        last_maintenance = datetime.now() - timedelta(days=random.randint(10, 180))
-        next_maintenance = last_maintenance + timedelta(days=random.randint(30, 120))
+    def rows(self, day_strings):
+        """fuel_daily_rollup rows for every populated (type, day), plus the fleet-wide '*' rows"""
+        def emit(vehicle_type, sel):
+            count = self.count[sel].sum(axis=0)
+            for day in np.flatnonzero(count):
+                yield (vehicle_type, day_strings[day], int(count[day]),
+                       float(self.fuel_sum[sel][:, day].sum()), float(self.fuel_min[sel][:, day].min()),
+                       float(self.fuel_max[sel][:, day].max()), float(self.efficiency_sum[sel][:, day].sum()),
+                       float(self.efficiency_min[sel][:, day].min()), float(self.efficiency_max[sel][:, day].max()),
+                       float(self.distance_sum[sel][:, day].sum()),
+                       # Generated readings are never NULL, so every record counts for every column
+                       int(count[day]), int(count[day]), int(count[day]))
         
-        vehicles.append({
-            'vehicle_id': vehicle_id,
-            'type': vehicle_type,
-            'status': status,
-            'mileage': mileage,
-            'fuel_efficiency': round(efficiency, 1),
-            'last_maintenance': last_maintenance.strftime('%Y-%m-%d'),
-            'next_maintenance': next_maintenance.strftime('%Y-%m-%d')
-        })
-    
-    # Insert vehicles
-    cursor.executemany('''
-        INSERT OR REPLACE INTO vehicles 
-        (vehicle_id, type, status, mileage, fuel_efficiency, last_maintenance, next_maintenance)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', [(v['vehicle_id'], v['type'], v['status'], v['mileage'], 
-           v['fuel_efficiency'], v['last_maintenance'], v['next_maintenance']) for v in vehicles])
-    
-    # Generate fuel data for last 30 days
-    fuel_data = []
-    for vehicle in vehicles[:50]:  # Generate data for first 50 vehicles
-        for day in range(30):
-            date = (datetime.now() - timedelta(days=day)).strftime('%Y-%m-%d')
-            
-            # Daily distance and fuel consumption
-            if vehicle['status'] == 'active':
-                distance = random.uniform(100, 400)  # km per day
-                base_efficiency = vehicle['fuel_efficiency']
-                daily_efficiency = base_efficiency + random.uniform(-2, 2)
-                fuel_consumed = distance / daily_efficiency
-            else:
-                distance = 0
-                fuel_consumed = 0
-                daily_efficiency = 0
-            
-            fuel_data.append({
-                'vehicle_id': vehicle['vehicle_id'],
-                'date': date,
-                'fuel_consumed': round(fuel_consumed, 2),
-                'distance_traveled': round(distance, 1),
-                'fuel_efficiency': round(daily_efficiency, 1)
-            })
-    
-    # Insert fuel data
-    cursor.executemany('''
-        INSERT OR REPLACE INTO fuel_data 
-        (vehicle_id, date, fuel_consumed, distance_traveled, fuel_efficiency)
-        VALUES (?, ?, ?, ?, ?)
-    ''', [(f['vehicle_id'], f['date'], f['fuel_consumed'], 
-           f['distance_traveled'], f['fuel_efficiency']) for f in fuel_data])
+        yield from emit(rollup.FLEET, slice(None))
+        for code, vehicle_type in enumerate(VEHICLE_TYPES):
+            yield from emit(vehicle_type, slice(code, code + 1))
+
+
+def generate_fuel_shard(task):
+    """Worker: daily fuel records for one shard of vehicles, as columns in vehicle-major order,
+    plus the shard's rollup aggregates"""
+    seed, shard_index, vehicle_ids, type_codes, status_codes, efficiency, day_strings = task
+    rng = _rng(seed, 1, shard_index)
+    n_vehicles, n_days = len(vehicle_ids), len(day_strings)
+
+    active = np.repeat(status_codes == 0, n_days)
+    distance = rng.uniform(100, 400, n_vehicles * n_days)                       # km per day
+    daily_efficiency = np.repeat(efficiency, n_days) + rng.uniform(-2, 2, n_vehicles * n_days)
+    fuel_consumed = distance / daily_efficiency
+
+    # Vehicles out of service log empty days, as in the original generator
+    distance = np.where(active, distance, 0.0)
+    daily_efficiency = np.where(active, daily_efficiency, 0.0)
+    fuel_consumed = np.where(active, fuel_consumed, 0.0)
+
+    columns = {
+        'vehicle_id': np.repeat(np.array(vehicle_ids), n_days),
+        'date': np.tile(np.array(day_strings), n_vehicles),
+        'fuel_consumed': np.round(fuel_consumed, 2),
+        'distance_traveled': np.round(distance, 1),
+        'fuel_efficiency': np.round(daily_efficiency, 1),
+    }
     
-    conn.commit()
-    conn.close()
+    # Aggregating here is far cheaper than re-reading the rows from SQLite afterwards
+    aggregates = RollupAccumulator(n_days)
+    aggregates.add(np.repeat(type_codes, n_days), np.tile(np.arange(n_days), n_vehicles),
+                   columns['fuel_consumed'], columns['fuel_efficiency'], columns['distance_traveled'])
+    return shard_index, columns, aggregates
+
+
+def _shard_tasks(vehicles, seed, day_strings, shard_vehicles):
+    for shard_index, start in enumerate(range(0, len(vehicles['vehicle_id']), shard_vehicles)):
+        stop = start + shard_vehicles
+        yield (seed, shard_index, vehicles['vehicle_id'][start:stop], vehicles['type_code'][start:stop],
+               vehicles['status_code'][start:stop], vehicles['fuel_efficiency'][start:stop], day_strings)
+
+
+def _iter_shards(tasks, workers):
+    """Yield shard results in shard order, generated on a process pool when workers > 1"""
+    if workers <= 1:
+        yield from map(generate_fuel_shard, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep at most two shards per worker in flight so a slow writer bounds memory
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(generate_fuel_shard, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _vehicle_rows(vehicles):
+    types = np.array(VEHICLE_TYPES)[vehicles['type_code']].tolist()
+    statuses = np.array(STATUSES)[vehicles['status_code']].tolist()
+    return zip(vehicles['vehicle_id'], types, statuses, vehicles['mileage'].tolist(),
+               vehicles['fuel_efficiency'].tolist(), vehicles['last_maintenance'].tolist(),
+               vehicles['next_maintenance'].tolist())
+
+
+def write_sqlite(db_path, vehicles, shards, day_strings):
+    """Stream vehicles and fuel shards into SQLite in one transaction; returns the fuel row count
+
+    The indexes and triggers are dropped, the data loaded and everything rebuilt
+    under one write lock, so readers never see the schema without them and a
+    failed run leaves the database as it was.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)   # the transaction is explicit below
+    conn.execute("PRAGMA synchronous = OFF")
+    migrate(conn)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Into an existing dataset the generated days may overlap stored ones, so merge via SQL
+        appending = conn.execute("SELECT EXISTS (SELECT 1 FROM fuel_data)").fetchone()[0]
+        aggregates = RollupAccumulator(len(day_strings))
+
+        # Bulk load without per-row index and rollup maintenance, then build both once
+        for name in FUEL_DATA_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        rollup.drop_triggers(conn)
+        versions.drop_triggers(conn, *versions.TRACKED_TABLES)
+
+        conn.executemany('''
+            INSERT OR REPLACE INTO vehicles
+            (vehicle_id, type, status, mileage, fuel_efficiency, last_maintenance, next_maintenance)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', _vehicle_rows(vehicles))
+
+        fuel_rows = 0
+        for _, columns, shard_aggregates in shards:
+            aggregates.merge(shard_aggregates)
+            conn.executemany('''
+                INSERT INTO fuel_data
+                (vehicle_id, date, fuel_consumed, distance_traveled, fuel_efficiency)
+                VALUES (?, ?, ?, ?, ?)
+            ''', zip(columns['vehicle_id'].tolist(), columns['date'].tolist(), columns['fuel_consumed'].tolist(),
+                     columns['distance_traveled'].tolist(), columns['fuel_efficiency'].tolist()))
+            fuel_rows += len(columns['date'])
+        versions.bump(conn, *versions.TRACKED_TABLES)
+
+        for ddl in FUEL_DATA_INDEXES.values():
+            conn.execute(ddl)
+        if appending:
+            rollup.rebuild(conn, since=min(day_strings))
+        else:
+            conn.executemany(
+                "INSERT INTO fuel_daily_rollup VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", aggregates.rows(day_strings)
+            )
+            rollup.rebuild_after_daily(conn)
+        rollup.create_triggers(conn)
+        versions.create_triggers(conn, *versions.TRACKED_TABLES)
+        conn.execute("ANALYZE")
+        conn.execute("COMMIT")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    return fuel_rows
+
+
+def write_parquet(output_dir, vehicles, shards):
+    """Write vehicles.parquet and one fuel_data part file per shard; returns the fuel row count"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+
+    fuel_dir = os.path.join(output_dir, 'fuel_data')
+    os.makedirs(fuel_dir, exist_ok=True)
+
+    vehicle_columns = ('vehicle_id', 'type', 'status', 'mileage', 'fuel_efficiency',
+                       'last_maintenance', 'next_maintenance')
+    vehicle_table = pa.Table.from_arrays(
+        [pa.array(column) for column in zip(*_vehicle_rows(vehicles))], names=list(vehicle_columns)
+    )
+    pq.write_table(vehicle_table, os.path.join(output_dir, 'vehicles.parquet'))
+
+    fuel_rows = 0
+    for shard_index, columns, _ in shards:
+        table = pa.Table.from_pydict({name: pa.array(values) for name, values in columns.items()})
+        pq.write_table(table, os.path.join(fuel_dir, f"part-{shard_index:05d}.parquet"))
+        fuel_rows += table.num_rows
+    return fuel_rows
+
+
+def create_database(db_path='fleet_data.db', num_vehicles=100, days=30, seed=42, end_date=None,
+                    workers=None, shard_vehicles=DEFAULT_SHARD_VEHICLES, output_format='sqlite'):
+    """Create the fleet dataset; returns (vehicle count, fuel record count)"""
+    end_date = end_date or date.today()
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+    workers = workers or os.cpu_count() or 1
+
+    vehicles = generate_vehicles(num_vehicles, seed, end_date)
+    day_strings = [(end_date - timedelta(days=day)).isoformat() for day in range(days)]
+    shards = _iter_shards(_shard_tasks(vehicles, seed, day_strings, shard_vehicles), workers)
+
+    if output_format == 'parquet':
+        fuel_rows = write_parquet(db_path, vehicles, shards)
+    else:
+        fuel_rows = write_sqlite(db_path, vehicles, shards, day_strings)
+    return num_vehicles, fuel_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic fleet dataset")
+    parser.add_argument('--output', default='fleet_data.db', help="SQLite file, or directory for --format parquet")
+    parser.add_argument('--format', choices=('sqlite', 'parquet'), default='sqlite')
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--days', type=int, default=30, help="days of fuel history per vehicle")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-date', help="last day of history, YYYY-MM-DD (default: today)")
+    parser.add_argument('--workers', type=int, help="generator processes (default: CPU count)")
+    parser.add_argument('--shard-vehicles', type=int, default=DEFAULT_SHARD_VEHICLES,
+                        help="vehicles per generated shard; part of the output's identity")
+    parser.add_argument('--overwrite', action='store_true', help="delete an existing SQLite output first")
+    args = parser.parse_args()
+
+    if args.overwrite and args.format == 'sqlite':
+        for suffix in ('', '-wal', '-shm', '-journal'):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    start = time.perf_counter()
+    num_vehicles, fuel_rows = create_database(
+        args.output, args.vehicles, args.days, args.seed, args.end_date,
+        args.workers, args.shard_vehicles, args.format
+    )
     print("Database created successfully with sample data!")
-    print(f"Generated {len(vehicles)} vehicles and {len(fuel_data)} fuel records")
+    print(f"Generated {num_vehicles} vehicles and {fuel_rows} fuel records in {time.perf_counter() - start:.1f}s")
+
 
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    main()
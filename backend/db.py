@@ -0,0 +1,138 @@
+"""
+SQLite connection pooling for the Fleet Analytics API
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+DB_PATH = os.environ.get('FLEET_DB_PATH', 'fleet_data.db')
+
+# Applied to every new connection; failures (e.g. WAL on a read-only file) are ignored
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16384",      # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def connect(db_path=DB_PATH, cached_statements=256, **kwargs):
+    """Open a connection with the standard pragmas applied"""
+    conn = sqlite3.connect(db_path, cached_statements=cached_statements, **kwargs)
+    for pragma in PRAGMAS:
+        try:
+            conn.execute(pragma)
+        except sqlite3.DatabaseError:
+            pass
+    return conn
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by the API worker threads"""
+
+    def __init__(self, db_path=DB_PATH, max_size=8, timeout=5.0, cached_statements=256):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        # LIFO so a thread tends to get back the connection (and warm page cache) it just used
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+
+    def _connect(self):
+        conn = connect(self.db_path, self.cached_statements, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening one if below max_size"""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._open < self.max_size
+            if can_open:
+                self._open += 1
+                self._misses += 1
+            else:
+                self._waits += 1
+
+        if can_open:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._open -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection"""
+        with metrics.span("connect"):
+            conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Snapshot of pool counters"""
+        with self._lock:
+            return {
+                "open": self._open,
+                "idle": self._idle.qsize(),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits
+            }
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+db_pool = ConnectionPool(max_size=int(os.environ.get('FLEET_DB_POOL_SIZE', '8')))
@@ -0,0 +1,150 @@
+"""
+Bounded execution of blocking database work for the async endpoints
+
+Handlers run on the event loop and hand sqlite/NumPy work to one fixed-size thread
+pool instead of Starlette's shared default threadpool. Each endpoint has a
+ConcurrencyLimit capping how many of its calls may hold a thread at once and how
+many may queue for one, so a burst of heavy analytics queries waits (or is shed)
+on its own limit while cheap endpoints keep getting threads.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from db import db_pool
+
+
+class Overloaded(Exception):
+    """Raised when an endpoint's wait queue is full"""
+
+    def __init__(self, name):
+        super().__init__(f"{name} is at its concurrency limit")
+        self.name = name
+
+
+class BoundedExecutor:
+    """Fixed-size thread pool that tracks its queue depth"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fleet-db")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._peak_queued = 0
+
+    def _call(self, func, args, submitted):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        metrics.record("queue", time.perf_counter() - submitted)
+        try:
+            with metrics.worker_thread():
+                return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def _done(self, future):
+        if future.cancelled():   # never started, so _call never dequeued it
+            with self._lock:
+                self._queued -= 1
+
+    async def run(self, func, *args):
+        """Run func(*args) on the pool and await its result
+
+        The job runs in a copy of the caller's context, so its metrics spans land
+        on the request that submitted it.
+        """
+        with self._lock:
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._call, func, args, time.perf_counter())
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        """Snapshot of executor counters"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "peak_queued": self._peak_queued,
+                "completed": self._completed
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ConcurrencyLimit:
+    """Async limit on concurrent calls for one endpoint, with a bounded wait queue
+
+    Only touched from the event loop thread, so the counters need no lock.
+    """
+
+    def __init__(self, name, max_concurrent, max_waiting=64):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._running = 0
+        self._waiting = 0
+        self._peak_waiting = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_times = deque(maxlen=1024)   # seconds, recent calls only
+
+    async def __aenter__(self):
+        if self._semaphore.locked():
+            if self._waiting >= self.max_waiting:
+                self._rejected += 1
+                raise Overloaded(self.name)
+            self._waiting += 1
+            self._peak_waiting = max(self._peak_waiting, self._waiting)
+            start = time.perf_counter()
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+            self._wait_times.append(time.perf_counter() - start)
+            metrics.record("queue", self._wait_times[-1])
+        else:
+            await self._semaphore.acquire()
+            self._wait_times.append(0.0)
+        self._running += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._running -= 1
+        self._completed += 1
+        self._semaphore.release()
+
+    def stats(self):
+        """Snapshot of limit counters"""
+        waits = sorted(self._wait_times)
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "running": self._running,
+            "waiting": self._waiting,
+            "peak_waiting": self._peak_waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 3) if waits else 0.0,
+            "wait_max_ms": round(waits[-1] * 1000, 3) if waits else 0.0
+        }
+
+
+# No more threads than pooled connections, so DB work never blocks on the pool itself
+db_executor = BoundedExecutor(max_workers=int(os.environ.get('FLEET_DB_WORKERS', db_pool.max_size)))
@@ -0,0 +1,109 @@
+"""
+Conditional and compressed responses for the cacheable read endpoints
+
+Loaders return a Representation: the data, rendered once to JSON (and gzip or
+brotli above COMPRESS_MIN_SIZE) when it is computed, plus a strong ETag built
+from the endpoint, its arguments, the UTC date and the versions of the tables it
+was read from (see versions.py). Repeat fetches from the response cache reuse
+those bytes instead of re-serializing, and a request whose If-None-Match matches
+the current table versions is answered 304 without running the query at all.
+"""
+
+import gzip
+import hashlib
+from datetime import datetime, timezone
+
+import orjson
+from fastapi import Response
+
+import metrics
+
+try:
+    import brotli
+except ImportError:   # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def etag(name, args, version):
+    """Strong validator for one endpoint call at the given table versions
+
+    The date is included because the windows are relative to date('now') (UTC),
+    so a body can change at midnight without any table changing.
+    """
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    digest = hashlib.blake2b(repr((name, args, today, version)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+class Representation:
+    """Rendered response body with its ETag, extra headers and compressed variants"""
+
+    __slots__ = ('content', 'etag', 'headers', 'body', 'encoded')
+
+    def __init__(self, name, args, version, content, headers=None):
+        self.content = content
+        self.etag = etag(name, args, version)
+        self.headers = headers or {}
+        self.encoded = {}
+        with metrics.span("serialize"):
+            self.body = orjson.dumps(content)
+            if len(self.body) >= COMPRESS_MIN_SIZE:
+                self.encoded['gzip'] = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+                if brotli is not None:
+                    self.encoded['br'] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+
+
+def if_none_match(request):
+    """Entity tags listed in If-None-Match (weak ones compared by their opaque part)"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return ()
+    return tuple(tag.strip().removeprefix('W/') for tag in header.split(','))
+
+
+def accepted_encodings(request):
+    """Content codings in Accept-Encoding, minus those refused with q=0"""
+    accepted = set()
+    for part in request.headers.get('accept-encoding', '').split(','):
+        coding, _, params = part.partition(';')
+        q = params.replace(' ', '').removeprefix('q=')
+        try:
+            refused = bool(params) and float(q) == 0
+        except ValueError:
+            refused = False
+        if not refused:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def validator_headers(tag, cache_control):
+    return {"ETag": tag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+
+def not_modified(request, tag, cache_control, headers=None):
+    """A 304 response if the request already holds `tag`, else None"""
+    tags = if_none_match(request)
+    if tag in tags or '*' in tags:
+        return Response(status_code=304, headers={**validator_headers(tag, cache_control), **(headers or {})})
+    return None
+
+
+def respond(request, representation, cache_control):
+    """304 if the client's copy is current, else the body in the best encoding it accepts"""
+    unchanged = not_modified(request, representation.etag, cache_control, representation.headers)
+    if unchanged is not None:
+        return unchanged
+
+    headers = {**validator_headers(representation.etag, cache_control), **representation.headers}
+    body = representation.body
+    accepted = accepted_encodings(request)
+    for encoding in ('br', 'gzip'):
+        if encoding in accepted and encoding in representation.encoded:
+            body = representation.encoded[encoding]
+            headers["Content-Encoding"] = encoding
+            break
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,246 @@
+"""
+Streaming bulk ingestion of fuel telemetry into fuel_data
+
+Reads CSV, NDJSON or Parquet in bounded chunks and inserts each chunk in its own
+transaction with a single prepared statement, so memory stays flat however large
+the input is. Records need vehicle_id, date, fuel_consumed and distance_traveled;
+fuel_efficiency is derived from them when absent.
+
+A run needs exclusive write access to fuel_data: it suspends the change counter
+triggers (and with --rebuild-indexes the indexes and rollup triggers) until it
+finishes, so rows another writer inserts meanwhile would not be counted or
+rolled up. If a run is killed before it restores them, the next schema.migrate()
+(any tool, or API startup) reinstalls them and rebuilds what they missed.
+
+    python ingest.py telemetry.ndjson
+    python ingest.py backfill.parquet --batch-size 100000 --rebuild-indexes
+    cat feed.csv | python ingest.py - --format csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import math
+import os
+import sys
+import time
+import urllib.request
+
+import rollup
+import versions
+from db import DB_PATH, connect
+from schema import FUEL_DATA_INDEXES, migrate
+
+COLUMNS = ('vehicle_id', 'date', 'fuel_consumed', 'distance_traveled', 'fuel_efficiency')
+
+INSERT_SQL = f"INSERT INTO fuel_data ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?)"
+
+FORMATS = ('csv', 'ndjson', 'parquet')
+
+
+def _to_row(record):
+    """Validate one record into an insert tuple; returns None if it is unusable
+
+    float() accepts "nan" and "inf", which SQLite would store as NULL or infinity
+    and the rollups would then average over, so non-finite readings are rejected.
+    """
+    try:
+        vehicle_id = record['vehicle_id']
+        date = str(record['date'])[:10]
+        fuel_consumed = float(record['fuel_consumed'])
+        distance = float(record['distance_traveled'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not vehicle_id or len(date) != 10 or not (math.isfinite(fuel_consumed) and math.isfinite(distance)):
+        return None
+
+    efficiency = record.get('fuel_efficiency')
+    if efficiency in (None, ''):
+        efficiency = distance / fuel_consumed if fuel_consumed > 0 else 0.0
+    try:
+        efficiency = float(efficiency)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(efficiency):
+        return None
+    return (vehicle_id, date, fuel_consumed, distance, efficiency)
+
+
+def _chunks_of(records, chunk_size):
+    """Group an iterator of records into validated row lists; yields (rows, rejected)"""
+    rows, rejected = [], 0
+    for record in records:
+        row = _to_row(record)
+        if row is None:
+            rejected += 1
+            continue
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield rows, rejected
+            rows, rejected = [], 0
+    if rows or rejected:
+        yield rows, rejected
+
+
+def _open_text(path):
+    return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8') if path == '-' else open(path, newline='', encoding='utf-8')
+
+
+def read_csv(path, chunk_size):
+    with _open_text(path) as f:
+        yield from _chunks_of(csv.DictReader(f), chunk_size)
+
+
+def read_ndjson(path, chunk_size):
+    def records(f):
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield {}   # counted as rejected
+    with _open_text(path) as f:
+        yield from _chunks_of(records(f), chunk_size)
+
+
+def read_parquet(path, chunk_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet input requires pyarrow (pip install pyarrow)")
+
+    parquet_file = pq.ParquetFile(path)
+    columns = [c for c in COLUMNS if c in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        yield from _chunks_of(batch.to_pylist(), chunk_size)
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson, 'parquet': read_parquet}
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('jsonl', 'json'):
+        return 'ndjson'
+    if extension in ('parq', 'pq'):
+        return 'parquet'
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Cannot infer the format of {path!r}; pass --format")
+
+
+def ingest(path, db_path=DB_PATH, fmt=None, batch_size=50_000, rebuild_indexes=False, progress_every=10.0):
+    """Stream one input file into fuel_data; returns a stats dict"""
+    fmt = fmt or detect_format(path)
+    conn = connect(db_path, isolation_level=None)   # autocommit: transactions are explicit below
+    migrate(conn)
+
+    stats = {'rows': 0, 'rejected': 0, 'batches': 0, 'min_date': None}
+    start = last_report = time.perf_counter()
+
+    # The batches bump the fuel_data change counter once each instead of per row.
+    # Its triggers are suspended once for the whole run, not per batch: DDL changes
+    # the schema cookie, and every open connection then re-prepares its statements.
+    # Other writers must stay away until the finally below (see the module docstring).
+    conn.execute("BEGIN")
+    versions.drop_triggers(conn, 'fuel_data')
+    if rebuild_indexes:
+        # Maintaining indexes and the rollup row by row dominates large backfills;
+        # drop them now and rebuild once at the end
+        for name in FUEL_DATA_INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        rollup.drop_triggers(conn)
+    conn.execute("COMMIT")
+
+    try:
+        cursor = conn.cursor()
+        for rows, rejected in READERS[fmt](path, batch_size):
+            stats['rejected'] += rejected
+            if not rows:
+                continue
+            cursor.execute("BEGIN")
+            cursor.executemany(INSERT_SQL, rows)
+            versions.bump(cursor, 'fuel_data')
+            cursor.execute("COMMIT")
+
+            batch_min = min(row[1] for row in rows)
+            if stats['min_date'] is None or batch_min < stats['min_date']:
+                stats['min_date'] = batch_min
+            stats['rows'] += len(rows)
+            stats['batches'] += 1
+
+            now = time.perf_counter()
+            if progress_every and now - last_report >= progress_every:
+                print(f"  {stats['rows']:,} rows ({stats['rows'] / (now - start):,.0f} rows/s)")
+                last_report = now
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.execute("BEGIN")
+        if rebuild_indexes:
+            index_start = time.perf_counter()
+            for ddl in FUEL_DATA_INDEXES.values():
+                conn.execute(ddl)
+            if stats['min_date'] is not None:
+                rollup.rebuild(conn, since=stats['min_date'])
+            rollup.create_triggers(conn)
+            stats['rebuild_seconds'] = round(time.perf_counter() - index_start, 3)
+        versions.create_triggers(conn, 'fuel_data')
+        conn.execute("COMMIT")
+        conn.close()
+
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    stats['rows_per_second'] = round(stats['rows'] / stats['seconds']) if stats['seconds'] else 0
+    return stats
+
+
+def notify_api(api_url, admin_token=None):
+    """Ask a running API to drop cached responses derived from fuel_data"""
+    headers = {"Content-Type": "application/json"}
+    if admin_token:
+        headers["X-Admin-Token"] = admin_token
+    request = urllib.request.Request(
+        f"{api_url.rstrip('/')}/api/cache/invalidate",
+        data=json.dumps({"tables": ["fuel_data"]}).encode(),
+        headers=headers,
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream fuel telemetry into the fleet database")
+    parser.add_argument('inputs', nargs='+', help="input files, or - for stdin")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--format', choices=FORMATS, help="default: inferred from the file extension")
+    parser.add_argument('--batch-size', type=int, default=50_000, help="rows per chunk and per transaction")
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help="drop fuel_data indexes and rollup triggers during the load (large backfills)")
+    parser.add_argument('--notify-api', metavar='URL', help="invalidate the API response cache afterwards")
+    parser.add_argument('--admin-token', default=os.environ.get('FLEET_ADMIN_TOKEN'),
+                        help="the API's FLEET_ADMIN_TOKEN, for --notify-api (default: $FLEET_ADMIN_TOKEN)")
+    args = parser.parse_args()
+
+    total_rows = 0
+    for path in args.inputs:
+        fmt = args.format or ('csv' if path == '-' else None)
+        print(f"Ingesting {path}...")
+        stats = ingest(path, args.db, fmt, args.batch_size, args.rebuild_indexes)
+        total_rows += stats['rows']
+        rebuild = f", index/rollup rebuild {stats['rebuild_seconds']}s" if 'rebuild_seconds' in stats else ""
+        print(f"  {stats['rows']:,} rows in {stats['seconds']}s ({stats['rows_per_second']:,} rows/s), "
+              f"{stats['rejected']:,} rejected{rebuild}")
+
+    if args.notify_api and total_rows:
+        try:
+            print(f"Cache invalidated: {notify_api(args.notify_api, args.admin_token)}")
+        except OSError as e:
+            print(f"Could not notify API: {e}")
+
+
+if __name__ == "__main__":
+    main()
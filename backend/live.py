@@ -0,0 +1,183 @@
+"""
+Live dashboard feed over Server-Sent Events
+
+One producer task recomputes the dashboard sections (summary, trends, alerts)
+every `interval` seconds while anyone is subscribed and publishes only the
+sections whose content changed. Each update is serialized once and the same
+bytes are handed to every subscriber, so query load does not grow with the
+number of open dashboards.
+
+A subscriber holds at most one undelivered message per section: a newer value
+replaces a pending one (coalescing), so a slow client skips intermediate states
+instead of buffering them. A client that leaves messages undelivered for
+`stall_seconds` is dropped from the fan-out and its stream ends; EventSource
+reconnects and starts again from a fresh snapshot.
+"""
+
+import asyncio
+import time
+
+import orjson
+
+from executor import Overloaded
+
+
+class Subscriber:
+    """Pending messages for one stream, newest per section"""
+
+    def __init__(self):
+        self.pending = {}
+        self.ready = asyncio.Event()
+        self.pending_since = None   # when the oldest undelivered message arrived
+        self.closed = False
+        self.coalesced = 0
+
+    def offer(self, section, message):
+        if section in self.pending:
+            self.coalesced += 1
+        elif not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending[section] = message
+        self.ready.set()
+
+    def take(self):
+        messages = list(self.pending.values())
+        self.pending.clear()
+        self.pending_since = None
+        self.ready.clear()
+        return messages
+
+    def close(self):
+        self.closed = True
+        self.ready.set()
+
+
+class LiveFeed:
+    """Single producer fanning out changed dashboard sections to SSE subscribers
+
+    `sources` maps section names to coroutine functions returning JSON-serializable
+    data. Only touched from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, sources, interval=5.0, heartbeat_seconds=15.0, stall_seconds=60.0, max_subscribers=1000):
+        self.sources = sources
+        self.interval = interval
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stall_seconds = stall_seconds
+        self.max_subscribers = max_subscribers
+        self._subscribers = set()
+        self._latest = {}   # section -> last published SSE message
+        self._data = {}     # section -> last published payload, for change detection
+        self._sequence = 0
+        self._task = None
+        self._wake = None
+        self._peak_subscribers = 0
+        self._refreshes = 0
+        self._published = 0
+        self._coalesced = 0   # from subscribers that have left
+        self._dropped = 0
+        self._last_refresh_ms = 0.0
+
+    def subscribe(self):
+        """Register a subscriber, primed with the current snapshot; starts the producer if idle"""
+        if len(self._subscribers) >= self.max_subscribers:
+            raise Overloaded("live")
+        subscriber = Subscriber()
+        for section, message in self._latest.items():
+            subscriber.offer(section, message)
+        self._subscribers.add(subscriber)
+        self._peak_subscribers = max(self._peak_subscribers, len(self._subscribers))
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.discard(subscriber)
+            self._coalesced += subscriber.coalesced
+        subscriber.close()
+
+    def refresh_soon(self):
+        """Recompute now instead of at the next interval (e.g. after a cache invalidation)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                await self.refresh()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            # Nobody is listening: the next subscriber waits for a fresh snapshot, not a stale one
+            self._latest.clear()
+            self._data.clear()
+
+    async def refresh(self):
+        """Recompute every section once and publish the ones that changed"""
+        start = time.perf_counter()
+        results = await asyncio.gather(*(source() for source in self.sources.values()), return_exceptions=True)
+        self._refreshes += 1
+        self._last_refresh_ms = (time.perf_counter() - start) * 1000
+        self._drop_stalled()
+
+        for section, result in zip(self.sources, results):
+            if isinstance(result, Exception):   # Overloaded or a failed query: keep the last value
+                print(f"Live feed error in {section}: {result}")
+                continue
+            data = orjson.dumps(result)
+            if data == self._data.get(section):
+                continue
+            self._data[section] = data
+            self._sequence += 1
+            message = b"id: %d\nevent: %s\ndata: %s\n\n" % (self._sequence, section.encode(), data)
+            self._latest[section] = message
+            self._published += 1
+            for subscriber in self._subscribers:
+                subscriber.offer(section, message)
+
+    def _drop_stalled(self):
+        deadline = time.monotonic() - self.stall_seconds
+        for subscriber in [s for s in self._subscribers if s.pending_since is not None and s.pending_since < deadline]:
+            self._dropped += 1
+            self.unsubscribe(subscriber)
+
+    async def stream(self, subscriber):
+        """SSE byte stream for one subscriber; unsubscribes when the client goes away"""
+        try:
+            yield b"retry: 3000\n\n"
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"   # keeps proxies from timing out an idle stream
+                    continue
+                messages = subscriber.take()
+                if messages:
+                    yield b"".join(messages)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def close(self):
+        """End every stream and stop the producer"""
+        for subscriber in list(self._subscribers):
+            self.unsubscribe(subscriber)
+        if self._task is not None:
+            self._task.cancel()
+
+    def stats(self):
+        """Snapshot of feed counters"""
+        return {
+            "subscribers": len(self._subscribers),
+            "peak_subscribers": self._peak_subscribers,
+            "producer_running": self._task is not None and not self._task.done(),
+            "refreshes": self._refreshes,
+            "published": self._published,
+            "coalesced": self._coalesced + sum(s.coalesced for s in self._subscribers),
+            "dropped_slow": self._dropped,
+            "last_refresh_ms": round(self._last_refresh_ms, 3)
+        }
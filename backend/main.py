@@ -1,15 +1,45 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import base64
+import binascii
+import functools
+import hmac
+import os
 import sqlite3
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+import threading
+from datetime import date, datetime, timedelta
 import json
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from db import db_pool, DB_PATH
+from anomaly_stream import AnomalyStream
+from cache import response_cache
+from executor import ConcurrencyLimit, Overloaded, db_executor
+import http_cache
+import metrics
+from live import LiveFeed
+from profiler import SamplingProfiler
+import registry
+from registry import NO_DATE, VehicleRegistry
+from schema import migrate
+import queries
+import chat
+import summary
+import trends
+import versions
 
-app = FastAPI(title="Fleet Analytics API", version="1.0.0")
+class TimedORJSONResponse(ORJSONResponse):
+    """ORJSONResponse whose rendering counts as the request's serialize phase"""
+
+    def render(self, content):
+        with metrics.span("serialize"):
+            return super().render(content)
+
+# orjson serializes the row dicts directly, skipping jsonable_encoder's per-value walk
+app = FastAPI(title="Fleet Analytics API", version="1.0.0", default_response_class=TimedORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,49 +47,374 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
+)
+
+# Admin operations (?profile=1, cache invalidation) need an X-Admin-Token header
+# matching this; without it set they are refused
+ADMIN_TOKEN = os.environ.get('FLEET_ADMIN_TOKEN')
+
+def require_admin(request: Request):
+    token = request.headers.get("x-admin-token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Requires an X-Admin-Token header matching FLEET_ADMIN_TOKEN")
+
+# Outermost, so request latency includes every other middleware. The SSE stream is
+# counted but kept out of the latency histograms.
+app.add_middleware(
+    metrics.MetricsMiddleware,
+    untimed=("/api/live",),
+    profiler=SamplingProfiler(admin_token=ADMIN_TOKEN)
+)
+
+@app.on_event("startup")
+def migrate_schema():
+    try:
+        with db_pool.connection() as conn:
+            migrate(conn)
+    except Exception as e:
+        print(f"Schema migration error: {e}")
+
+# The analytics stack (numpy, pandas, scikit-learn) is loaded on first use so a cold
+# start only pays for FastAPI. Long-running servers can set FLEET_PREWARM_MODELS=1 to
+# load it in the background right after startup instead.
+_models = None
+_models_lock = threading.Lock()
+
+def get_models():
+    """Return the trained models, importing and initializing them on first call"""
+    global _models
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                import models
+                _models = models.initialize_models(db_path=DB_PATH)
+    return _models
+
+@functools.lru_cache(maxsize=None)
+def get_maintenance_predictor():
+    """MaintenancePredictor needs no training, so it is loaded without get_models()"""
+    import models
+    return models.MaintenancePredictor()
+
+@app.on_event("startup")
+def prewarm_models():
+    if os.environ.get('FLEET_PREWARM_MODELS') == '1' and _models is None:
+        threading.Thread(target=get_models, name="prewarm-models", daemon=True).start()
+
+def preload():
+    """Load everything workers only read, before a preforking server forks them (see server.py)
+
+    Children share these pages copy-on-write instead of each training or loading
+    its own models. Pooled connections are closed, since a SQLite connection must
+    not be used across fork; workers open their own.
+    """
+    migrate_schema()
+    get_models()
+    get_maintenance_predictor()
+    vehicle_registry.current()
+    db_pool.close()
+
+# Set when the server starts draining: /readyz fails so load balancers stop routing
+# here, and live streams end so their clients reconnect to another worker
+draining = False
+
+def drain():
+    global draining
+    draining = True
+    live_feed.close()
+
+# Per-vehicle attributes for single-vehicle and batch endpoints; the vehicles change
+# counter is rechecked at most every FLEET_REGISTRY_CHECK_SECONDS (see registry.py)
+vehicle_registry = VehicleRegistry(db_pool, check_seconds=float(os.environ.get('FLEET_REGISTRY_CHECK_SECONDS', '1')))
+
+# Scores newly ingested fuel records within a poll interval; FLEET_ANOMALY_STREAM=0 disables it.
+# Every worker starts one, but only one at a time tails (see anomaly_stream.py)
+anomaly_stream = AnomalyStream(
+    DB_PATH,
+    poll_seconds=float(os.environ.get('FLEET_ANOMALY_POLL_SECONDS', '2')),
+    refit_seconds=float(os.environ.get('FLEET_ANOMALY_REFIT_SECONDS', '3600')),
+    fallback=lambda: get_models()['anomaly_detector']
 )
 
+@app.on_event("startup")
+def start_anomaly_stream():
+    if os.environ.get('FLEET_ANOMALY_STREAM', '1') == '1':
+        anomaly_stream.start()
+
+@app.on_event("shutdown")
+def close_db_pool():
+    live_feed.close()
+    anomaly_stream.stop()
+    db_executor.shutdown()
+    db_pool.close()
+
 class ChatMessage(BaseModel):
     message: str
 
 class MaintenanceRequest(BaseModel):
     vehicle_id: str
 
-def get_db_connection():
-    conn = sqlite3.connect('fleet_data.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+class BatchMaintenanceRequest(BaseModel):
+    vehicle_ids: Optional[List[str]] = None   # None scores the whole fleet
 
-@app.get("/api/fleet-summary")
-def fleet_summary():
-    """Get fleet overview statistics"""
+class BatchEfficiencyRequest(BaseModel):
+    vehicle_ids: Optional[List[str]] = None   # None predicts the whole fleet
+
+class CacheInvalidation(BaseModel):
+    tables: List[str] = []
+
+# Default horizons of the maintenance alert list and the summary's maintenance_due count
+MAINTENANCE_ALERT_DAYS = 14
+MAINTENANCE_DUE_DAYS = 7
+
+# Seconds each read endpoint may serve a cached response
+CACHE_TTLS = {
+    "fleet-summary": 30,
+    "vehicles": 60,
+    "fuel-trends": 300,
+    "maintenance-alerts": 60
+}
+
+# Tables each conditional endpoint's ETag is versioned by (see versions.py)
+VERSIONED_TABLES = {
+    "vehicles": ("vehicles",),
+    "fuel-trends": ("fuel_data",),
+    "maintenance-alerts": ("vehicles",)
+}
+
+# Browser/proxy caching per conditional endpoint: pages always revalidate (a 304
+# is cheap), daily trends and the alert list may be reused briefly without asking
+CACHE_CONTROL = {
+    "vehicles": "private, no-cache",
+    "fuel-trends": "private, max-age=60",
+    "maintenance-alerts": "private, max-age=30"
+}
+
+# Concurrent calls each endpoint may have on db_executor. The heavy analytics
+# endpoints together stay below its size, so lookups always find a free thread.
+CONCURRENCY_LIMITS = {
+    "fleet-summary": 2,
+    "fuel-trends": 2,
+    "predict-maintenance-batch": 1,
+    "predict-efficiency-batch": 1,
+    "vehicles": 8,
+    "maintenance-alerts": 4,
+    "predict-maintenance": 8,
+    "anomalies": 4
+}
+
+endpoint_limits = {name: ConcurrencyLimit(name, limit) for name, limit in CONCURRENCY_LIMITS.items()}
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return ORJSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
+
+async def run_db(endpoint, func, *args):
+    """Run blocking DB work on db_executor under the endpoint's concurrency limit
+
+    Fresh cache hits of cached loaders are answered on the event loop without a thread.
+    """
+    peek = getattr(func, 'peek', None)
+    if peek is not None:
+        hit, value = peek(*args)
+        if hit:
+            return value
+    async with endpoint_limits[endpoint]:
+        return await db_executor.run(func, *args)
+
+def read_versions(tables):
+    with db_pool.connection() as conn, metrics.span("db"):
+        return versions.read(conn, tables)
+
+async def conditional(request, endpoint, loader, *args):
+    """Serve a cached loader's Representation, or a 304 when the client's ETag is current
+
+    When the response cache has expired, a request carrying If-None-Match is first
+    checked against the table versions, so an unchanged resource skips the query.
+    Returns None if the loader had nothing to render.
+    """
+    hit, representation = loader.peek(*args)
+    if not hit:
+        if http_cache.if_none_match(request):
+            version = await run_db(endpoint, read_versions, VERSIONED_TABLES[endpoint])
+            unchanged = http_cache.not_modified(request, http_cache.etag(endpoint, args, version), CACHE_CONTROL[endpoint])
+            if unchanged is not None:
+                return unchanged
+        representation = await run_db(endpoint, loader, *args)
+    if representation is None:
+        return None
+    return http_cache.respond(request, representation, CACHE_CONTROL[endpoint])
+
+@response_cache.cached("fleet-summary", ttl=CACHE_TTLS["fleet-summary"], tags=("vehicles", "fuel_data"))
+def load_fleet_summary_parts(parts):
+    with db_pool.connection() as conn:
+        return summary.run_parts(conn, parts)
+
+VEHICLES_MAX_PAGE_SIZE = 500
+
+def encode_cursor(vehicle_id):
+    return base64.urlsafe_b64encode(vehicle_id.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        total_vehicles = cursor.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
-        active_vehicles = cursor.execute("SELECT COUNT(*) FROM vehicles WHERE status = 'active'").fetchone()[0]
-        
-        avg_efficiency = cursor.execute("""
-            SELECT AVG(fuel_efficiency) FROM fuel_data 
-            WHERE date >= date('now', '-7 days')
-        """).fetchone()[0]
-        
-        maintenance_due = cursor.execute("""
-            SELECT COUNT(*) FROM vehicles 
-            WHERE next_maintenance <= date('now', '+7 days')
-        """).fetchone()[0]
-        
-        conn.close()
-        
+        return base64.b64decode(cursor + '=' * (-len(cursor) % 4), altchars=b'-_', validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@response_cache.cached("vehicles", ttl=CACHE_TTLS["vehicles"], tags=("vehicles",))
+def load_vehicles(columns, after, vehicle_type, status, limit):
+    """Return the page, with the next page's cursor in X-Next-Cursor if more follow"""
+    sql = queries.vehicles_page(columns, vehicle_type, status)
+    params = [after] + [p for p in (vehicle_type, status) if p is not None] + [limit + 1]
+    with db_pool.connection() as conn, metrics.span("db"):
+        version = versions.read(conn, VERSIONED_TABLES["vehicles"])   # before the rows, see versions.py
+        rows = conn.execute(sql, params).fetchall()
+    
+    with metrics.span("transform"):
+        # One extra row tells us whether another page exists without a COUNT(*)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        headers = {"X-Next-Cursor": encode_cursor(rows[-1]['vehicle_id'])} if has_more else None
+        page = [dict(row) for row in rows]
+    return http_cache.Representation("vehicles", (columns, after, vehicle_type, status, limit), version, page, headers)
+
+@response_cache.cached("fuel-trends", ttl=CACHE_TTLS["fuel-trends"], tags=("fuel_data",))
+def load_fuel_trends(days):
+    with db_pool.connection() as conn, metrics.span("db"):
+        version = versions.read(conn, VERSIONED_TABLES["fuel-trends"])
+        rows = conn.execute(queries.FUEL_TRENDS, (days,)).fetchall()
+    
+    if not rows:
+        return None
+    
+    with metrics.span("transform"):
+        # Weekday names are only unambiguous within a week
+        label_format = "%a" if days <= 7 else "%b %d"
+        trends = {
+            "labels": [datetime.strptime(row['date'], "%Y-%m-%d").strftime(label_format) for row in rows],
+            # A day whose readings were all NULL has no average
+            "fuel_usage": [round(row['avg_fuel'], 1) if row['avg_fuel'] is not None else None for row in rows],
+            "efficiency": [round(row['avg_efficiency'], 1) if row['avg_efficiency'] is not None else None for row in rows]
+        }
+    return http_cache.Representation("fuel-trends", (days,), version, trends)
+
+@response_cache.cached("fuel-buckets", ttl=CACHE_TTLS["fuel-trends"], tags=("fuel_data",))
+def load_fuel_buckets(start, end, bucket, group_by, vehicle_ids):
+    with db_pool.connection() as conn:
+        with metrics.span("db"):
+            version = versions.read(conn, VERSIONED_TABLES["fuel-trends"])
+        content = trends.load(conn, date.fromisoformat(start), date.fromisoformat(end), bucket, group_by, vehicle_ids)
+    return http_cache.Representation("fuel-trends", (start, end, bucket, group_by, vehicle_ids), version, content)
+
+@response_cache.cached("maintenance-alerts", ttl=CACHE_TTLS["maintenance-alerts"], tags=("vehicles",))
+def load_maintenance_alerts(within_days, limit):
+    """Vehicles due within `within_days` (overdue included), earliest first, from the registry's due index"""
+    snapshot = vehicle_registry.current()
+    with metrics.span("transform"):
+        alerts = [
+            {
+                "vehicle_id": snapshot.ids[row],
+                "type": snapshot.types[snapshot.type_code[row]],
+                "next_maintenance": registry.to_date(snapshot.next_maintenance[row]),
+                "mileage": snapshot.mileage[row]
+            }
+            for row in snapshot.due.rows(registry.today() + within_days, limit)
+        ]
+    # The snapshot's version is that of the vehicles table it was loaded from
+    return http_cache.Representation("maintenance-alerts", (within_days, limit), snapshot.version, alerts)
+
+def load_anomalies(limit, vehicle_id):
+    with db_pool.connection() as conn, metrics.span("db"):
         return {
-            "total_vehicles": total_vehicles,
-            "active_vehicles": active_vehicles,
-            "fuel_efficiency": round(avg_efficiency or 28.5, 1),
-            "maintenance_due": maintenance_due,
-            "monthly_savings": 15000
+            "anomalies": anomaly_stream.recent(conn, limit, vehicle_id),
+            "stats": anomaly_stream.stats(conn)
         }
+
+async def current_registry(endpoint):
+    """The vehicle registry snapshot, on the event loop unless a change counter check is due"""
+    snapshot = vehicle_registry.peek()
+    if snapshot is None:
+        snapshot = await run_db(endpoint, vehicle_registry.current)
+    return snapshot
+
+def score_maintenance_batch(vehicle_ids):
+    """Return (vehicle_ids, scores) for the requested vehicles, or the whole fleet if None"""
+    import numpy as np
+    import models
+    
+    snapshot = vehicle_registry.current()
+    with metrics.span("transform"):
+        last_maintenance = np.frombuffer(snapshot.last_maintenance, dtype=np.int32)
+        if vehicle_ids is None:
+            positions = np.flatnonzero(last_maintenance != NO_DATE)
+        else:
+            positions = np.array(snapshot.positions(vehicle_ids), dtype=np.intp)
+            positions = positions[last_maintenance[positions] != NO_DATE]
+        if not len(positions):
+            return (), None
+        
+        # Registry type codes -> model type codes, through the snapshot's type name table
+        type_codes = models.encode_vehicle_types(snapshot.types)[np.frombuffer(snapshot.type_code, dtype=np.uint16)[positions]]
+        ids = [snapshot.ids[i] for i in positions.tolist()]
+        return ids, get_maintenance_predictor().predict_batch(type_codes, last_maintenance[positions])
+
+def predict_efficiency_batch_rows(vehicle_ids):
+    """Return (vehicle_ids, predicted MPG) for the requested vehicles, or the whole fleet if None
+
+    Predictions are None if the model isn't trained.
+    """
+    import numpy as np
+    
+    predictor = get_models()['fuel_predictor']
+    snapshot = vehicle_registry.current()
+    with metrics.span("transform"):
+        last_maintenance = np.frombuffer(snapshot.last_maintenance, dtype=np.int32)
+        if vehicle_ids is None:
+            positions = np.flatnonzero(last_maintenance != NO_DATE)
+        else:
+            positions = np.array(snapshot.positions(vehicle_ids), dtype=np.intp)
+            positions = positions[last_maintenance[positions] != NO_DATE]
+        if not len(positions):
+            return (), None
+        
+        type_codes = predictor.encode_types(snapshot.types)[np.frombuffer(snapshot.type_code, dtype=np.uint16)[positions]]
+        ids = [snapshot.ids[i] for i in positions.tolist()]
+        return ids, predictor.predict_batch(
+            np.frombuffer(snapshot.mileage, dtype=np.int64)[positions], last_maintenance[positions], type_codes
+        )
+
+def mock_fuel_trends():
+    dates = [(datetime.now() - timedelta(days=i)).strftime("%a") for i in range(6, -1, -1)]
+    return {
+        "labels": dates,
+        "fuel_usage": [450, 420, 480, 390, 410, 440, 425],
+        "efficiency": [27.2, 28.1, 26.8, 29.2, 28.7, 28.5, 29.1]
+    }
+
+MOCK_MAINTENANCE_ALERTS = [
+    {"vehicle_id": "TRK-A123", "type": "Truck", "next_maintenance": "2025-01-28", "mileage": 45000},
+    {"vehicle_id": "VAN-B456", "type": "Van", "next_maintenance": "2025-01-30", "mileage": 38000},
+    {"vehicle_id": "TRK-C789", "type": "Truck", "next_maintenance": "2025-02-02", "mileage": 52000}
+]
+
+async def load_fleet_summary():
+    *results, snapshot = await asyncio.gather(
+        *(run_db("fleet-summary", load_fleet_summary_parts, parts) for parts in summary.plan()),
+        current_registry("fleet-summary")
+    )
+    due = snapshot.due.count(registry.today() + MAINTENANCE_DUE_DAYS)
+    return summary.build([*results, {"maintenance_due": due}])
+
+@app.get("/api/fleet-summary")
+async def fleet_summary():
+    """Get fleet overview statistics"""
+    try:
+        return await load_fleet_summary()
+    except Overloaded:
+        raise
     except Exception as e:
+        metrics.fallback("fleet-summary", e)
         return {
             "total_vehicles": 98,
             "active_vehicles": 92,
@@ -69,89 +424,132 @@ def fleet_summary():
         }
 
 @app.get("/api/vehicles")
-def get_vehicles():
-    """Get list of all vehicles"""
+async def get_vehicles(
+    request: Request,
+    limit: int = Query(20, ge=1, le=VEHICLES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    vehicle_type: Optional[str] = Query(None, alias="type"),
+    status: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Get a page of vehicles ordered by vehicle_id
+
+    Pass the X-Next-Cursor response header back as `cursor` for the next page.
+    `fields` is a comma-separated column list; vehicle_id is always included.
+    """
+    columns = queries.VEHICLE_COLUMNS
+    if fields:
+        requested = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = sorted(set(requested) - set(queries.VEHICLE_COLUMNS))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        columns = ('vehicle_id',) + tuple(c for c in queries.VEHICLE_COLUMNS if c in requested and c != 'vehicle_id')
+    after = decode_cursor(cursor) if cursor else ''
+    
     try:
-        conn = get_db_connection()
-        vehicles = pd.read_sql_query("SELECT * FROM vehicles LIMIT 20", conn)
-        conn.close()
-        return vehicles.to_dict('records')
+        return await conditional(request, "vehicles", load_vehicles, columns, after, vehicle_type, status, limit)
+    except Overloaded:
+        raise
     except Exception as e:
+        metrics.fallback("vehicles", e)
         return [
             {"vehicle_id": "TRK-001", "type": "Truck", "status": "active", "fuel_efficiency": 28.5, "next_maintenance": "2025-02-15"},
             {"vehicle_id": "VAN-002", "type": "Van", "status": "active", "fuel_efficiency": 32.1, "next_maintenance": "2025-02-20"},
             {"vehicle_id": "TRK-003", "type": "Truck", "status": "maintenance", "fuel_efficiency": 27.8, "next_maintenance": "2025-01-30"}
         ]
 
+MAX_TREND_VEHICLES = 50
+
 @app.get("/api/fuel-trends")
-def fuel_trends():
-    """Get fuel consumption trends for the last 7 days"""
-    try:
-        conn = get_db_connection()
-        
-        fuel_data = pd.read_sql_query("""
-            SELECT date, AVG(fuel_consumed) as avg_fuel, AVG(fuel_efficiency) as avg_efficiency
-            FROM fuel_data 
-            WHERE date >= date('now', '-7 days')
-            GROUP BY date
-            ORDER BY date
-        """, conn)
-        
-        conn.close()
+async def fuel_trends(
+    request: Request,
+    days: int = Query(7, ge=1, le=365),
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    bucket: Optional[str] = None,
+    group_by: Optional[str] = None,
+    vehicle_id: Optional[str] = None
+):
+    """Get fuel consumption trends for the last N days (default 7) from the daily rollup
+
+    With `from`/`to` (inclusive dates; `to` defaults to today, `from` to `days`
+    days earlier for day buckets and 12 weeks or months otherwise), `bucket`
+    (day, week or month) or `group_by` (type, or vehicle with a comma-separated
+    `vehicle_id` list) the response is bucketed: `labels` plus fleet averages,
+    or one entry in `series` per group (see trends.py).
+    """
+    if start is None and end is None and bucket is None and group_by is None and vehicle_id is None:
+        try:
+            response = await conditional(request, "fuel-trends", load_fuel_trends, days)
+            if response is not None:
+                return response
+            metrics.fallback("fuel-trends", "no fuel data in range")
+        except Overloaded:
+            raise
+        except Exception as e:
+            metrics.fallback("fuel-trends", e)
         
-        if len(fuel_data) > 0:
-            return {
-                "labels": [datetime.strptime(d, "%Y-%m-%d").strftime("%a") for d in fuel_data['date']],
-                "fuel_usage": fuel_data['avg_fuel'].round(1).tolist(),
-                "efficiency": fuel_data['avg_efficiency'].round(1).tolist()
-            }
-    except Exception as e:
-        pass
+        return mock_fuel_trends()
     
-    dates = [(datetime.now() - timedelta(days=i)).strftime("%a") for i in range(6, -1, -1)]
-    return {
-        "labels": dates,
-        "fuel_usage": [450, 420, 480, 390, 410, 440, 425],
-        "efficiency": [27.2, 28.1, 26.8, 29.2, 28.7, 28.5, 29.1]
-    }
+    bucket = bucket or "day"
+    if bucket == "hour":
+        raise HTTPException(status_code=400, detail="Fuel data is recorded per day; the finest bucket is day")
+    if bucket not in trends.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(trends.BUCKETS)}")
+    if group_by is not None and group_by not in trends.GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(trends.GROUPS)}")
+    vehicle_ids = tuple(dict.fromkeys(v.strip() for v in (vehicle_id or '').split(',') if v.strip()))
+    if (group_by == "vehicle") != bool(vehicle_ids):
+        raise HTTPException(status_code=400, detail="vehicle_id is required with group_by=vehicle and only allowed with it")
+    if len(vehicle_ids) > MAX_TREND_VEHICLES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TREND_VEHICLES} vehicles per request")
+    
+    end = end or trends.today()
+    start = start or (end - timedelta(days=days) if bucket == "day" else trends.default_start(end, bucket))
+    if start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
+    if trends.bucket_count(start, end, bucket) > trends.MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"At most {trends.MAX_BUCKETS} buckets per request; use a coarser bucket")
+    
+    try:
+        return await conditional(
+            request, "fuel-trends", load_fuel_buckets, start.isoformat(), end.isoformat(), bucket, group_by, vehicle_ids
+        )
+    except Overloaded:
+        raise
+    except Exception as e:
+        metrics.fallback("fuel-trends", e)
+        raise HTTPException(status_code=503, detail="Fuel trends are unavailable")
 
 @app.get("/api/maintenance-alerts")
-def maintenance_alerts():
-    """Get vehicles due for maintenance"""
+async def maintenance_alerts(
+    request: Request,
+    within_days: int = Query(MAINTENANCE_ALERT_DAYS, ge=0, le=3650),
+    limit: Optional[int] = Query(None, ge=1, le=10000)
+):
+    """Get vehicles due for maintenance within `within_days`, most overdue first
+
+    Overdue vehicles are always included; `limit` keeps the first (most overdue) ones.
+    """
     try:
-        conn = get_db_connection()
-        alerts = pd.read_sql_query("""
-            SELECT vehicle_id, type, next_maintenance, mileage
-            FROM vehicles 
-            WHERE next_maintenance <= date('now', '+14 days')
-            ORDER BY next_maintenance
-        """, conn)
-        conn.close()
-        return alerts.to_dict('records')
+        return await conditional(request, "maintenance-alerts", load_maintenance_alerts, within_days, limit)
+    except Overloaded:
+        raise
     except Exception as e:
-        return [
-            {"vehicle_id": "TRK-A123", "type": "Truck", "next_maintenance": "2025-01-28", "mileage": 45000},
-            {"vehicle_id": "VAN-B456", "type": "Van", "next_maintenance": "2025-01-30", "mileage": 38000},
-            {"vehicle_id": "TRK-C789", "type": "Truck", "next_maintenance": "2025-02-02", "mileage": 52000}
-        ]
+        metrics.fallback("maintenance-alerts", e)
+        return MOCK_MAINTENANCE_ALERTS
 
 @app.post("/api/predict-maintenance")
-def predict_maintenance(request: MaintenanceRequest):
+async def predict_maintenance(request: MaintenanceRequest):
     """Predict maintenance needs for a specific vehicle"""
     try:
-        conn = get_db_connection()
-        vehicle = pd.read_sql_query(
-            "SELECT * FROM vehicles WHERE vehicle_id = ?", 
-            conn, 
-            params=[request.vehicle_id]
-        )
-        conn.close()
+        vehicle = (await current_registry("predict-maintenance")).get(request.vehicle_id)
         
-        if len(vehicle) == 0:
-            raise HTTPException(status_code=404, message="Vehicle not found")
+        if vehicle is None:
+            raise HTTPException(status_code=404, detail="Vehicle not found")
         
-        mileage = vehicle.iloc[0]['mileage']
-        last_maintenance = vehicle.iloc[0]['last_maintenance']
+        mileage = vehicle['mileage']
+        last_maintenance = vehicle['last_maintenance']
         
         # Simple ML logic based on mileage and time since last maintenance
         miles_since_maintenance = mileage - (mileage % 5000)
@@ -172,7 +570,10 @@ def predict_maintenance(request: MaintenanceRequest):
                 "days_since_maintenance": days_since_maintenance
             }
         }
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
+        metrics.fallback("predict-maintenance", e)
         return {
             "vehicle_id": request.vehicle_id,
             "needs_maintenance": random.choice([True, False]),
@@ -180,30 +581,211 @@ def predict_maintenance(request: MaintenanceRequest):
             "recommended_date": "2025-02-15"
         }
 
-@app.post("/api/ai-chat")
-def ai_chat(request: ChatMessage):
-    """AI chat assistant for fleet management"""
-    message = request.message.lower()
+@app.post("/api/predict-maintenance/batch")
+async def predict_maintenance_batch(request: BatchMaintenanceRequest):
+    """Score maintenance risk for many vehicles (the whole fleet by default) in one vectorized pass"""
+    try:
+        vehicle_ids, scores = await run_db("predict-maintenance-batch", score_maintenance_batch, request.vehicle_ids)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=503, detail=f"Vehicle data unavailable: {e}")
     
-    responses = {
-        "fuel": "Your fleet's average fuel efficiency is 28.5 MPG, which is 12% better than last month! Top performers include VAN-B456 (32.1 MPG) and TRK-C789 (29.8 MPG).",
-        "efficiency": "To improve fuel efficiency, consider: 1) Regular maintenance schedules 2) Driver training programs 3) Route optimization 4) Tire pressure monitoring.",
-        "maintenance": "You have 12 vehicles due for maintenance in the next 2 weeks. The most urgent are TRK-A123 (due Jan 28) and VAN-B456 (due Jan 30). Would you like me to schedule these?",
-        "cost": "Current monthly fleet costs: Fuel $45,000, Maintenance $12,000, Insurance $8,000. You're saving $15,000/month vs. last year through optimization.",
-        "save": "Top cost-saving opportunities: 1) Route optimization could save $8,000/month 2) Preventive maintenance saves $5,000/month 3) Fuel efficiency programs save $12,000/month.",
-        "alert": "Current alerts: 3 vehicles need immediate attention, 5 are due for maintenance, and 2 have fuel efficiency below targets.",
-        "hello": "Hello! I'm your Fleet Intelligence Assistant. I can help with fuel efficiency, maintenance scheduling, cost optimization, and fleet analytics. What would you like to know?",
-        "help": "I can assist with: \n• Fleet performance analytics\n• Maintenance predictions\n• Fuel efficiency optimization\n• Cost analysis and savings\n• Vehicle status and alerts\n\nWhat specific area interests you?"
-    }
+    if not vehicle_ids:
+        return {"count": 0, "vehicle_id": [], "needs_maintenance": [], "risk_score": [],
+                "days_until_maintenance": [], "miles_until_maintenance": []}
     
-    for key in responses:
-        if key in message:
-            return {"response": responses[key]}
+    # Columnar response: one array per field, aligned with vehicle_id
+    with metrics.span("transform"):
+        return {
+            "count": len(vehicle_ids),
+            "vehicle_id": vehicle_ids,
+            "needs_maintenance": scores['needs_maintenance'].tolist(),
+            "risk_score": scores['risk_score'].round(4).tolist(),
+            "days_until_maintenance": scores['days_until_maintenance'].astype(int).tolist(),
+            "miles_until_maintenance": scores['miles_until_maintenance'].astype(int).tolist()
+        }
+
+@app.post("/api/predict-efficiency/batch")
+async def predict_efficiency_batch(request: BatchEfficiencyRequest):
+    """Predict fuel efficiency for many vehicles (the whole fleet by default) in one matrix-vector product"""
+    try:
+        vehicle_ids, predictions = await run_db("predict-efficiency-batch", predict_efficiency_batch_rows,
+                                                request.vehicle_ids)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=503, detail=f"Vehicle data unavailable: {e}")
+    
+    if not vehicle_ids:
+        return {"count": 0, "vehicle_id": [], "predicted_efficiency": []}
+    if predictions is None:
+        raise HTTPException(status_code=503, detail="Fuel efficiency model is not trained")
     
-    return {"response": "I can help you with fuel efficiency, maintenance schedules, cost optimization, and fleet analytics. Could you be more specific about what you'd like to know?"}
+    # Columnar response, aligned with vehicle_id
+    with metrics.span("transform"):
+        return {
+            "count": len(vehicle_ids),
+            "vehicle_id": vehicle_ids,
+            "predicted_efficiency": predictions.round(2).tolist()
+        }
+
+@app.get("/api/anomalies")
+async def anomalies(limit: int = Query(50, ge=1, le=1000), vehicle_id: Optional[str] = None):
+    """Get recently flagged fuel records, newest first, from the streaming detector"""
+    return await run_db("anomalies", load_anomalies, limit, vehicle_id)
+
+async def live_fuel_trends():
+    representation = await run_db("fuel-trends", load_fuel_trends, 7)
+    if representation is None:
+        metrics.fallback("fuel-trends", "no fuel data in range")
+        return mock_fuel_trends()
+    return representation.content
+
+async def live_maintenance_alerts():
+    return (await run_db("maintenance-alerts", load_maintenance_alerts, MAINTENANCE_ALERT_DAYS, None)).content
+
+# One producer recomputes the dashboard sections for every open /api/live stream;
+# a section whose query fails keeps its last published value
+live_feed = LiveFeed(
+    {
+        "summary": load_fleet_summary,
+        "trends": live_fuel_trends,
+        "alerts": live_maintenance_alerts
+    },
+    interval=float(os.environ.get('FLEET_LIVE_INTERVAL', '5')),
+    max_subscribers=int(os.environ.get('FLEET_LIVE_MAX_SUBSCRIBERS', '1000'))
+)
+
+@app.get("/api/live")
+async def live():
+    """Stream dashboard summary, trend and alert updates as Server-Sent Events
+
+    Each event carries a whole section and is sent only when it changed; the
+    current snapshot is sent on connect.
+    """
+    if draining:
+        raise HTTPException(status_code=503, detail="Server is draining", headers={"Retry-After": "1"})
+    subscriber = live_feed.subscribe()
+    return StreamingResponse(
+        live_feed.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def load_chat_data(needs):
+    """The data a chat answer needs, from the dashboard's cached loaders"""
+    data = {}
+    if "summary" in needs:
+        data["summary"] = await load_fleet_summary()
+    if "alerts" in needs:
+        data["alerts"] = (await run_db("maintenance-alerts", load_maintenance_alerts, MAINTENANCE_ALERT_DAYS, None)).content
+    if "trends" in needs:
+        representation = await run_db("fuel-trends", load_fuel_trends, 7)
+        data["trends"] = representation.content if representation is not None else None
+    return data
+
+@app.post("/api/ai-chat")
+async def ai_chat(request: ChatMessage):
+    """AI chat assistant for fleet management, answering from live fleet data"""
+    intent = chat.match_intent(request.message)
+    try:
+        data = await load_chat_data(chat.NEEDS.get(intent, ()))
+    except Overloaded:
+        raise
+    except Exception as e:
+        metrics.fallback("ai-chat", e)
+        return {"response": chat.UNAVAILABLE}
+    return {"response": chat.answer(intent, data)}
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker's event loop is serving requests"""
+    return {"status": "ok", "pid": os.getpid()}
+
+def check_database():
+    with db_pool.connection() as conn:
+        conn.execute("SELECT 1 FROM vehicles LIMIT 1").fetchall()
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: not draining and the database answers; 503 otherwise"""
+    if draining:
+        return ORJSONResponse({"status": "draining", "pid": os.getpid()}, status_code=503)
+    try:
+        await db_executor.run(check_database)
+    except Exception as e:
+        return ORJSONResponse({"status": "unavailable", "pid": os.getpid(), "detail": str(e)}, status_code=503)
+    return {"status": "ready", "pid": os.getpid(), "models_loaded": _models is not None}
+
+@app.get("/api/db-stats")
+async def db_stats():
+    """Get connection pool statistics"""
+    return db_pool.stats()
+
+@app.get("/api/executor-stats")
+async def executor_stats():
+    """Get DB executor queue depth and per-endpoint concurrency statistics"""
+    return {
+        "executor": db_executor.stats(),
+        "endpoints": {name: limit.stats() for name, limit in endpoint_limits.items()}
+    }
+
+def collect_runtime_metrics():
+    """Pool, executor, cache and live feed gauges for /metrics"""
+    pool, executor, cache, live = db_pool.stats(), db_executor.stats(), response_cache.stats(), live_feed.stats()
+    vehicles = vehicle_registry.stats()
+    samples = [
+        ("fleet_db_pool_connections", "Open pooled connections", "gauge", None, pool["open"]),
+        ("fleet_db_pool_waits_total", "Checkouts that waited for a connection", "counter", None, pool["waits"]),
+        ("fleet_executor_running", "db_executor jobs running", "gauge", None, executor["running"]),
+        ("fleet_executor_queued", "db_executor jobs waiting for a thread", "gauge", None, executor["queued"]),
+        ("fleet_cache_hits_total", "Response cache hits", "counter", None, cache["hits"]),
+        ("fleet_cache_misses_total", "Response cache misses", "counter", None, cache["misses"]),
+        ("fleet_live_subscribers", "Open /api/live streams", "gauge", None, live["subscribers"]),
+        ("fleet_registry_reloads_total", "Vehicle registry reloads", "counter", None, vehicles["reloads"]),
+    ]
+    limits = {name: limit.stats() for name, limit in endpoint_limits.items()}
+    samples += [("fleet_endpoint_waiting", "Calls waiting on an endpoint's concurrency limit", "gauge",
+                 {"endpoint": name}, stats["waiting"]) for name, stats in limits.items()]
+    samples += [("fleet_endpoint_rejected_total", "Calls shed with 503 by an endpoint's concurrency limit", "counter",
+                 {"endpoint": name}, stats["rejected"]) for name, stats in limits.items()]
+    return samples
+
+metrics.register_collector(collect_runtime_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Request, latency, phase and fallback metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/latency-stats")
+async def latency_stats():
+    """Get p50/p90/p99 latency and median phase times per route"""
+    return metrics.summary()
+
+@app.get("/api/registry-stats")
+async def registry_stats():
+    """Get vehicle registry size, memory and reload counters"""
+    return vehicle_registry.stats()
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Get response cache statistics"""
+    return response_cache.stats()
+
+@app.get("/api/live-stats")
+async def live_stats():
+    """Get live feed subscriber and fan-out statistics"""
+    return live_feed.stats()
+
+@app.post("/api/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_cache(request: CacheInvalidation):
+    """Drop cached responses derived from the given tables (all if none) after a write"""
+    invalidated = response_cache.invalidate(*request.tables)
+    if not request.tables or "vehicles" in request.tables:
+        vehicle_registry.expire()
+    live_feed.refresh_soon()
+    return {"invalidated": invalidated}
 
 @app.get("/api/performance-metrics")
-def performance_metrics():
+async def performance_metrics():
     """Get detailed performance metrics"""
     return {
         "weekly_stats": {
@@ -0,0 +1,302 @@
+"""
+Request metrics: per-endpoint latency histograms, phase spans and fallback counts
+
+MetricsMiddleware times every request into a log-linear (HDR-style) histogram
+per route. Code on the request path marks phases with `span(phase)`: "queue"
+(waiting for an endpoint limit or a db_executor thread), "connect" (pool
+checkout), "db", "transform" and "serialize". Spans recorded on db_executor
+threads reach the request because the executor runs jobs in a copy of the
+request's context. Endpoints that fall back to mock data or an unavailable
+reply call `fallback()`.
+
+Everything is exported by `render()` in the Prometheus text format for /metrics.
+Histograms are only written from the event loop thread, so they need no lock.
+"""
+
+import contextvars
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Log-linear latency histogram: SUB_BUCKETS linear buckets per power of two
+
+    Buckets start at LOWEST seconds, so any recorded value is within
+    1 / SUB_BUCKETS of its bucket's upper bound, from microseconds to minutes.
+    """
+
+    LOWEST = 1e-6
+    OCTAVES = 27   # up to ~134s; anything slower lands in the overflow bucket
+    SUB_BUCKETS = 8
+
+    def __init__(self):
+        self.counts = [0] * (self.OCTAVES * self.SUB_BUCKETS + 2)
+        self.count = 0
+        self.sum = 0.0
+
+    def index(self, seconds):
+        scaled = seconds / self.LOWEST
+        if scaled < 1:
+            return 0
+        mantissa, exponent = math.frexp(scaled)   # scaled = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        octave = exponent - 1
+        if octave >= self.OCTAVES:
+            return len(self.counts) - 1
+        return 1 + octave * self.SUB_BUCKETS + int((mantissa * 2 - 1) * self.SUB_BUCKETS)
+
+    def upper_bound(self, index):
+        if index == 0:
+            return self.LOWEST
+        if index == len(self.counts) - 1:
+            return math.inf
+        octave, sub = divmod(index - 1, self.SUB_BUCKETS)
+        return self.LOWEST * 2 ** octave * (1 + (sub + 1) / self.SUB_BUCKETS)
+
+    def record(self, seconds):
+        self.counts[self.index(seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (0 if empty)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.upper_bound(index)
+        return math.inf
+
+    def cumulative(self, min_octave=3):
+        """(le, cumulative count) at each power of two from LOWEST * 2**min_octave, then +Inf"""
+        buckets, seen = [], sum(self.counts[:1 + min_octave * self.SUB_BUCKETS])
+        for octave in range(min_octave, self.OCTAVES):
+            start = 1 + octave * self.SUB_BUCKETS
+            seen += sum(self.counts[start:start + self.SUB_BUCKETS])
+            buckets.append((self.LOWEST * 2 ** (octave + 1), seen))
+        buckets.append((math.inf, self.count))
+        return buckets
+
+
+class RequestTimings:
+    """Phase durations accumulated by one request, possibly from several threads"""
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.profile = None   # set by the profiler for ?profile=1 requests
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] += seconds
+
+
+_current = contextvars.ContextVar('fleet_request_timings', default=None)
+
+PHASES = ('queue', 'connect', 'db', 'transform', 'serialize')
+
+_requests = defaultdict(int)        # (route, method, status) -> count
+_latency = defaultdict(Histogram)   # route -> request duration
+_phases = defaultdict(Histogram)    # (route, phase) -> per-request phase total
+_fallbacks = defaultdict(int)       # endpoint -> responses served without the database
+_collectors = []
+
+
+def current():
+    """The RequestTimings of the request being handled, or None outside one"""
+    return _current.get()
+
+
+def activate(timings):
+    """Make `timings` the current request's; returns a token for deactivate()"""
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def worker_thread():
+    """Mark the calling thread as working for the current request (for the profiler)"""
+    timings = _current.get()
+    profile = timings.profile if timings is not None else None
+    if profile is None:
+        yield
+        return
+    profile.add_thread()
+    try:
+        yield
+    finally:
+        profile.remove_thread()
+
+
+def record(phase, seconds):
+    """Add an already measured duration to the current request's phase"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def span(phase):
+    """Time the enclosed block as part of the current request's phase"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def fallback(endpoint, error):
+    """Count (and log) a response served from mock data, or an unavailable reply, instead of the database"""
+    _fallbacks[endpoint] += 1
+    print(f"{endpoint} fell back: {error!r}")
+
+
+def register_collector(collect):
+    """Add a callable returning [(name, help, type, {labels} or None, value)] for /metrics"""
+    _collectors.append(collect)
+
+
+def route_of(scope):
+    """Path template of the matched route, so /api/x?y=1 and /api/x?y=2 share a series"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    app = scope["app"]
+    routes = getattr(app.state, 'metrics_routes', None)
+    if routes is None:
+        routes = app.state.metrics_routes = {getattr(r, 'endpoint', None): r.path for r in app.routes}
+    return routes.get(endpoint, "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and phase histograms
+
+    Routes in `untimed` (long-lived streams) are counted but kept out of the
+    latency histograms. `profiler` handles ?profile=1 requests (see profiler.py).
+    """
+
+    def __init__(self, app, untimed=(), profiler=None):
+        self.app = app
+        self.untimed = set(untimed)
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if self.profiler is not None and self.profiler.requested(scope):
+            return await self.profiler.handle(self.app, scope, receive, send)
+
+        timings = RequestTimings()
+        token = activate(timings)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            deactivate(token)
+            observe(route_of(scope), scope["method"], status, time.perf_counter() - start, timings,
+                    timed=scope["path"] not in self.untimed)
+
+
+def observe(route, method, status, seconds, timings, timed=True):
+    _requests[(route, method, status)] += 1
+    if timed:
+        _latency[route].record(seconds)
+        for phase, total in timings.phases.items():
+            _phases[(route, phase)].record(total)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _le(bound):
+    return "+Inf" if bound == math.inf else repr(float(f"{bound:.6g}"))
+
+
+def _histogram_lines(name, labels, histogram):
+    for bound, count in histogram.cumulative():
+        yield f"{name}_bucket{_labels({**labels, 'le': _le(bound)})} {count}"
+    yield f"{name}_sum{_labels(labels)} {histogram.sum:.9g}"
+    yield f"{name}_count{_labels(labels)} {histogram.count}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (0.0.4)"""
+    lines = [
+        "# HELP fleet_http_requests_total Requests handled, by route, method and status",
+        "# TYPE fleet_http_requests_total counter",
+    ]
+    for (route, method, status), count in sorted(_requests.items()):
+        lines.append(f"fleet_http_requests_total{_labels({'route': route, 'method': method, 'status': status})} {count}")
+
+    lines += [
+        "# HELP fleet_http_request_duration_seconds Time from request start to the last response byte",
+        "# TYPE fleet_http_request_duration_seconds histogram",
+    ]
+    for route, histogram in sorted(_latency.items()):
+        lines.extend(_histogram_lines("fleet_http_request_duration_seconds", {"route": route}, histogram))
+
+    lines += [
+        "# HELP fleet_request_phase_seconds Time per request spent in each phase (queue, connect, db, transform, serialize)",
+        "# TYPE fleet_request_phase_seconds histogram",
+    ]
+    for (route, phase), histogram in sorted(_phases.items()):
+        lines.extend(_histogram_lines("fleet_request_phase_seconds", {"route": route, "phase": phase}, histogram))
+
+    lines += [
+        "# HELP fleet_fallback_total Responses served from mock data or as unavailable because the database path failed",
+        "# TYPE fleet_fallback_total counter",
+    ]
+    for endpoint, count in sorted(_fallbacks.items()):
+        lines.append(f"fleet_fallback_total{_labels({'endpoint': endpoint})} {count}")
+
+    described = set()
+    for collect in _collectors:
+        for name, help_text, kind, labels, value in collect():
+            if name not in described:
+                described.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def summary():
+    """p50/p90/p99 per route in milliseconds, for quick inspection"""
+    return {
+        route: {
+            "count": histogram.count,
+            **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) * 1000, 3) for q in (0.5, 0.9, 0.99)},
+            "phases_p50_ms": {
+                phase: round(_phases[(route, phase)].quantile(0.5) * 1000, 3)
+                for phase in PHASES if (route, phase) in _phases
+            }
+        }
+        for route, histogram in sorted(_latency.items())
+    }
@@ -0,0 +1,109 @@
+"""
+On-disk model artifacts keyed by a fingerprint of their training data
+
+Each trained model is written once with joblib (uncompressed, so its NumPy arrays
+can be memory-mapped on load and shared between forked workers through the page
+cache) next to a manifest recording the artifact format version and the training
+data fingerprint. A model is only retrained when the fingerprint changes.
+
+Layout: <artifact_dir>/<name>/manifest.json + model.joblib
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+ARTIFACT_DIR = os.environ.get('FLEET_MODEL_DIR', 'model_artifacts')
+
+# Bump when the pickled model classes change shape so stale artifacts are ignored
+ARTIFACT_FORMAT_VERSION = 3
+
+# Everything the training queries read, summarized cheaply. The date is included
+# because both the 30-day window and days_since_maintenance are relative to today.
+_FINGERPRINT_QUERIES = (
+    "SELECT date('now')",
+    "PRAGMA user_version",
+    """
+    SELECT COUNT(*), MAX(id), TOTAL(fuel_efficiency), TOTAL(fuel_consumed), TOTAL(distance_traveled)
+    FROM fuel_data WHERE date >= date('now', '-30 days')
+    """,
+    """
+    SELECT COUNT(*), TOTAL(mileage), TOTAL(julianday(last_maintenance)), group_concat(DISTINCT type)
+    FROM vehicles
+    """,
+)
+
+
+def training_fingerprint(db_path):
+    """Hash of the data the training queries would see right now"""
+    conn = sqlite3.connect(db_path)
+    try:
+        digest = hashlib.sha256()
+        for sql in _FINGERPRINT_QUERIES:
+            digest.update(repr(conn.execute(sql).fetchone()).encode())
+        return digest.hexdigest()
+    finally:
+        conn.close()
+
+
+def _model_dir(name, artifact_dir):
+    return os.path.join(artifact_dir or ARTIFACT_DIR, name)
+
+
+def load(name, fingerprint, artifact_dir=None):
+    """Return the stored model if it was trained on data with this fingerprint, else None"""
+    model_dir = _model_dir(name, artifact_dir)
+    try:
+        with open(os.path.join(model_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION or manifest.get('fingerprint') != fingerprint:
+        return None
+
+    import joblib
+    try:
+        return joblib.load(os.path.join(model_dir, 'model.joblib'), mmap_mode='r')
+    except Exception as e:
+        print(f"Could not load {name} artifact: {e}")
+        return None
+
+
+def save(name, model, fingerprint, artifact_dir=None, train_seconds=None):
+    """Write the model and its manifest, replacing any previous artifact atomically"""
+    import joblib
+    import sklearn
+
+    model_dir = _model_dir(name, artifact_dir)
+    parent = os.path.dirname(model_dir) or '.'
+    os.makedirs(parent, exist_ok=True)
+
+    staging = tempfile.mkdtemp(prefix=f".{name}-", dir=parent)
+    try:
+        os.chmod(staging, 0o755)   # mkdtemp is owner-only; workers may run as another user
+        joblib.dump(model, os.path.join(staging, 'model.joblib'))
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump({
+                'name': name,
+                'format_version': ARTIFACT_FORMAT_VERSION,
+                'fingerprint': fingerprint,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'sklearn_version': sklearn.__version__,
+                'train_seconds': train_seconds
+            }, f, indent=2)
+
+        # Swap directories so readers never see a half-written artifact
+        previous = f"{model_dir}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(model_dir):
+            os.rename(model_dir, previous)
+        os.rename(staging, model_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
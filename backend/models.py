@@ -1,43 +1,83 @@
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
 import sqlite3
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta
-import pickle
+import queries
+
+# pandas and scikit-learn are imported where they are used: together they cost
+# ~1s of import time, which a serverless cold start or a MaintenancePredictor-only
+# caller should not pay
+
+def _archived_window_start(conn):
+    """Start of the 30-day training window if part of it is in the Parquet archive, else None"""
+    import archive
+    
+    months = archive.archived_months(conn)
+    if not months:
+        return None
+    since = conn.execute(queries.TRAINING_WINDOW_START).fetchone()[0]
+    return since if months[-1] >= since[:7] else None
 
 class FuelEfficiencyPredictor:
     def __init__(self):
+        from sklearn.linear_model import LinearRegression
+        from sklearn.preprocessing import StandardScaler
+        
         self.model = LinearRegression()
         self.scaler = StandardScaler()
         self.is_trained = False
+        # Fixed type encoding, pickled with the model so training and every prediction agree
+        self.type_codes = dict(_TYPE_CODES)
+        # The scaler folded into the regression after training (see _fuse)
+        self.weights = None
+        self.intercept = None
+    
+    def encode_types(self, types):
+        """Vehicle type names as this model's type codes (unknown types share the last code)"""
+        unknown = len(self.type_codes)
+        return np.fromiter((self.type_codes.get(t, unknown) for t in types), dtype=np.float64, count=len(types))
     
     def prepare_features(self, data):
         """Prepare features for fuel efficiency prediction"""
+        import pandas as pd
+        
         features = pd.DataFrame()
         features['mileage'] = data['mileage']
         features['days_since_maintenance'] = (
             pd.to_datetime('today') - pd.to_datetime(data['last_maintenance'])
         ).dt.days
-        features['vehicle_type_encoded'] = pd.factorize(data['type'])[0]
+        features['vehicle_type_encoded'] = self.encode_types(list(data['type']))
         return features
     
+    def _fuse(self):
+        """Precompute weights and intercept so that predicting is X @ weights + intercept
+        
+        model(scaler(X)) = ((X - mean) / scale) @ coef + b = X @ (coef / scale) + (b - mean @ (coef / scale))
+        """
+        self.weights = self.model.coef_ / self.scaler.scale_
+        self.intercept = float(self.model.intercept_ - self.scaler.mean_ @ self.weights)
+    
     def train(self, db_path='fleet_data.db'):
         """Train the fuel efficiency model"""
+        import pandas as pd
+        
         try:
             conn = sqlite3.connect(db_path)
             
             # Get vehicle data with recent fuel efficiency
-            query = """
-                SELECT v.*, AVG(f.fuel_efficiency) as avg_efficiency
-                FROM vehicles v
-                JOIN fuel_data f ON v.vehicle_id = f.vehicle_id
-                WHERE f.date >= date('now', '-30 days')
-                GROUP BY v.vehicle_id
-            """
-            
-            data = pd.read_sql_query(query, conn)
+            since = _archived_window_start(conn)
+            if since is None:
+                data = pd.read_sql_query(queries.FUEL_EFFICIENCY_TRAINING, conn)
+            else:
+                # Same rows as FUEL_EFFICIENCY_TRAINING, with the archived days read from Parquet
+                import archive
+                history = archive.fuel_history(db_path, since=since, columns=('vehicle_id', 'fuel_efficiency'))
+                averages = history.group_by('vehicle_id').aggregate([('fuel_efficiency', 'mean')]).to_pandas()
+                averages = averages.rename(columns={'fuel_efficiency_mean': 'avg_efficiency'})
+                vehicles = pd.read_sql_query(queries.TRAINING_VEHICLES, conn)
+                data = vehicles.merge(averages, on='vehicle_id').sort_values('vehicle_id', ignore_index=True)
             conn.close()
             
             if len(data) < 10:
@@ -48,6 +88,7 @@ class FuelEfficiencyPredictor:
             
             X_scaled = self.scaler.fit_transform(X)
             self.model.fit(X_scaled, y)
+            self._fuse()
             self.is_trained = True
             return True
             
@@ -61,15 +102,56 @@ class FuelEfficiencyPredictor:
             return None
         
         try:
-            features = self.prepare_features(pd.DataFrame([vehicle_data]))
-            features_scaled = self.scaler.transform(features)
-            prediction = self.model.predict(features_scaled)[0]
-            return round(prediction, 2)
+            prediction = self.predict_batch(
+                [vehicle_data['mileage']],
+                to_epoch_days([vehicle_data['last_maintenance']]),
+                self.encode_types([vehicle_data['type']])
+            )[0]
+            return round(float(prediction), 2)
         except Exception as e:
             print(f"Prediction error: {e}")
             return None
+    
+    def predict_batch(self, mileage, last_maintenance_days, type_codes, today=None):
+        """Vectorized predict over a columnar block of vehicles: one matrix-vector product
+        
+        mileage: odometer readings
+        last_maintenance_days: last maintenance as epoch days (see to_epoch_days)
+        type_codes: this model's type codes (see encode_types)
+        today: epoch day to predict for, defaults to today
+        
+        Returns an array of predicted MPG aligned with the inputs, or None if untrained.
+        """
+        if not self.is_trained:
+            return None
+        if today is None:
+            today = today_epoch_day()
+        
+        features = np.empty((len(mileage), 3))
+        features[:, 0] = mileage
+        np.subtract(today, last_maintenance_days, out=features[:, 1])
+        features[:, 2] = type_codes
+        return features @ self.weights + self.intercept
+
+# Fixed vehicle type codes for columnar/batch APIs; code len(VEHICLE_TYPES) means unknown
+VEHICLE_TYPES = ('Truck', 'Van', 'Car', 'Bus')
+UNKNOWN_TYPE_CODE = len(VEHICLE_TYPES)
+_TYPE_CODES = {vehicle_type: code for code, vehicle_type in enumerate(VEHICLE_TYPES)}
+
+def encode_vehicle_types(types):
+    """Map vehicle type names to VEHICLE_TYPES codes as an int8 array"""
+    return np.fromiter((_TYPE_CODES.get(t, UNKNOWN_TYPE_CODE) for t in types), dtype=np.int8, count=len(types))
+
+def to_epoch_days(dates):
+    """Convert 'YYYY-MM-DD' strings (or a datetime64 array) to int32 days since 1970-01-01"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int32)
+
+def today_epoch_day():
+    return int(np.datetime64(datetime.now().date(), 'D').astype(np.int32))
 
 class MaintenancePredictor:
+    ESTIMATED_DAILY_MILES = 150
+    
     def __init__(self):
         self.maintenance_intervals = {
             'Truck': 5000,    # miles
@@ -83,6 +165,13 @@ class MaintenancePredictor:
             'Car': 180,
             'Bus': 60
         }
+        # Interval lookup tables indexed by type code; the extra slot holds the unknown-type default
+        self.mileage_interval_table = np.array(
+            [self.maintenance_intervals[t] for t in VEHICLE_TYPES] + [5000], dtype=np.float64
+        )
+        self.time_interval_table = np.array(
+            [self.time_intervals[t] for t in VEHICLE_TYPES] + [90], dtype=np.float64
+        )
     
     def predict_maintenance_need(self, vehicle_data):
         """Predict if vehicle needs maintenance soon"""
@@ -91,7 +180,7 @@ class MaintenancePredictor:
         last_maintenance_date = vehicle_data.get('last_maintenance')
         
         # Calculate mileage since last maintenance (estimate)
-        estimated_daily_miles = 150  # average daily miles
+        estimated_daily_miles = self.ESTIMATED_DAILY_MILES  # average daily miles
         days_since_maintenance = (
             datetime.now() - datetime.strptime(last_maintenance_date, '%Y-%m-%d')
         ).days
@@ -115,32 +204,69 @@ class MaintenancePredictor:
             'days_until_maintenance': max(0, time_interval - days_since_maintenance),
             'miles_until_maintenance': max(0, mileage_interval - miles_since_maintenance)
         }
+    
+    def predict_batch(self, type_codes, last_maintenance_days, today=None):
+        """Vectorized predict_maintenance_need over a columnar block of vehicles
+        
+        type_codes: VEHICLE_TYPES codes (see encode_vehicle_types)
+        last_maintenance_days: last maintenance as epoch days (see to_epoch_days)
+        today: epoch day to score against, defaults to today
+        
+        Returns a dict of arrays aligned with the inputs.
+        """
+        if today is None:
+            today = today_epoch_day()
+        
+        days_since_maintenance = today - np.asarray(last_maintenance_days, dtype=np.int64)
+        miles_since_maintenance = days_since_maintenance * self.ESTIMATED_DAILY_MILES
+        
+        codes = np.asarray(type_codes, dtype=np.intp)
+        mileage_interval = self.mileage_interval_table[codes]
+        time_interval = self.time_interval_table[codes]
+        
+        risk_score = np.maximum(miles_since_maintenance / mileage_interval, days_since_maintenance / time_interval)
+        
+        return {
+            'needs_maintenance': risk_score > 0.8,
+            'risk_score': np.minimum(risk_score, 1.0),
+            'days_until_maintenance': np.maximum(0, time_interval - days_since_maintenance),
+            'miles_until_maintenance': np.maximum(0, mileage_interval - miles_since_maintenance)
+        }
 
 class AnomalyDetector:
     def __init__(self):
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+        
         self.model = IsolationForest(contamination=0.1, random_state=42)
         self.scaler = StandardScaler()
         self.is_trained = False
     
     def train(self, db_path='fleet_data.db'):
         """Train anomaly detection model"""
+        import pandas as pd
+        
         try:
             conn = sqlite3.connect(db_path)
             
-            query = """
-                SELECT vehicle_id, fuel_efficiency, fuel_consumed, distance_traveled
-                FROM fuel_data
-                WHERE date >= date('now', '-30 days')
-                AND fuel_efficiency > 0
-            """
-            
-            data = pd.read_sql_query(query, conn)
+            since = _archived_window_start(conn)
+            if since is None:
+                data = pd.read_sql_query(queries.ANOMALY_TRAINING, conn)
+            else:
+                import archive
+                import pyarrow.compute as pc
+                history = archive.fuel_history(
+                    db_path, since=since,
+                    columns=('vehicle_id', 'fuel_efficiency', 'fuel_consumed', 'distance_traveled')
+                )
+                data = history.filter(pc.greater(history['fuel_efficiency'], 0)).to_pandas()
             conn.close()
             
             if len(data) < 50:
                 return False
             
-            features = data[['fuel_efficiency', 'fuel_consumed', 'distance_traveled']]
+            # Fitted on a plain array so score() accepts arrays from the streaming path
+            features = data[['fuel_efficiency', 'fuel_consumed', 'distance_traveled']].to_numpy()
             features_scaled = self.scaler.fit_transform(features)
             
             self.model.fit(features_scaled)
@@ -151,48 +277,219 @@ class AnomalyDetector:
             print(f"Anomaly detection training error: {e}")
             return False
     
+    def score(self, features):
+        """Decision scores and anomaly mask for an (n, 3) array of
+        fuel_efficiency, fuel_consumed, distance_traveled"""
+        features_scaled = self.scaler.transform(features)
+        scores = self.model.decision_function(features_scaled)
+        # IsolationForest.predict is exactly decision_function < 0
+        return scores, scores < 0
+    
     def detect_anomalies(self, data):
         """Detect anomalous fuel consumption patterns"""
         if not self.is_trained:
             return []
         
         try:
-            features = data[['fuel_efficiency', 'fuel_consumed', 'distance_traveled']]
-            features_scaled = self.scaler.transform(features)
-            
-            anomaly_scores = self.model.decision_function(features_scaled)
-            is_anomaly = self.model.predict(features_scaled) == -1
+            features = data[['fuel_efficiency', 'fuel_consumed', 'distance_traveled']].to_numpy()
+            anomaly_scores, is_anomaly = self.score(features)
             
-            anomalies = []
-            for idx, (vehicle_id, score, is_anom) in enumerate(
-                zip(data['vehicle_id'], anomaly_scores, is_anomaly)
-            ):
-                if is_anom:
-                    anomalies.append({
-                        'vehicle_id': vehicle_id,
-                        'anomaly_score': float(score),
-                        'severity': 'high' if score < -0.5 else 'medium'
-                    })
-            
-            return anomalies
+            rows = np.flatnonzero(is_anomaly)
+            vehicle_ids = np.asarray(data['vehicle_id'])[rows].tolist()
+            scores = anomaly_scores[rows].tolist()
+            return [
+                {
+                    'vehicle_id': vehicle_id,
+                    'anomaly_score': score,
+                    'severity': 'high' if score < -0.5 else 'medium'
+                }
+                for vehicle_id, score in zip(vehicle_ids, scores)
+            ]
             
         except Exception as e:
             print(f"Anomaly detection error: {e}")
             return []
 
-def initialize_models():
-    """Initialize and train all ML models"""
+class StreamingAnomalyDetector:
+    """Scores single fuel records in O(1) against per-vehicle running statistics
+    
+    For fuel_efficiency and fuel_consumed it keeps a Welford count/mean/M2 (the
+    long-run baseline) and an EWMA mean/variance (the recent baseline) in arrays
+    indexed by vehicle. A record is flagged only when it deviates from both, so a
+    one-off spike is flagged while a lasting change in a vehicle's behaviour is
+    absorbed by the EWMA within a few records. Vehicles with fewer than
+    MIN_HISTORY records are left to the batch IsolationForest.
+    """
+    FEATURES = ('fuel_efficiency', 'fuel_consumed')
+    MIN_HISTORY = 10
+    Z_THRESHOLD = 3.5
+    HIGH_SEVERITY_Z = 5.0
+    EWMA_ALPHA = 0.1
+    
+    def __init__(self, capacity=1024, max_flags=1000):
+        self.vehicle_index = {}
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.mean = np.zeros((capacity, len(self.FEATURES)))
+        self.m2 = np.zeros((capacity, len(self.FEATURES)))
+        self.ewma_mean = np.zeros((capacity, len(self.FEATURES)))
+        self.ewma_var = np.zeros((capacity, len(self.FEATURES)))
+        self.flags = deque(maxlen=max_flags)   # ring buffer of the most recent flags
+        self.scored = 0
+        self.flagged = 0
+        self._lock = threading.Lock()
+    
+    def _index(self, vehicle_id):
+        index = self.vehicle_index.get(vehicle_id)
+        if index is None:
+            index = self.vehicle_index[vehicle_id] = len(self.vehicle_index)
+            if index == len(self.count):
+                self._grow(2 * len(self.count))
+        return index
+    
+    def _grow(self, capacity):
+        for name in ('count', 'mean', 'm2', 'ewma_mean', 'ewma_var'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+    
+    def seed(self, vehicle_ids, values):
+        """Initialize statistics from history in one vectorized pass
+        
+        vehicle_ids: sequence of ids; values: (n, len(FEATURES)) array
+        """
+        with self._lock:
+            indexes = np.fromiter((self._index(v) for v in vehicle_ids), dtype=np.intp, count=len(vehicle_ids))
+            values = np.asarray(values, dtype=np.float64).reshape(len(indexes), len(self.FEATURES))
+            size = len(self.count)
+            
+            count = np.bincount(indexes, minlength=size)
+            seen = count > 0
+            for f in range(len(self.FEATURES)):
+                mean = np.bincount(indexes, values[:, f], minlength=size) / np.maximum(count, 1)
+                m2 = np.bincount(indexes, (values[:, f] - mean[indexes]) ** 2, minlength=size)
+                self.mean[seen, f] = mean[seen]
+                self.m2[seen, f] = m2[seen]
+                self.ewma_mean[seen, f] = mean[seen]
+                self.ewma_var[seen, f] = m2[seen] / count[seen]
+            self.count[seen] = count[seen]
+    
+    def _update(self, index, values):
+        n = self.count[index] + 1
+        self.count[index] = n
+        for f, x in enumerate(values):
+            delta = x - self.mean[index, f]
+            self.mean[index, f] += delta / n
+            self.m2[index, f] += delta * (x - self.mean[index, f])
+            
+            diff = x - self.ewma_mean[index, f]
+            increment = self.EWMA_ALPHA * diff
+            self.ewma_mean[index, f] += increment
+            self.ewma_var[index, f] = (1 - self.EWMA_ALPHA) * (self.ewma_var[index, f] + diff * increment)
+    
+    def score(self, vehicle_id, values):
+        """Deviation of one record from the vehicle's baselines (in standard deviations),
+        or None if the vehicle has too little history; updates the statistics unless flagged"""
+        with self._lock:
+            index = self._index(vehicle_id)
+            n = self.count[index]
+            self.scored += 1
+            if n < self.MIN_HISTORY:
+                self._update(index, values)
+                return None
+            
+            z = 0.0
+            for f, x in enumerate(values):
+                long_run = abs(x - self.mean[index, f]) / max((self.m2[index, f] / (n - 1)) ** 0.5, 1e-9)
+                recent = abs(x - self.ewma_mean[index, f]) / max(self.ewma_var[index, f] ** 0.5, 1e-9)
+                z = max(z, min(long_run, recent))
+            # Flagged records stay out of the baselines they were judged against
+            if z <= self.Z_THRESHOLD:
+                self._update(index, values)
+            return float(z)
+    
+    def record_flag(self, flag):
+        with self._lock:
+            self.flags.append(flag)
+            self.flagged += 1
+    
+    def recent(self, limit=50, vehicle_id=None):
+        """Most recent flags, newest first"""
+        with self._lock:
+            flags = list(self.flags)
+        flags.reverse()
+        if vehicle_id is not None:
+            flags = [flag for flag in flags if flag['vehicle_id'] == vehicle_id]
+        return flags[:limit]
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "vehicles": len(self.vehicle_index),
+                "scored": self.scored,
+                "flagged": self.flagged,
+                "buffered": len(self.flags),
+                "buffer_size": self.flags.maxlen
+            }
+
+# Timings (seconds) from the last initialize_models() call
+startup_report = {}
+
+def _load_or_train(name, model, db_path, fingerprint, artifact_dir, report):
+    """Load the model's artifact for this fingerprint, or train it and store a new one"""
+    import model_store
+    
+    start = time.perf_counter()
+    stored = model_store.load(name, fingerprint, artifact_dir) if fingerprint else None
+    if stored is not None:
+        report[name] = {'source': 'artifact', 'seconds': round(time.perf_counter() - start, 4)}
+        return stored
+    
+    print(f"Training {name}...")
+    trained = model.train(db_path)
+    train_seconds = time.perf_counter() - start
+    report[name] = {'source': 'trained' if trained else 'untrained', 'seconds': round(train_seconds, 4)}
+    if trained and fingerprint:
+        try:
+            model_store.save(name, model, fingerprint, artifact_dir, round(train_seconds, 4))
+        except Exception as e:
+            print(f"Could not save {name} artifact: {e}")
+    return model
+
+def initialize_models(db_path='fleet_data.db', artifact_dir=None, use_artifacts=True):
+    """Initialize all ML models, reusing stored artifacts when the training data is unchanged"""
+    import model_store
+    
+    report = {}
+    total_start = time.perf_counter()
+    
+    fingerprint = None
+    if use_artifacts:
+        start = time.perf_counter()
+        try:
+            fingerprint = model_store.training_fingerprint(db_path)
+        except sqlite3.Error as e:
+            print(f"Could not fingerprint training data: {e}")
+        report['fingerprint'] = {'seconds': round(time.perf_counter() - start, 4)}
+    
+    # Constructing the estimators is where scikit-learn gets imported
+    start = time.perf_counter()
     fuel_predictor = FuelEfficiencyPredictor()
-    maintenance_predictor = MaintenancePredictor()
     anomaly_detector = AnomalyDetector()
+    report['imports'] = {'seconds': round(time.perf_counter() - start, 4)}
     
-    print("Training fuel efficiency predictor...")
-    fuel_predictor.train()
+    fuel_predictor = _load_or_train('fuel_predictor', fuel_predictor, db_path, fingerprint, artifact_dir, report)
+    maintenance_predictor = MaintenancePredictor()
+    anomaly_detector = _load_or_train('anomaly_detector', anomaly_detector, db_path, fingerprint, artifact_dir, report)
     
-    print("Training anomaly detector...")
-    anomaly_detector.train()
+    report['total'] = {'seconds': round(time.perf_counter() - total_start, 4)}
+    startup_report.clear()
+    startup_report.update(report)
     
     print("Models initialized successfully!")
+    for name, entry in report.items():
+        source = f" ({entry['source']})" if 'source' in entry else ""
+        print(f"  {name:<18} {entry['seconds'] * 1000:9.1f} ms{source}")
     
     return {
         'fuel_predictor': fuel_predictor,
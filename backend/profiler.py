@@ -0,0 +1,143 @@
+"""
+Opt-in sampling profiler for single requests
+
+An admin request with `?profile=1` (and an X-Admin-Token header matching
+FLEET_ADMIN_TOKEN) runs normally, but its body is replaced by the stacks sampled
+while it ran, in the folded format read by flamegraph.pl, speedscope and
+inferno:
+
+    curl -H "X-Admin-Token: $FLEET_ADMIN_TOKEN" 'localhost:8000/api/fleet-summary?profile=1' > out.folded
+    flamegraph.pl out.folded > out.svg
+
+Samples come from the event loop thread and from db_executor threads while they
+run this request's jobs. The sampler needs the GIL, so under CPU-bound Python it
+samples about once per switch interval (5ms) rather than every `interval`.
+"""
+
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+import metrics
+
+
+class Profile:
+    """Stacks sampled from the threads working on one request"""
+
+    def __init__(self, interval=0.001, max_seconds=30.0):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples = Counter()
+        self.sample_count = 0
+        self._threads = {threading.get_ident(): 1}   # the event loop thread handling the request
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def add_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def remove_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        names = {}
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                if ident not in names:
+                    names[ident] = next((t.name for t in threading.enumerate() if t.ident == ident), str(ident))
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names[ident])
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+            del frames
+
+    def folded(self):
+        """One `root;...;leaf count` line per distinct stack, most frequent first"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class SamplingProfiler:
+    """Handles ?profile=1 requests for MetricsMiddleware"""
+
+    def __init__(self, admin_token=None, interval=0.001, max_seconds=30.0):
+        self.admin_token = admin_token
+        self.interval = interval
+        self.max_seconds = max_seconds
+
+    def requested(self, scope):
+        return scope.get("query_string") and parse_qs(scope["query_string"].decode()).get("profile") == ["1"]
+
+    def authorized(self, scope):
+        if not self.admin_token:
+            return False
+        token = dict(scope["headers"]).get(b"x-admin-token", b"").decode()
+        return hmac.compare_digest(token, self.admin_token)
+
+    async def handle(self, app, scope, receive, send):
+        if not self.authorized(scope):
+            await _send_text(send, 403, "Profiling requires an X-Admin-Token header matching FLEET_ADMIN_TOKEN\n")
+            return
+
+        timings = metrics.RequestTimings()
+        timings.profile = Profile(self.interval, self.max_seconds)
+        status = 500
+
+        async def discard(message):   # the profile replaces the endpoint's own body
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        token = metrics.activate(timings)
+        timings.profile.start()
+        start = time.perf_counter()
+        try:
+            await app(scope, receive, discard)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings.profile.stop()
+            metrics.deactivate(token)
+
+        phases = ", ".join(f"{phase}={seconds * 1000:.3f}ms" for phase, seconds in sorted(timings.phases.items()))
+        await _send_text(send, 200, timings.profile.folded(), {
+            "X-Profile-Status": str(status),
+            "X-Profile-Duration-Ms": f"{elapsed * 1000:.3f}",
+            "X-Profile-Samples": str(timings.profile.sample_count),
+            "X-Profile-Phases": phases
+        })
+
+
+async def _send_text(send, status, text, headers=None):
+    body = text.encode()
+    raw_headers = [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())]
+    raw_headers += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    await send({"type": "http.response.body", "body": body})
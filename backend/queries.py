@@ -0,0 +1,177 @@
+"""
+SQL issued by the API endpoints and model training
+
+Kept in one place so schema.check_query_plans() verifies exactly what runs in production.
+"""
+
+FLEET_TOTAL_VEHICLES = "SELECT COUNT(*) FROM vehicles"
+
+FLEET_ACTIVE_VEHICLES = "SELECT COUNT(*) FROM vehicles WHERE status = 'active'"
+
+FLEET_AVG_EFFICIENCY = """
+    SELECT SUM(efficiency_sum) / SUM(efficiency_count) FROM fuel_daily_rollup
+    WHERE vehicle_type = '*' AND date >= date('now', '-7 days')
+"""
+
+# Independent scalar aggregates behind /api/fleet-summary, each answered from an index;
+# maintenance_due comes from the vehicle registry's due index (see main.load_fleet_summary)
+FLEET_SUMMARY_PARTS = {
+    "total_vehicles": FLEET_TOTAL_VEHICLES,
+    "active_vehicles": FLEET_ACTIVE_VEHICLES,
+    "fuel_efficiency": FLEET_AVG_EFFICIENCY,
+}
+
+def fleet_summary(parts=tuple(FLEET_SUMMARY_PARTS)):
+    """One statement returning the named summary parts as columns, in order"""
+    return "SELECT " + ", ".join(f"({FLEET_SUMMARY_PARTS[name].strip()}) AS {name}" for name in parts)
+
+VEHICLE_COLUMNS = (
+    'vehicle_id', 'type', 'status', 'mileage', 'fuel_efficiency', 'last_maintenance', 'next_maintenance'
+)
+
+def vehicles_page(columns=VEHICLE_COLUMNS, vehicle_type=None, status=None):
+    """Keyset page of vehicles ordered by vehicle_id
+
+    Parameters, in order: last vehicle_id of the previous page ('' for the first),
+    then type and status if filtered, then the row limit.
+    """
+    unknown = set(columns) - set(VEHICLE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown vehicle columns: {sorted(unknown)}")
+    
+    where = ["vehicle_id > ?"]
+    if vehicle_type is not None:
+        where.append("type = ?")
+    if status is not None:
+        where.append("status = ?")
+    return f"""
+        SELECT {', '.join(columns)} FROM vehicles
+        WHERE {' AND '.join(where)}
+        ORDER BY vehicle_id
+        LIMIT ?
+    """
+
+# Parameter: window length in days
+FUEL_TRENDS = """
+    SELECT date, fuel_sum / fuel_count as avg_fuel, efficiency_sum / efficiency_count as avg_efficiency
+    FROM fuel_daily_rollup
+    WHERE vehicle_type = '*' AND date >= date('now', '-' || ? || ' days')
+    ORDER BY date
+"""
+
+# Where each rollup level of fuel_buckets() reads from, per grouping: (table, key column, period column)
+FUEL_BUCKET_SOURCES = {
+    ("fleet", "day"): ("fuel_daily_rollup", "vehicle_type", "date"),
+    ("fleet", "month"): ("fuel_monthly_rollup", "vehicle_type", "month"),
+    ("type", "day"): ("fuel_daily_rollup", "vehicle_type", "date"),
+    ("type", "month"): ("fuel_monthly_rollup", "vehicle_type", "month"),
+    ("vehicle", "day"): ("fuel_vehicle_daily_rollup", "vehicle_id", "date"),
+    ("vehicle", "month"): ("fuel_vehicle_monthly_rollup", "vehicle_id", "month"),
+}
+
+FUEL_BUCKET_EXPRESSIONS = {
+    "day": "{period}",
+    "week": "date({period}, 'weekday 0', '-6 days')",   # the Monday starting the week
+    "month": "substr({period}, 1, 7)",
+}
+
+def fuel_buckets(group_by, level, bucket):
+    """Per-bucket record count and fuel/efficiency reading counts and sums for each key, from one rollup level
+
+    Parameters: first and last period (dates for the day level, YYYY-MM for the
+    month level), then a JSON array of vehicle ids when grouped by vehicle.
+    """
+    table, key, period = FUEL_BUCKET_SOURCES[(group_by, level)]
+    where = {
+        "fleet": "vehicle_type = '*'",
+        "type": "vehicle_type <> '*'",
+        "vehicle": "vehicle_id IN (SELECT value FROM json_each(?3))",
+    }[group_by]
+    return f"""
+        SELECT {FUEL_BUCKET_EXPRESSIONS[bucket].format(period=period)} AS bucket, {key} AS key,
+               SUM(record_count) AS records, SUM(fuel_count) AS fuel_records, TOTAL(fuel_sum) AS fuel_sum,
+               SUM(efficiency_count) AS efficiency_records, TOTAL(efficiency_sum) AS efficiency_sum
+        FROM {table}
+        WHERE {where} AND {period} >= ?1 AND {period} <= ?2
+        GROUP BY bucket, key
+    """
+
+# Every vehicle for registry.VehicleRegistry, dates as days since 1970-01-01 (NULL -> registry.NO_DATE)
+VEHICLE_REGISTRY = """
+    SELECT vehicle_id, type, status, CAST(COALESCE(mileage, 0) AS INTEGER), fuel_efficiency,
+           COALESCE(CAST(julianday(last_maintenance) - 2440587.5 AS INTEGER), -2147483648),
+           COALESCE(CAST(julianday(next_maintenance) - 2440587.5 AS INTEGER), -2147483648)
+    FROM vehicles
+    ORDER BY vehicle_id
+"""
+
+FUEL_EFFICIENCY_TRAINING = """
+    SELECT v.*, AVG(f.fuel_efficiency) as avg_efficiency
+    FROM vehicles v
+    JOIN fuel_data f ON v.vehicle_id = f.vehicle_id
+    WHERE f.date >= date('now', '-30 days')
+    GROUP BY v.vehicle_id
+"""
+
+# Training reads these instead when part of the window is in the Parquet archive
+TRAINING_WINDOW_START = "SELECT date('now', '-30 days')"
+
+TRAINING_VEHICLES = "SELECT * FROM vehicles"
+
+ANOMALY_TRAINING = """
+    SELECT vehicle_id, fuel_efficiency, fuel_consumed, distance_traveled
+    FROM fuel_data
+    WHERE date >= date('now', '-30 days')
+    AND fuel_efficiency > 0
+"""
+
+# Parameters: last id already scored, batch size
+NEW_FUEL_RECORDS = """
+    SELECT id, vehicle_id, date, fuel_efficiency, fuel_consumed, distance_traveled
+    FROM fuel_data
+    WHERE id > ?
+    ORDER BY id
+    LIMIT ?
+"""
+
+ANOMALY_COLUMNS = (
+    'id', 'vehicle_id', 'date', 'fuel_efficiency', 'fuel_consumed', 'score', 'method', 'severity', 'detected_at'
+)
+
+# Parameters: limit
+RECENT_ANOMALIES = f"""
+    SELECT {', '.join(ANOMALY_COLUMNS)}
+    FROM anomaly_flags
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+# Parameters: vehicle_id, limit
+RECENT_VEHICLE_ANOMALIES = f"""
+    SELECT {', '.join(ANOMALY_COLUMNS)}
+    FROM anomaly_flags
+    WHERE vehicle_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+# name -> (sql, sample params); every entry must be served by an index
+INDEXED_QUERIES = {
+    "fleet-summary": (fleet_summary(), ()),
+    "vehicles.page": (vehicles_page(), ("TRK-001", 20)),
+    "vehicles.page_by_type": (vehicles_page(vehicle_type="Truck"), ("TRK-001", "Truck", 20)),
+    "vehicles.page_by_status": (vehicles_page(status="active"), ("TRK-001", "active", 20)),
+    "fuel-trends": (FUEL_TRENDS, (7,)),
+    "fuel-trends.fleet_by_day": (fuel_buckets("fleet", "day", "day"), ("2025-01-01", "2025-01-31")),
+    "fuel-trends.fleet_by_month": (fuel_buckets("fleet", "month", "month"), ("2024-01", "2024-12")),
+    "fuel-trends.types_by_week": (fuel_buckets("type", "day", "week"), ("2025-01-01", "2025-03-31")),
+    "fuel-trends.types_by_month": (fuel_buckets("type", "month", "month"), ("2024-01", "2024-12")),
+    "fuel-trends.vehicles_by_day": (fuel_buckets("vehicle", "day", "day"), ("2025-01-01", "2025-01-31", '["TRK-001"]')),
+    "fuel-trends.vehicles_by_month": (
+        fuel_buckets("vehicle", "month", "month"), ("2024-01", "2024-12", '["TRK-001"]')
+    ),
+    "train.fuel_efficiency": (FUEL_EFFICIENCY_TRAINING, ()),
+    "train.anomaly": (ANOMALY_TRAINING, ()),
+    "anomaly-stream.new_records": (NEW_FUEL_RECORDS, (0, 10000)),
+    "anomalies.vehicle": (RECENT_VEHICLE_ANOMALIES, ("TRK-001", 50)),
+}
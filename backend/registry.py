@@ -0,0 +1,258 @@
+"""
+Process-wide vehicle registry: per-vehicle attributes without a query
+
+The whole vehicles table is held as typed column arrays (array module, no numpy
+at import) indexed by a dict from interned vehicle_id to dense row index, so a
+lookup is one dict probe and a few array reads. Types and statuses are stored
+as small integer codes into per-snapshot name tables, dates as epoch days.
+
+A snapshot is immutable and replaced whole. Freshness is checked against the
+`vehicles` change counter in table_versions (see versions.py) at most every
+`check_seconds`, or on the next use after expire(); the table is only reloaded
+when the counter moved.
+
+Each snapshot also orders its vehicles by next maintenance date (DueIndex), so
+"due by day D" is a binary search and the K most overdue are the first K rows.
+On reload the previous order is patched for the vehicles whose date changed
+instead of being sorted again.
+"""
+
+import bisect
+import sys
+import threading
+import time
+from array import array
+from datetime import date, datetime, timedelta, timezone
+
+import metrics
+import queries
+import versions
+
+# Epoch-day value of a NULL date (see queries.VEHICLE_REGISTRY)
+NO_DATE = -2**31
+
+NAN = float('nan')
+
+_EPOCH = date(1970, 1, 1)
+
+
+def today():
+    """The current UTC date as an epoch day, matching SQLite's date('now')"""
+    return (datetime.now(timezone.utc).date() - _EPOCH).days
+
+
+def to_date(epoch_day):
+    """ISO date of an epoch day, or None for NO_DATE"""
+    if epoch_day == NO_DATE:
+        return None
+    return (_EPOCH + timedelta(days=epoch_day)).isoformat()
+
+
+class _Codes(dict):
+    """name -> code, assigning the next code to each new name"""
+
+    def __missing__(self, name):
+        code = self[name] = len(self)
+        return code
+
+
+# DueIndex keys pack (epoch day, row) into one int64 that sorts by day, then row
+_ROW_BITS = 32
+_ROW_MASK = (1 << _ROW_BITS) - 1
+
+
+def _due_key(epoch_day, row):
+    return (epoch_day << _ROW_BITS) | row
+
+
+class DueIndex:
+    """Rows with a next maintenance date, ordered by it; immutable once built
+
+    Rows due by a given day are a prefix of the order, found by binary search,
+    so counting them is O(log n) and listing them O(log n + k).
+    """
+
+    # Past this share of changed rows, re-sorting beats patching row by row
+    MAX_PATCHED_SHARE = 1 / 16
+
+    def __init__(self, keys):
+        self.keys = keys   # array('q') of _due_key, ascending
+
+    @classmethod
+    def build(cls, next_maintenance):
+        return cls(array('q', sorted(
+            _due_key(day, row) for row, day in enumerate(next_maintenance) if day != NO_DATE
+        )))
+
+    def updated(self, old, new):
+        """This index (of snapshot `old`) carried over to snapshot `new`
+
+        When both snapshots hold the same vehicles, only the rows whose next
+        maintenance date changed are moved; otherwise the index is rebuilt.
+        """
+        if old.ids != new.ids:
+            return DueIndex.build(new.next_maintenance)
+        changed = [
+            row for row, (before, after) in enumerate(zip(old.next_maintenance, new.next_maintenance))
+            if before != after
+        ]
+        if len(changed) > len(new) * self.MAX_PATCHED_SHARE:
+            return DueIndex.build(new.next_maintenance)
+
+        keys = array('q', self.keys)   # old snapshot readers keep the original
+        for row in changed:
+            before, after = old.next_maintenance[row], new.next_maintenance[row]
+            if before != NO_DATE:
+                del keys[bisect.bisect_left(keys, _due_key(before, row))]
+            if after != NO_DATE:
+                key = _due_key(after, row)
+                keys.insert(bisect.bisect_left(keys, key), key)
+        return DueIndex(keys)
+
+    def count(self, day):
+        """Number of rows due on or before epoch day `day`"""
+        return bisect.bisect_right(self.keys, _due_key(day, _ROW_MASK))
+
+    def rows(self, day, limit=None):
+        """Rows due on or before `day`, earliest (most overdue) first, at most `limit`"""
+        end = self.count(day)
+        if limit is not None:
+            end = min(end, limit)
+        return [key & _ROW_MASK for key in self.keys[:end]]
+
+
+class Snapshot:
+    """The vehicles table as of one change counter value, in vehicle_id order"""
+
+    def __init__(self, version, rows):
+        """`rows` are VEHICLE_REGISTRY tuples, dates already epoch days"""
+        ids, types, statuses, mileage, fuel_efficiency, last_days, next_days = zip(*rows) if rows else ((),) * 7
+        type_codes, status_codes = _Codes(), _Codes()
+        self.version = version
+        self.ids = list(map(sys.intern, ids))
+        self.index = dict(zip(self.ids, range(len(self.ids))))
+        self.type_code = array('H', map(type_codes.__getitem__, types))
+        self.status_code = array('H', map(status_codes.__getitem__, statuses))
+        self.mileage = array('q', mileage)
+        self.fuel_efficiency = array('d', (NAN if value is None else value for value in fuel_efficiency))
+        self.last_maintenance = array('i', last_days)     # epoch days, NO_DATE if unknown
+        self.next_maintenance = array('i', next_days)
+        # Code -> name; None stays a valid name for vehicles without a type or status
+        self.types = tuple(type_codes)
+        self.statuses = tuple(status_codes)
+        self._due = None
+
+    @property
+    def due(self):
+        """DueIndex over next_maintenance, built on first use"""
+        if self._due is None:
+            self._due = DueIndex.build(self.next_maintenance)
+        return self._due
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, vehicle_id):
+        """The vehicle as a row dict (dates as ISO strings), or None"""
+        i = self.index.get(vehicle_id)
+        if i is None:
+            return None
+        return {
+            "vehicle_id": self.ids[i],
+            "type": self.types[self.type_code[i]],
+            "status": self.statuses[self.status_code[i]],
+            "mileage": self.mileage[i],
+            "fuel_efficiency": self.fuel_efficiency[i],
+            "last_maintenance": to_date(self.last_maintenance[i]),
+            "next_maintenance": to_date(self.next_maintenance[i]),
+        }
+
+    def positions(self, vehicle_ids):
+        """Row indexes of the known ids among `vehicle_ids`, in vehicle_id order, without duplicates"""
+        index = self.index
+        return sorted({index[v] for v in vehicle_ids if v in index})
+
+    def nbytes(self):
+        """Approximate memory held: arrays, the index and the id strings"""
+        columns = (self.type_code, self.status_code, self.mileage, self.fuel_efficiency,
+                   self.last_maintenance, self.next_maintenance)
+        if self._due is not None:
+            columns += (self._due.keys,)
+        return (sum(sys.getsizeof(column) for column in columns) + sys.getsizeof(self.index)
+                + sys.getsizeof(self.ids) + sum(sys.getsizeof(v) for v in self.ids))
+
+
+class VehicleRegistry:
+    """Current Snapshot of the vehicles table, reloaded when its change counter moves
+
+    `pool` is the db.ConnectionPool to read from. Thread-safe: readers get an
+    immutable snapshot; one thread at a time checks the counter and reloads.
+    """
+
+    def __init__(self, pool, check_seconds=1.0):
+        self.pool = pool
+        self.check_seconds = check_seconds
+        self._snapshot = None
+        self._checked_at = float('-inf')
+        self._lock = threading.Lock()
+        self._checks = 0
+        self._reloads = 0
+        self._load_ms = None
+
+    def peek(self):
+        """The snapshot if it was checked recently enough to use without the database, else None"""
+        if time.monotonic() - self._checked_at < self.check_seconds:
+            return self._snapshot
+        return None
+
+    def current(self):
+        """The up-to-date snapshot; checks the change counter (and reloads) if due. Blocking"""
+        snapshot = self.peek()
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            snapshot = self.peek()   # another thread may have just checked
+            if snapshot is not None:
+                return snapshot
+            with self.pool.connection() as conn:
+                with metrics.span("db"):
+                    version = versions.read(conn, ('vehicles',))   # before the rows, see versions.py
+                self._checks += 1
+                if self._snapshot is None or self._snapshot.version != version:
+                    self._snapshot = self._load(conn, version)
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def _load(self, conn, version):
+        start = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.row_factory = None   # plain tuples transpose straight into columns
+        with metrics.span("db"):
+            rows = cursor.execute(queries.VEHICLE_REGISTRY).fetchall()
+        with metrics.span("transform"):
+            snapshot = Snapshot(version, rows)
+            previous = self._snapshot
+            if previous is not None and previous._due is not None:
+                snapshot._due = previous._due.updated(previous, snapshot)
+        self._reloads += 1
+        self._load_ms = round((time.perf_counter() - start) * 1000, 1)
+        return snapshot
+
+    def get(self, vehicle_id):
+        """One vehicle as a row dict, or None. Blocking if a counter check is due"""
+        return self.current().get(vehicle_id)
+
+    def expire(self):
+        """Check the change counter on next use, e.g. after a write this process knows of"""
+        self._checked_at = float('-inf')
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "vehicles": len(snapshot) if snapshot is not None else None,
+            "version": snapshot.version[0] if snapshot is not None else None,
+            "bytes": snapshot.nbytes() if snapshot is not None else None,
+            "checks": self._checks,
+            "reloads": self._reloads,
+            "last_load_ms": self._load_ms,
+        }
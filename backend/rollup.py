@@ -0,0 +1,264 @@
+"""
+Fuel rollups maintained alongside fuel_data
+
+fuel_daily_rollup keeps one row per (vehicle_type, date) with count, sum, min and
+max of the fuel columns; vehicle_type '*' is the whole fleet. fuel_monthly_rollup
+holds the same per (vehicle_type, month), and fuel_vehicle_daily_rollup and
+fuel_vehicle_monthly_rollup per (vehicle_id, date) and (vehicle_id, month), so
+long windows read one row per month (see trends.py). Triggers keep all four
+current on every insert/update/delete, so the endpoints never scan fuel_data,
+and the rows of months compacted into the Parquet archive outlive their
+fuel_data rows. Bulk loaders can drop the triggers, load, then call rebuild()
+for the affected range.
+
+Every rollup row holds, after its key and period: record_count, sum, min and max
+of fuel_consumed and of fuel_efficiency, distance_sum, then fuel_count,
+efficiency_count and distance_count. NULL readings (SQLite stores NaN as NULL)
+are left out of the sums, minima and maxima, and each *_count counts only its
+column's non-NULL readings, so averages are fuel_sum / fuel_count and
+efficiency_sum / efficiency_count.
+"""
+
+FLEET = '*'
+
+_AGGREGATES = '''
+    COUNT(*), TOTAL(f.fuel_consumed), MIN(f.fuel_consumed), MAX(f.fuel_consumed),
+    TOTAL(f.fuel_efficiency), MIN(f.fuel_efficiency), MAX(f.fuel_efficiency),
+    TOTAL(f.distance_traveled),
+    COUNT(f.fuel_consumed), COUNT(f.fuel_efficiency), COUNT(f.distance_traveled)
+'''
+
+_ROLLED_UP = '''
+    SUM(record_count), TOTAL(fuel_sum), MIN(fuel_min), MAX(fuel_max),
+    TOTAL(efficiency_sum), MIN(efficiency_min), MAX(efficiency_max), TOTAL(distance_sum),
+    SUM(fuel_count), SUM(efficiency_count), SUM(distance_count)
+'''
+
+
+def _upsert(table, key_column, key, period_column, period, when=None):
+    """Statement folding NEW into the (key, period) row of a rollup table, if `when` holds
+
+    A NULL reading adds nothing to its column's sum and count and leaves its
+    minimum and maximum alone, instead of turning them NULL.
+    """
+    values = f'''
+        {key}, {period}, 1,
+        COALESCE(NEW.fuel_consumed, 0.0), NEW.fuel_consumed, NEW.fuel_consumed,
+        COALESCE(NEW.fuel_efficiency, 0.0), NEW.fuel_efficiency, NEW.fuel_efficiency,
+        COALESCE(NEW.distance_traveled, 0.0),
+        NEW.fuel_consumed IS NOT NULL, NEW.fuel_efficiency IS NOT NULL, NEW.distance_traveled IS NOT NULL
+    '''
+    source = f"SELECT {values} WHERE {when}" if when else f"VALUES ({values})"
+    return f'''
+    INSERT INTO {table} {source}
+    ON CONFLICT ({key_column}, {period_column}) DO UPDATE SET
+        record_count = record_count + 1,
+        fuel_sum = fuel_sum + excluded.fuel_sum,
+        fuel_min = COALESCE(MIN(fuel_min, excluded.fuel_min), fuel_min, excluded.fuel_min),
+        fuel_max = COALESCE(MAX(fuel_max, excluded.fuel_max), fuel_max, excluded.fuel_max),
+        efficiency_sum = efficiency_sum + excluded.efficiency_sum,
+        efficiency_min = COALESCE(MIN(efficiency_min, excluded.efficiency_min), efficiency_min, excluded.efficiency_min),
+        efficiency_max = COALESCE(MAX(efficiency_max, excluded.efficiency_max), efficiency_max, excluded.efficiency_max),
+        distance_sum = distance_sum + excluded.distance_sum,
+        fuel_count = fuel_count + excluded.fuel_count,
+        efficiency_count = efficiency_count + excluded.efficiency_count,
+        distance_count = distance_count + excluded.distance_count;
+'''
+
+_VEHICLE_TYPE = "COALESCE((SELECT type FROM vehicles WHERE vehicle_id = NEW.vehicle_id), 'Unknown')"
+
+
+def _recompute_day(day):
+    """Statements rebuilding every rollup row for one day (used where min/max can't be decremented)"""
+    return f'''
+        DELETE FROM fuel_daily_rollup WHERE date = {day};
+        INSERT INTO fuel_daily_rollup
+            SELECT '{FLEET}', f.date, {_AGGREGATES}
+            FROM fuel_data f WHERE f.date = {day} GROUP BY f.date;
+        INSERT INTO fuel_daily_rollup
+            SELECT COALESCE(v.type, 'Unknown'), f.date, {_AGGREGATES}
+            FROM fuel_data f LEFT JOIN vehicles v ON v.vehicle_id = f.vehicle_id
+            WHERE f.date = {day} GROUP BY COALESCE(v.type, 'Unknown'), f.date;
+    '''
+
+
+def _recompute_month(vehicle_id, day):
+    """Statements rebuilding the monthly rows for the month of `day` (once its days are current)"""
+    month = f"substr({day}, 1, 7)"
+    start, end = f"date({day}, 'start of month')", f"date({day}, 'start of month', '+1 month')"
+    return f'''
+        DELETE FROM fuel_monthly_rollup WHERE month = {month};
+        INSERT INTO fuel_monthly_rollup
+            SELECT vehicle_type, {month}, {_ROLLED_UP}
+            FROM fuel_daily_rollup WHERE date >= {start} AND date < {end} GROUP BY vehicle_type;
+        DELETE FROM fuel_vehicle_monthly_rollup WHERE vehicle_id = {vehicle_id} AND month = {month};
+        INSERT INTO fuel_vehicle_monthly_rollup
+            SELECT f.vehicle_id, {month}, {_AGGREGATES}
+            FROM fuel_data f WHERE f.vehicle_id = {vehicle_id} AND f.date >= {start} AND f.date < {end}
+            GROUP BY f.vehicle_id;
+    '''
+
+
+_MONTH = "substr(NEW.date, 1, 7)"
+
+TRIGGERS = {
+    'trg_fuel_rollup_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_insert AFTER INSERT ON fuel_data
+        BEGIN
+            {_upsert('fuel_daily_rollup', 'vehicle_type', repr(FLEET), 'date', 'NEW.date')}
+            {_upsert('fuel_daily_rollup', 'vehicle_type', _VEHICLE_TYPE, 'date', 'NEW.date')}
+            {_upsert('fuel_monthly_rollup', 'vehicle_type', repr(FLEET), 'month', _MONTH)}
+            {_upsert('fuel_monthly_rollup', 'vehicle_type', _VEHICLE_TYPE, 'month', _MONTH)}
+            {_upsert('fuel_vehicle_monthly_rollup', 'vehicle_id', 'NEW.vehicle_id', 'month', _MONTH, 'NEW.vehicle_id IS NOT NULL')}
+        END
+    ''',
+    'trg_fuel_rollup_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_delete AFTER DELETE ON fuel_data
+        BEGIN
+            {_recompute_day('OLD.date')}
+            {_recompute_month('OLD.vehicle_id', 'OLD.date')}
+        END
+    ''',
+    'trg_fuel_rollup_update': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_update AFTER UPDATE ON fuel_data
+        BEGIN
+            {_recompute_day('OLD.date')}
+            {_recompute_day('NEW.date')}
+            {_recompute_month('OLD.vehicle_id', 'OLD.date')}
+            {_recompute_month('NEW.vehicle_id', 'NEW.date')}
+        END
+    ''',
+}
+
+
+def _recompute_vehicle_day(vehicle_id, day):
+    """Statements rebuilding one vehicle's fuel_vehicle_daily_rollup row for one day"""
+    return f'''
+        DELETE FROM fuel_vehicle_daily_rollup WHERE vehicle_id = {vehicle_id} AND date = {day};
+        INSERT INTO fuel_vehicle_daily_rollup
+            SELECT f.vehicle_id, f.date, {_AGGREGATES}
+            FROM fuel_data f WHERE f.vehicle_id = {vehicle_id} AND f.date = {day}
+            GROUP BY f.vehicle_id, f.date;
+    '''
+
+
+# fuel_vehicle_daily_rollup came after TRIGGERS was applied by schema migration 8,
+# so it has triggers of its own
+VEHICLE_DAILY_TRIGGERS = {
+    'trg_fuel_vehicle_rollup_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_fuel_vehicle_rollup_insert AFTER INSERT ON fuel_data
+        BEGIN
+            {_upsert('fuel_vehicle_daily_rollup', 'vehicle_id', 'NEW.vehicle_id', 'date', 'NEW.date', 'NEW.vehicle_id IS NOT NULL')}
+        END
+    ''',
+    'trg_fuel_vehicle_rollup_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_fuel_vehicle_rollup_delete AFTER DELETE ON fuel_data
+        BEGIN
+            {_recompute_vehicle_day('OLD.vehicle_id', 'OLD.date')}
+        END
+    ''',
+    'trg_fuel_vehicle_rollup_update': f'''
+        CREATE TRIGGER IF NOT EXISTS trg_fuel_vehicle_rollup_update AFTER UPDATE ON fuel_data
+        BEGIN
+            {_recompute_vehicle_day('OLD.vehicle_id', 'OLD.date')}
+            {_recompute_vehicle_day('NEW.vehicle_id', 'NEW.date')}
+        END
+    ''',
+}
+
+
+def create_triggers(conn):
+    """Install the rollup maintenance triggers"""
+    for sql in (*TRIGGERS.values(), *VEHICLE_DAILY_TRIGGERS.values()):
+        conn.execute(sql)
+
+
+def drop_triggers(conn):
+    """Remove the rollup triggers (bulk loads); call rebuild() afterwards"""
+    for name in (*TRIGGERS, *VEHICLE_DAILY_TRIGGERS):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+# First day still in fuel_data: the day after the last month compacted into the
+# Parquet archive (see archive.py), whose rollup rows are the only aggregate left
+LIVE_SINCE = "(SELECT COALESCE(date(MAX(month) || '-01', '+1 month'), '0000-01-01') FROM fuel_archive_months)"
+
+
+def rebuild_statements(since=LIVE_SINCE):
+    """Statements recomputing the daily rollup from fuel_data for date >= `since`, an SQL expression"""
+    return [
+        f"DELETE FROM fuel_daily_rollup WHERE date >= {since}",
+        f'''
+        INSERT INTO fuel_daily_rollup
+            SELECT '{FLEET}', f.date, {_AGGREGATES}
+            FROM fuel_data f WHERE f.date >= {since} GROUP BY f.date
+        ''',
+        f'''
+        INSERT INTO fuel_daily_rollup
+            SELECT COALESCE(v.type, 'Unknown'), f.date, {_AGGREGATES}
+            FROM fuel_data f LEFT JOIN vehicles v ON v.vehicle_id = f.vehicle_id
+            WHERE f.date >= {since} GROUP BY COALESCE(v.type, 'Unknown'), f.date
+        ''',
+    ]
+
+
+def monthly_rebuild_statements(since=LIVE_SINCE):
+    """Statements recomputing the monthly rollups for every month from the one holding `since`
+
+    Type months are summed from fuel_daily_rollup, so run these after the daily
+    statements; vehicle months are read from fuel_data.
+    """
+    start = f"date({since}, 'start of month')"
+    return [
+        f"DELETE FROM fuel_monthly_rollup WHERE month >= substr({start}, 1, 7)",
+        f'''
+        INSERT INTO fuel_monthly_rollup
+            SELECT vehicle_type, substr(date, 1, 7), {_ROLLED_UP}
+            FROM fuel_daily_rollup WHERE date >= {start}
+            GROUP BY vehicle_type, substr(date, 1, 7)
+        ''',
+        f"DELETE FROM fuel_vehicle_monthly_rollup WHERE month >= substr({start}, 1, 7)",
+        f'''
+        INSERT INTO fuel_vehicle_monthly_rollup
+            SELECT f.vehicle_id, substr(f.date, 1, 7), {_AGGREGATES}
+            FROM fuel_data f WHERE f.vehicle_id IS NOT NULL AND f.date >= {start}
+            GROUP BY f.vehicle_id, substr(f.date, 1, 7)
+        ''',
+    ]
+
+
+def vehicle_daily_rebuild_statements(since=LIVE_SINCE):
+    """Statements recomputing fuel_vehicle_daily_rollup from fuel_data for date >= `since`, an SQL expression"""
+    return [
+        f"DELETE FROM fuel_vehicle_daily_rollup WHERE date >= {since}",
+        f'''
+        INSERT INTO fuel_vehicle_daily_rollup
+            SELECT f.vehicle_id, f.date, {_AGGREGATES}
+            FROM fuel_data f WHERE f.vehicle_id IS NOT NULL AND f.date >= {since}
+            GROUP BY f.vehicle_id, f.date
+        ''',
+    ]
+
+
+def _since(since):
+    """SQL bound for a rebuild from `since` (None: everything), never reaching into archived months"""
+    return f"MAX(:since, {LIVE_SINCE})" if since else LIVE_SINCE
+
+
+def rebuild(conn, since=None):
+    """Recompute the rollups from fuel_data inside the caller's transaction
+
+    Days of months compacted into the Parquet archive are skipped: their rows are
+    no longer in fuel_data, so their rollup rows are the only aggregate left.
+    """
+    params = {"since": since} if since else {}
+    for sql in (rebuild_statements(_since(since)) + vehicle_daily_rebuild_statements(_since(since))
+                + monthly_rebuild_statements(_since(since))):
+        conn.execute(sql, params)
+
+
+def rebuild_after_daily(conn, since=None):
+    """Recompute all but fuel_daily_rollup, for loaders that wrote it themselves"""
+    params = {"since": since} if since else {}
+    for sql in vehicle_daily_rebuild_statements(_since(since)) + monthly_rebuild_statements(_since(since)):
+        conn.execute(sql, params)
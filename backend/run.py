@@ -2,8 +2,12 @@
 """
 Fleet Analytics API Server
 Run this script to start the backend server
+
+    python run.py                 # development: one process, auto-reload
+    python run.py --workers 4     # production: preforked workers sharing preloaded models (server.py)
 """
 
+import argparse
 import uvicorn
 import sys
 import os
@@ -12,22 +16,34 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start the Fleet Analytics API server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, help="run N preforked worker processes (0: one per CPU) instead of the reloading dev server")
+    parser.add_argument('--drain-seconds', type=float, default=5.0, help="on SIGTERM, keep serving this long with /readyz failing")
+    parser.add_argument('--graceful-timeout', type=float, default=30.0, help="then wait this long for in-flight requests")
+    args = parser.parse_args()
+    
     print("🚀 Starting Fleet Analytics API Server...")
     print("📊 Dashboard will be available at: http://localhost:3000")
-    print("🔗 API Documentation: http://localhost:8000/docs")
-    print("⚡ API Endpoints: http://localhost:8000")
+    print(f"🔗 API Documentation: http://localhost:{args.port}/docs")
+    print(f"⚡ API Endpoints: http://localhost:{args.port}")
     print("-" * 50)
     
     try:
-        uvicorn.run(
-            "main:app",
-            host="0.0.0.0",
-            port=8000,
-            reload=True,
-            log_level="info"
-        )
+        if args.workers is not None:
+            import server
+            server.serve(args.host, args.port, args.workers or None, args.drain_seconds, args.graceful_timeout)
+        else:
+            uvicorn.run(
+                "main:app",
+                host=args.host,
+                port=args.port,
+                reload=True,
+                log_level="info"
+            )
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
     except Exception as e:
         print(f"❌ Error starting server: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
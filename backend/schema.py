@@ -0,0 +1,417 @@
+"""
+Versioned schema migrations for the fleet database
+
+The applied version is tracked in PRAGMA user_version. Run directly to migrate a
+database and verify the endpoint query plans:
+
+    python schema.py [fleet_data.db] [--check]
+"""
+
+import argparse
+import sqlite3
+import sys
+
+import anomaly_stream
+import archive
+import rollup
+import versions
+from queries import INDEXED_QUERIES
+
+# Secondary indexes on fuel_data; bulk loaders drop and recreate these around large backfills
+FUEL_DATA_INDEXES = {
+    # Date-range trends/summary read only these columns, so the index covers them
+    'idx_fuel_data_date_covering':
+        "CREATE INDEX IF NOT EXISTS idx_fuel_data_date_covering "
+        "ON fuel_data (date, vehicle_id, fuel_efficiency, fuel_consumed)",
+    # Per-vehicle joins and history lookups
+    'idx_fuel_data_vehicle_date':
+        "CREATE INDEX IF NOT EXISTS idx_fuel_data_vehicle_date ON fuel_data (vehicle_id, date)",
+}
+
+# The rollup SQL that migrations 3 and 7 applied, copied here because rollup.py has
+# moved on since (see migration 8). Migrations may use another module's definitions
+# only while those stay unchanged; copy them here before editing them.
+_ROLLUP_COLUMNS = '''
+        record_count INTEGER NOT NULL,
+        fuel_sum REAL,
+        fuel_min REAL,
+        fuel_max REAL,
+        efficiency_sum REAL,
+        efficiency_min REAL,
+        efficiency_max REAL,
+        distance_sum REAL,
+'''
+
+_ROLLUP_AGGREGATES = '''
+    COUNT(*), SUM(f.fuel_consumed), MIN(f.fuel_consumed), MAX(f.fuel_consumed),
+    SUM(f.fuel_efficiency), MIN(f.fuel_efficiency), MAX(f.fuel_efficiency),
+    SUM(f.distance_traveled)
+'''
+
+_ROLLUP_ROLLED_UP = '''
+    SUM(record_count), SUM(fuel_sum), MIN(fuel_min), MAX(fuel_max),
+    SUM(efficiency_sum), MIN(efficiency_min), MAX(efficiency_max), SUM(distance_sum)
+'''
+
+_ROLLUP_VEHICLE_TYPE = "COALESCE((SELECT type FROM vehicles WHERE vehicle_id = NEW.vehicle_id), 'Unknown')"
+
+_ROLLUP_MONTH = "substr(NEW.date, 1, 7)"
+
+
+def _rollup_upsert(table, key_column, key, period_column, period, when=None):
+    values = f'''
+        {key}, {period}, 1,
+        NEW.fuel_consumed, NEW.fuel_consumed, NEW.fuel_consumed,
+        NEW.fuel_efficiency, NEW.fuel_efficiency, NEW.fuel_efficiency,
+        NEW.distance_traveled
+    '''
+    source = f"SELECT {values} WHERE {when}" if when else f"VALUES ({values})"
+    return f'''
+    INSERT INTO {table} {source}
+    ON CONFLICT ({key_column}, {period_column}) DO UPDATE SET
+        record_count = record_count + 1,
+        fuel_sum = fuel_sum + excluded.fuel_sum,
+        fuel_min = MIN(fuel_min, excluded.fuel_min),
+        fuel_max = MAX(fuel_max, excluded.fuel_max),
+        efficiency_sum = efficiency_sum + excluded.efficiency_sum,
+        efficiency_min = MIN(efficiency_min, excluded.efficiency_min),
+        efficiency_max = MAX(efficiency_max, excluded.efficiency_max),
+        distance_sum = distance_sum + excluded.distance_sum;
+'''
+
+
+def _rollup_recompute_day(day):
+    return f'''
+        DELETE FROM fuel_daily_rollup WHERE date = {day};
+        INSERT INTO fuel_daily_rollup
+            SELECT '*', f.date, {_ROLLUP_AGGREGATES}
+            FROM fuel_data f WHERE f.date = {day} GROUP BY f.date;
+        INSERT INTO fuel_daily_rollup
+            SELECT COALESCE(v.type, 'Unknown'), f.date, {_ROLLUP_AGGREGATES}
+            FROM fuel_data f LEFT JOIN vehicles v ON v.vehicle_id = f.vehicle_id
+            WHERE f.date = {day} GROUP BY COALESCE(v.type, 'Unknown'), f.date;
+    '''
+
+
+def _rollup_recompute_month(vehicle_id, day):
+    month = f"substr({day}, 1, 7)"
+    start, end = f"date({day}, 'start of month')", f"date({day}, 'start of month', '+1 month')"
+    return f'''
+        DELETE FROM fuel_monthly_rollup WHERE month = {month};
+        INSERT INTO fuel_monthly_rollup
+            SELECT vehicle_type, {month}, {_ROLLUP_ROLLED_UP}
+            FROM fuel_daily_rollup WHERE date >= {start} AND date < {end} GROUP BY vehicle_type;
+        DELETE FROM fuel_vehicle_monthly_rollup WHERE vehicle_id = {vehicle_id} AND month = {month};
+        INSERT INTO fuel_vehicle_monthly_rollup
+            SELECT f.vehicle_id, {month}, {_ROLLUP_AGGREGATES}
+            FROM fuel_data f WHERE f.vehicle_id = {vehicle_id} AND f.date >= {start} AND f.date < {end}
+            GROUP BY f.vehicle_id;
+    '''
+
+
+_ROLLUP_V3 = [
+    f'''
+    CREATE TABLE IF NOT EXISTS fuel_daily_rollup (
+        vehicle_type TEXT NOT NULL,
+        date DATE NOT NULL,{_ROLLUP_COLUMNS}
+        PRIMARY KEY (vehicle_type, date)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_fuel_daily_rollup_date ON fuel_daily_rollup (date)",
+    "DELETE FROM fuel_daily_rollup",
+    f"INSERT INTO fuel_daily_rollup SELECT '*', f.date, {_ROLLUP_AGGREGATES} FROM fuel_data f GROUP BY f.date",
+    f'''
+    INSERT INTO fuel_daily_rollup
+        SELECT COALESCE(v.type, 'Unknown'), f.date, {_ROLLUP_AGGREGATES}
+        FROM fuel_data f LEFT JOIN vehicles v ON v.vehicle_id = f.vehicle_id
+        GROUP BY COALESCE(v.type, 'Unknown'), f.date
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_insert AFTER INSERT ON fuel_data
+    BEGIN
+        {_rollup_upsert('fuel_daily_rollup', 'vehicle_type', "'*'", 'date', 'NEW.date')}
+        {_rollup_upsert('fuel_daily_rollup', 'vehicle_type', _ROLLUP_VEHICLE_TYPE, 'date', 'NEW.date')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_delete AFTER DELETE ON fuel_data
+    BEGIN
+        {_rollup_recompute_day('OLD.date')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_update AFTER UPDATE ON fuel_data
+    BEGIN
+        {_rollup_recompute_day('OLD.date')}
+        {_rollup_recompute_day('NEW.date')}
+    END
+    ''',
+]
+
+_ROLLUP_TRIGGERS = ('trg_fuel_rollup_insert', 'trg_fuel_rollup_delete', 'trg_fuel_rollup_update')
+
+_ROLLUP_V7 = [
+    f'''
+    CREATE TABLE IF NOT EXISTS fuel_monthly_rollup (
+        vehicle_type TEXT NOT NULL,
+        month TEXT NOT NULL,{_ROLLUP_COLUMNS}
+        PRIMARY KEY (vehicle_type, month)
+    ) WITHOUT ROWID
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_fuel_monthly_rollup_month ON fuel_monthly_rollup (month)",
+    f'''
+    CREATE TABLE IF NOT EXISTS fuel_vehicle_monthly_rollup (
+        vehicle_id TEXT NOT NULL,
+        month TEXT NOT NULL,{_ROLLUP_COLUMNS}
+        PRIMARY KEY (vehicle_id, month)
+    ) WITHOUT ROWID
+    ''',
+    "DELETE FROM fuel_monthly_rollup",
+    f'''
+    INSERT INTO fuel_monthly_rollup
+        SELECT vehicle_type, substr(date, 1, 7), {_ROLLUP_ROLLED_UP}
+        FROM fuel_daily_rollup GROUP BY vehicle_type, substr(date, 1, 7)
+    ''',
+    "DELETE FROM fuel_vehicle_monthly_rollup",
+    f'''
+    INSERT INTO fuel_vehicle_monthly_rollup
+        SELECT f.vehicle_id, substr(f.date, 1, 7), {_ROLLUP_AGGREGATES}
+        FROM fuel_data f WHERE f.vehicle_id IS NOT NULL
+        GROUP BY f.vehicle_id, substr(f.date, 1, 7)
+    ''',
+    # The rollup triggers now maintain the monthly tables too
+    *(f"DROP TRIGGER IF EXISTS {name}" for name in _ROLLUP_TRIGGERS),
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_insert AFTER INSERT ON fuel_data
+    BEGIN
+        {_rollup_upsert('fuel_daily_rollup', 'vehicle_type', "'*'", 'date', 'NEW.date')}
+        {_rollup_upsert('fuel_daily_rollup', 'vehicle_type', _ROLLUP_VEHICLE_TYPE, 'date', 'NEW.date')}
+        {_rollup_upsert('fuel_monthly_rollup', 'vehicle_type', "'*'", 'month', _ROLLUP_MONTH)}
+        {_rollup_upsert('fuel_monthly_rollup', 'vehicle_type', _ROLLUP_VEHICLE_TYPE, 'month', _ROLLUP_MONTH)}
+        {_rollup_upsert('fuel_vehicle_monthly_rollup', 'vehicle_id', 'NEW.vehicle_id', 'month', _ROLLUP_MONTH,
+                        'NEW.vehicle_id IS NOT NULL')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_delete AFTER DELETE ON fuel_data
+    BEGIN
+        {_rollup_recompute_day('OLD.date')}
+        {_rollup_recompute_month('OLD.vehicle_id', 'OLD.date')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_fuel_rollup_update AFTER UPDATE ON fuel_data
+    BEGIN
+        {_rollup_recompute_day('OLD.date')}
+        {_rollup_recompute_day('NEW.date')}
+        {_rollup_recompute_month('OLD.vehicle_id', 'OLD.date')}
+        {_rollup_recompute_month('NEW.vehicle_id', 'NEW.date')}
+    END
+    ''',
+]
+
+_ROLLUP_TABLES = ('fuel_daily_rollup', 'fuel_monthly_rollup', 'fuel_vehicle_monthly_rollup')
+
+
+# (version, description, statements) - append only, never edit an applied migration
+MIGRATIONS = [
+    (1, "base tables", [
+        '''
+        CREATE TABLE IF NOT EXISTS vehicles (
+            vehicle_id TEXT PRIMARY KEY,
+            type TEXT,
+            status TEXT,
+            mileage INTEGER,
+            fuel_efficiency REAL,
+            last_maintenance DATE,
+            next_maintenance DATE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS fuel_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_id TEXT,
+            date DATE,
+            fuel_consumed REAL,
+            distance_traveled REAL,
+            fuel_efficiency REAL,
+            FOREIGN KEY (vehicle_id) REFERENCES vehicles (vehicle_id)
+        )
+        ''',
+    ]),
+    (2, "covering indexes for endpoint and training queries", [
+        *FUEL_DATA_INDEXES.values(),
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_next_maintenance ON vehicles (next_maintenance)",
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_status ON vehicles (status)",
+        "ANALYZE",
+    ]),
+    (3, "daily fuel rollup maintained by triggers", _ROLLUP_V3),
+    (4, "keyset pagination indexes for /api/vehicles", [
+        # Filtered pages seek on (filter, vehicle_id); the old status index only carried rowid
+        "DROP INDEX IF EXISTS idx_vehicles_status",
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_status_id ON vehicles (status, vehicle_id)",
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_type_id ON vehicles (type, vehicle_id)",
+    ]),
+    (5, "registry of fuel_data months compacted into Parquet", [
+        archive.CREATE_TABLE,
+    ]),
+    (6, "table change counters for HTTP validators", [
+        versions.CREATE_TABLE,
+        versions.SEED,
+        *versions.TRIGGERS.values(),
+    ]),
+    (7, "monthly fuel rollups for bucketed trends", _ROLLUP_V7),
+    (8, "NULL-safe rollups with per-column reading counts", [
+        *(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+          for table in _ROLLUP_TABLES for column in ('fuel_count', 'efficiency_count', 'distance_count')),
+        # Archived days can't be recomputed: a NULL reading had made their sum NULL,
+        # so such a column keeps no readings, otherwise every record had one
+        *(f"""
+          UPDATE {table} SET
+              fuel_count = CASE WHEN fuel_sum IS NULL THEN 0 ELSE record_count END,
+              efficiency_count = CASE WHEN efficiency_sum IS NULL THEN 0 ELSE record_count END,
+              distance_count = CASE WHEN distance_sum IS NULL THEN 0 ELSE record_count END,
+              fuel_sum = COALESCE(fuel_sum, 0.0),
+              efficiency_sum = COALESCE(efficiency_sum, 0.0),
+              distance_sum = COALESCE(distance_sum, 0.0)
+          """ for table in _ROLLUP_TABLES),
+        *(f"DROP TRIGGER IF EXISTS {name}" for name in _ROLLUP_TRIGGERS),
+        *rollup.TRIGGERS.values(),
+        *rollup.rebuild_statements(),
+        *rollup.monthly_rebuild_statements(),
+    ]),
+    (9, "per-vehicle daily fuel rollup, so vehicle day and week buckets outlive compaction", [
+        '''
+        CREATE TABLE IF NOT EXISTS fuel_vehicle_daily_rollup (
+            vehicle_id TEXT NOT NULL,
+            date DATE NOT NULL,
+            record_count INTEGER NOT NULL,
+            fuel_sum REAL,
+            fuel_min REAL,
+            fuel_max REAL,
+            efficiency_sum REAL,
+            efficiency_min REAL,
+            efficiency_max REAL,
+            distance_sum REAL,
+            fuel_count INTEGER NOT NULL DEFAULT 0,
+            efficiency_count INTEGER NOT NULL DEFAULT 0,
+            distance_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (vehicle_id, date)
+        ) WITHOUT ROWID
+        ''',
+        # Days already archived are filled from Parquet by `archive.py backfill`
+        *rollup.vehicle_daily_rebuild_statements(),
+        *rollup.VEHICLE_DAILY_TRIGGERS.values(),
+    ]),
+    (10, "anomaly flags shared by all API workers", anomaly_stream.CREATE_TABLES),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=SCHEMA_VERSION):
+    """Apply pending migrations up to target; returns the list of applied versions"""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version > target or version <= get_version(conn):
+            continue
+
+        # IMMEDIATE takes the write lock up front so concurrent workers migrate once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    if target >= SCHEMA_VERSION:
+        restore_bulk_load_drops(conn)
+    return applied
+
+
+def _missing_bulk_load_drops(conn):
+    """(fuel_data index DDL, rollup triggers missing?, counter triggers missing?)"""
+    present = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")}
+    return (
+        [ddl for name, ddl in FUEL_DATA_INDEXES.items() if name not in present],
+        not present.issuperset({*rollup.TRIGGERS, *rollup.VEHICLE_DAILY_TRIGGERS}),
+        not present.issuperset(versions.TRIGGERS),
+    )
+
+
+def restore_bulk_load_drops(conn):
+    """Reinstall fuel_data indexes and triggers that a bulk load dropped and never put back
+
+    ingest.py suspends them for a whole run and restores them at the end, so a
+    run killed in between (SIGKILL, OOM, power loss) leaves them missing. The
+    rollups and change counters then also missed the rows written meanwhile, so
+    they are rebuilt and bumped. Returns True if anything was restored.
+    """
+    if not any(_missing_bulk_load_drops(conn)):
+        return False
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        indexes, rollup_triggers, version_triggers = _missing_bulk_load_drops(conn)   # under the lock
+        for ddl in indexes:
+            conn.execute(ddl)
+        if rollup_triggers:
+            rollup.drop_triggers(conn)
+            rollup.rebuild(conn)
+            rollup.create_triggers(conn)
+        if version_triggers:
+            versions.create_triggers(conn, *versions.TRACKED_TABLES)
+            versions.bump(conn, *versions.TRACKED_TABLES)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return bool(indexes or rollup_triggers or version_triggers)
+
+
+def check_query_plans(conn, queries=None):
+    """EXPLAIN QUERY PLAN each query; returns {name: {"uses_index": bool, "plan": [...]}}"""
+    results = {}
+    for name, (sql, params) in (queries or INDEXED_QUERIES).items():
+        plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        # A bare "SCAN <table>" is a full table scan; SEARCH or SCAN ... USING INDEX is fine
+        full_scans = [
+            step for step in plan
+            if step.startswith("SCAN ") and "INDEX" not in step and "CONSTANT ROW" not in step
+        ]
+        results[name] = {"uses_index": not full_scans, "plan": plan}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate the fleet database schema")
+    parser.add_argument('db_path', nargs='?', default='fleet_data.db')
+    parser.add_argument('--check', action='store_true', help="verify endpoint queries use indexes")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    applied = migrate(conn)
+    print(f"Schema at version {get_version(conn)} (applied: {applied or 'none'})")
+
+    failed = False
+    if args.check:
+        for name, result in check_query_plans(conn).items():
+            status = "ok " if result["uses_index"] else "FULL SCAN"
+            print(f"  [{status}] {name}: {' | '.join(result['plan'])}")
+            failed = failed or not result["uses_index"]
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Production server: gunicorn master with preforked uvicorn workers
+
+The master imports the app and runs main.preload() (schema, trained models,
+maintenance interval tables) once, freezes the heap out of the garbage
+collector's reach, then forks the workers. Every worker reads the same model
+pages copy-on-write instead of holding its own copy.
+
+On SIGTERM each worker drains: /readyz starts answering 503 and live streams
+end, requests keep being served for `drain_seconds` while load balancers notice,
+then uvicorn stops accepting connections and waits up to `graceful_timeout` for
+in-flight requests.
+
+    python run.py --workers 4 [--port 8000] [--drain-seconds 5]
+
+gunicorn is optional: without it only the single-process development server runs.
+"""
+
+import functools
+import gc
+import math
+import os
+import time
+
+
+def _gunicorn():
+    try:
+        from gunicorn.app.base import BaseApplication
+        from uvicorn.workers import UvicornWorker
+    except ImportError:
+        raise ImportError("Multi-worker mode requires gunicorn (pip install gunicorn)")
+    return BaseApplication, UvicornWorker
+
+
+def draining_server_class():
+    from uvicorn import Server
+
+    class DrainingServer(Server):
+        """uvicorn Server that drains for a while on the first SIGTERM/SIGINT before shutting down"""
+
+        drain_seconds = 0.0
+
+        def __init__(self, config):
+            super().__init__(config)
+            self.drain_deadline = None
+            self.drain_started = False
+
+        def handle_exit(self, sig, frame):
+            if self.drain_deadline is None and self.drain_seconds > 0 and not self.should_exit:
+                self.drain_deadline = time.monotonic() + self.drain_seconds   # acted on in on_tick
+                return
+            super().handle_exit(sig, frame)   # a second signal shuts down (or forces) as usual
+
+        async def on_tick(self, counter):
+            if self.drain_deadline is not None:
+                if not self.drain_started:
+                    self.drain_started = True
+                    import main
+                    main.drain()
+                if time.monotonic() >= self.drain_deadline:
+                    return True
+            return await super().on_tick(counter)
+
+    return DrainingServer
+
+
+@functools.lru_cache(maxsize=None)
+def worker_class():
+    _, UvicornWorker = _gunicorn()
+    DrainingServer = draining_server_class()
+
+    class DrainingUvicornWorker(UvicornWorker):
+        """UvicornWorker serving through DrainingServer"""
+
+        CONFIG_KWARGS = {"loop": "auto", "http": "auto", "lifespan": "on"}
+
+        async def _serve(self):
+            drain_seconds = float(os.environ.get('FLEET_DRAIN_SECONDS', '5'))
+            self.config.app = self.wsgi
+            self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - drain_seconds, 1)
+            server = DrainingServer(config=self.config)
+            server.drain_seconds = drain_seconds
+            self._install_sigquit_handler()
+            await server.serve(sockets=self.sockets)
+            if not server.started:
+                from gunicorn.arbiter import Arbiter
+                raise SystemExit(Arbiter.WORKER_BOOT_ERROR)
+
+    return DrainingUvicornWorker
+
+
+def serve(host="0.0.0.0", port=8000, workers=None, drain_seconds=5.0, graceful_timeout=30.0, log_level="info"):
+    """Run the API under gunicorn with `workers` preforked workers (default: one per CPU)"""
+    BaseApplication, _ = _gunicorn()
+    os.environ['FLEET_DRAIN_SECONDS'] = str(drain_seconds)   # read by the workers after fork
+
+    class FleetApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers or os.cpu_count() or 1,
+                "worker_class": "server.DrainingUvicornWorker",
+                "preload_app": True,
+                # The master waits this long for workers to drain and finish before killing them
+                "graceful_timeout": math.ceil(drain_seconds + graceful_timeout),
+                "timeout": 120,
+                "loglevel": log_level,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            import main
+
+            start = time.perf_counter()
+            main.preload()
+            # Objects allocated so far are never collected, so the collector's bookkeeping
+            # doesn't write to (and un-share) their pages in the workers
+            gc.freeze()
+            print(f"Preloaded in {time.perf_counter() - start:.2f}s (pid {os.getpid()}); "
+                  f"{gc.get_freeze_count():,} objects frozen")
+            return main.app
+
+    FleetApplication().run()
+
+
+def __getattr__(name):
+    # gunicorn imports the worker class by dotted path; built lazily so importing
+    # this module doesn't require gunicorn
+    if name == "DrainingUvicornWorker":
+        return worker_class()
+    raise AttributeError(name)
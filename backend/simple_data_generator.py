@@ -1,37 +1,15 @@
 import sqlite3
 import random
 from datetime import datetime, timedelta
+from schema import migrate
 
 def create_simple_database():
     """Create SQLite database with sample fleet data (no pandas dependency)"""
     conn = sqlite3.connect('fleet_data.db')
     cursor = conn.cursor()
     
-    # Create vehicles table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS vehicles (
-            vehicle_id TEXT PRIMARY KEY,
-            type TEXT,
-            status TEXT,
-            mileage INTEGER,
-            fuel_efficiency REAL,
-            last_maintenance DATE,
-            next_maintenance DATE
-        )
-    ''')
-    
-    # Create fuel_data table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS fuel_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            vehicle_id TEXT,
-            date DATE,
-            fuel_consumed REAL,
-            distance_traveled REAL,
-            fuel_efficiency REAL,
-            FOREIGN KEY (vehicle_id) REFERENCES vehicles (vehicle_id)
-        )
-    ''')
+    # Create tables and indexes
+    migrate(conn)
     
     # Generate vehicle data
     vehicle_types = ['Truck', 'Van', 'Car', 'Bus']
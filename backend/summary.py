@@ -0,0 +1,52 @@
+"""
+Fleet summary engine
+
+The SQL part of the summary is three independent scalar aggregates, each
+answered from an index: COUNT(*) from SQLite's b-tree count, the active count as
+a covering-index range count, and average efficiency as one range scan of the
+daily rollup. On a small fleet they run as one consolidated statement (one plan,
+one round trip). On a large fleet the two counts dominate, so the parts are
+split into groups run concurrently on separate pooled connections, making the
+latency that of the slowest group rather than the sum. The maintenance-due
+count is a binary search in the vehicle registry's due index (see registry.py).
+"""
+
+import metrics
+import queries
+
+ALL_PARTS = tuple(queries.FLEET_SUMMARY_PARTS)
+
+# Each group carries one of the two counts; the rollup average is near-free
+PARALLEL_GROUPS = (("total_vehicles",), ("active_vehicles", "fuel_efficiency"))
+
+PARALLEL_MIN_VEHICLES = 20_000
+
+_last_total_vehicles = 0
+
+
+def run_parts(conn, parts):
+    """Compute the named parts in one statement; returns {part: value}"""
+    with metrics.span("db"):
+        return dict(zip(parts, conn.execute(queries.fleet_summary(parts)).fetchone()))
+
+
+def plan():
+    """Groups of parts to run concurrently, sized from the last fleet size seen"""
+    return PARALLEL_GROUPS if _last_total_vehicles >= PARALLEL_MIN_VEHICLES else (ALL_PARTS,)
+
+
+def build(results):
+    """Merge part results (and the maintenance_due count) into the /api/fleet-summary response"""
+    global _last_total_vehicles
+    values = {}
+    for result in results:
+        values.update(result)
+    _last_total_vehicles = values["total_vehicles"]
+
+    return {
+        "total_vehicles": values["total_vehicles"],
+        "active_vehicles": values["active_vehicles"],
+        "fuel_efficiency": round(values["fuel_efficiency"] or 28.5, 1),
+        "maintenance_due": values["maintenance_due"],
+        "monthly_savings": 15000
+    }
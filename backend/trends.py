@@ -0,0 +1,133 @@
+"""
+Fuel trends engine: arbitrary windows in day, week or month buckets
+
+Every bucket is answered from the coarsest rollup that covers it exactly. Whole
+calendar months come from the monthly rollups (one row per key and month); days,
+weeks and the partial months at either end of a window come from the daily
+rollups. Rows read therefore scale with the buckets returned, not with the fuel
+records behind them, and none come from fuel_data, so windows over months
+compacted into the Parquet archive are served like any other.
+
+fuel_data is recorded per day, so a day is the finest bucket there is.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import metrics
+import queries
+
+BUCKETS = ("day", "week", "month")
+
+GROUPS = ("type", "vehicle")
+
+MAX_BUCKETS = 1000
+
+# Per-bucket totals summed across rollup levels, and their value for an empty bucket
+_TOTALS = ("records", "fuel_records", "fuel_sum", "efficiency_records", "efficiency_sum")
+_NO_RECORDS = (0, 0, 0.0, 0, 0.0)
+
+# Default window of week and month views without `from`, in buckets
+DEFAULT_BUCKETS = {"week": 12, "month": 12}
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def default_start(end, bucket):
+    """First day of the default week or month window ending at `end`"""
+    count = DEFAULT_BUCKETS[bucket]
+    if bucket == "week":
+        return end - timedelta(days=end.weekday() + 7 * (count - 1))
+    start = _month_start(end)
+    for _ in range(count - 1):
+        start = _month_start(start - timedelta(days=1))
+    return start
+
+
+def bucket_count(start, end, bucket):
+    """Number of buckets overlapping [start, end]"""
+    if bucket == "day":
+        return (end - start).days + 1
+    if bucket == "week":
+        return (end - start + timedelta(days=start.weekday())).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def labels(start, end, bucket):
+    """Every bucket overlapping [start, end], in order: dates, week-starting Mondays or YYYY-MM"""
+    if bucket == "day":
+        return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    if bucket == "week":
+        monday = start - timedelta(days=start.weekday())
+        return [(monday + timedelta(weeks=i)).isoformat() for i in range((end - monday).days // 7 + 1)]
+    months, month = [], _month_start(start)
+    while month <= end:
+        months.append(month.strftime("%Y-%m"))
+        month = _next_month(month)
+    return months
+
+
+def plan(start, end, bucket):
+    """(level, first period, last period) reads covering [start, end] without overlap"""
+    if bucket != "month":
+        return [("day", start.isoformat(), end.isoformat())]
+
+    first_whole = start if start.day == 1 else _next_month(start)
+    after_whole = _month_start(end + timedelta(days=1))   # first day after the last whole month
+    if first_whole >= after_whole:
+        return [("day", start.isoformat(), end.isoformat())]
+
+    reads = []
+    if start < first_whole:
+        reads.append(("day", start.isoformat(), (first_whole - timedelta(days=1)).isoformat()))
+    reads.append(("month", first_whole.strftime("%Y-%m"), (after_whole - timedelta(days=1)).strftime("%Y-%m")))
+    if after_whole <= end:
+        reads.append(("day", after_whole.isoformat(), end.isoformat()))
+    return reads
+
+
+def _series(totals, key, bucket_labels):
+    series = {"fuel_usage": [], "efficiency": [], "records": []}
+    for label in bucket_labels:
+        records, fuel_records, fuel_sum, efficiency_records, efficiency_sum = totals.get((key, label), _NO_RECORDS)
+        series["fuel_usage"].append(round(fuel_sum / fuel_records, 1) if fuel_records else None)
+        series["efficiency"].append(round(efficiency_sum / efficiency_records, 1) if efficiency_records else None)
+        series["records"].append(records)
+    return series
+
+
+def load(conn, start, end, bucket, group_by=None, vehicle_ids=()):
+    """Bucketed averages for the fleet, or one series per vehicle type or vehicle
+
+    Buckets without records have null averages, so every series lines up with `labels`.
+    """
+    group = group_by or "fleet"
+    params = (json.dumps(list(vehicle_ids)),) if group == "vehicle" else ()
+    totals = {}
+    with metrics.span("db"):
+        for level, first, last in plan(start, end, bucket):
+            for row in conn.execute(queries.fuel_buckets(group, level, bucket), (first, last, *params)):
+                key = (row["key"], row["bucket"])
+                totals[key] = tuple(total + row[column] for total, column in zip(totals.get(key, _NO_RECORDS), _TOTALS))
+
+    with metrics.span("transform"):
+        bucket_labels = labels(start, end, bucket)
+        result = {"bucket": bucket, "from": start.isoformat(), "to": end.isoformat(), "labels": bucket_labels}
+        if group_by is None:
+            result.update(_series(totals, "*", bucket_labels))
+        else:
+            keys = vehicle_ids if group_by == "vehicle" else sorted({key for key, _ in totals})
+            result["group_by"] = group_by
+            result["series"] = [{"key": key, **_series(totals, key, bucket_labels)} for key in keys]
+    return result
+
+
+def today():
+    """The current UTC date, which the SQL windows elsewhere get from date('now')"""
+    return datetime.now(timezone.utc).date()
@@ -0,0 +1,68 @@
+"""
+Per-table change counters used as HTTP validators
+
+table_versions keeps one counter per tracked table, bumped by triggers on every
+insert, update and delete, so "has this table changed?" is a primary-key read
+instead of a query over the data. Read the counters *before* the rows they
+describe: a write landing in between can then only make a validator newer than
+its body (one extra full response), never older (a wrong 304).
+"""
+
+TRACKED_TABLES = ('vehicles', 'fuel_data')
+
+CREATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS table_versions (
+        table_name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+'''
+
+SEED = f'''
+    INSERT OR IGNORE INTO table_versions VALUES {', '.join(f"('{table}', 0)" for table in TRACKED_TABLES)}
+'''
+
+EVENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def trigger_name(table, event):
+    return f"trg_{table}_version_{event.lower()}"
+
+
+TRIGGERS = {
+    trigger_name(table, event): f'''
+        CREATE TRIGGER IF NOT EXISTS {trigger_name(table, event)} AFTER {event} ON {table}
+        BEGIN
+            UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+        END
+    '''
+    for table in TRACKED_TABLES
+    for event in EVENTS
+}
+
+
+def read(conn, tables):
+    """Current counters for the given tables, in order"""
+    placeholders = ', '.join('?' * len(tables))
+    found = dict(conn.execute(
+        f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})", tables
+    ).fetchall())
+    return tuple(found.get(table, 0) for table in tables)
+
+
+def drop_triggers(conn, *tables):
+    """Remove the counter triggers of the given tables for a bulk load; bump() each batch instead"""
+    for table in tables:
+        for event in EVENTS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger_name(table, event)}")
+
+
+def create_triggers(conn, *tables):
+    """Reinstall the counter triggers of the given tables"""
+    for table in tables:
+        for event in EVENTS:
+            conn.execute(TRIGGERS[trigger_name(table, event)])
+
+
+def bump(conn, *tables):
+    """Advance the counters of tables written without their triggers, inside the writing transaction"""
+    conn.executemany("UPDATE table_versions SET version = version + 1 WHERE table_name = ?", [(t,) for t in tables])
@@ -2,7 +2,7 @@ import React, { useState, useEffect } from 'react';
 import Dashboard from './components/Dashboard';
 import AIChat from './components/AIChat';
 import Maintenance from './components/Maintenance';
-import { fleetAPI } from './api';
+import { fleetAPI, subscribeLive } from './api';
 
 function App() {
   const [activeTab, setActiveTab] = useState('dashboard');
@@ -10,30 +10,26 @@ function App() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const fetchInitialData = async () => {
+    const fetchVehicles = async () => {
       try {
-        setLoading(true);
-        const [summary, vehicles, fuelTrends, maintenanceAlerts] = await Promise.all([
-          fleetAPI.getFleetSummary(),
-          fleetAPI.getVehicles(),
-          fleetAPI.getFuelTrends(),
-          fleetAPI.getMaintenanceAlerts()
-        ]);
-
-        setFleetData({
-          summary,
-          vehicles,
-          fuelTrends,
-          maintenanceAlerts
-        });
+        const vehicles = await fleetAPI.getVehicles();
+        setFleetData((data) => ({ ...data, vehicles }));
       } catch (error) {
-        console.error('Error fetching initial data:', error);
+        console.error('Error fetching vehicles:', error);
       } finally {
         setLoading(false);
       }
     };
 
-    fetchInitialData();
+    fetchVehicles();
+
+    // Summary, trends and alerts are pushed by the server as they change
+    const updateSection = (section) => (value) => setFleetData((data) => ({ ...data, [section]: value }));
+    return subscribeLive({
+      onSummary: updateSection('summary'),
+      onTrends: updateSection('fuelTrends'),
+      onAlerts: updateSection('maintenanceAlerts')
+    });
   }, []);
 
   const tabs = [
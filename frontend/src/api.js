@@ -167,4 +167,42 @@ export const fleetAPI = {
   }
 };
 
+// Live dashboard updates over Server-Sent Events. The server pushes the summary,
+// trends and alerts sections whenever they change (the current ones on connect),
+// so open dashboards don't poll. Returns a function that closes the stream.
+export const subscribeLive = ({ onSummary, onTrends, onAlerts }) => {
+  // Loads each section once over plain HTTP (with the usual mock fallbacks)
+  const loadOnce = () => {
+    fleetAPI.getFleetSummary().then(onSummary);
+    fleetAPI.getFuelTrends().then(onTrends);
+    fleetAPI.getMaintenanceAlerts().then(onAlerts);
+  };
+
+  if (typeof window === 'undefined' || !window.EventSource) {
+    loadOnce();
+    return () => {};
+  }
+
+  const source = new EventSource(`${API_BASE_URL}/api/live`);
+  const handlers = { summary: onSummary, trends: onTrends, alerts: onAlerts };
+  let received = false;
+  Object.entries(handlers).forEach(([event, handler]) => {
+    source.addEventListener(event, (message) => {
+      received = true;
+      handler(JSON.parse(message.data));
+    });
+  });
+  // EventSource reconnects on its own and the server resends the snapshot;
+  // if it never connected, show the demo data meanwhile
+  let fellBack = false;
+  source.onerror = () => {
+    console.warn('Live updates interrupted, reconnecting...');
+    if (!received && !fellBack) {
+      fellBack = true;
+      loadOnce();
+    }
+  };
+  return () => source.close();
+};
+
 export default api;
\ No newline at end of file